@@ -4,105 +4,461 @@
 # @Last Modified by:   Luis Condados
 # @Last Modified time: 2023-09-24 23:28:04
 
+import os
+import json
+import warnings
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 import numpy as np
 
-def drawBoxes(image, corners, imgpts):
-    imgpts = np.int32(imgpts).reshape(-1,2)
-    # draw ground floor in green
-    image = cv2.drawContours(image, [imgpts[:4]], -1, (0,255,0), -1)
-    # draw pillars in blue color
-    for i, j in zip(range(4), range(4,8)):
-        image = cv2.line(image, tuple(imgpts[i]), tuple(imgpts[j]), (255,0,0),2)
-    # draw top layer in red color
-    image = cv2.drawContours(image, [imgpts[4:]], -1, (0,0,255),2)
-    return image
+import common
+from detections import Detections
+from dictionaries import RestrictedDictionary, board_dictionary
+from marker_pose import estimate_marker_poses, project_points_batch
+from profiling import NULL_PROFILER
+from rendering import draw_axes, draw_boxes, draw_markers
+from undistortion import undistort_points
+
+def detector_params_to_dict(params):
+    """All the scalar fields of a cv2.aruco.DetectorParameters as a plain dict."""
+    values = {}
+    for name in dir(params):
+        if name.startswith('_'):
+            continue
+        value = getattr(params, name)
+        if isinstance(value, (bool, int, float)):
+            values[name] = value
+    return values
+
+def detector_params_from_dict(values, source='parameters'):
+    """cv2.aruco.DetectorParameters with the fields of values, the others at their defaults.
+    source: named in the error of a field this OpenCV version does not have
+    """
+    params = cv2.aruco.DetectorParameters()
+    for name, value in values.items():
+        try:
+            setattr(params, name, value)
+        except AttributeError:
+            raise ValueError('{}: unknown DetectorParameters field {} in OpenCV {}'.format(source, name, cv2.__version__))
+    return params
+
+# saved by detector_tuning.py, one <name>.json per profile
+DETECTOR_PROFILES_DIR = 'assets/detector_profiles'
+
+def load_detector_profile(name, profiles_dir=DETECTOR_PROFILES_DIR, aruco_dict=None, image_size=None):
+    """DetectorParameters of a tuned profile, name is the profile name or the path of its .json file.
+
+    aruco_dict: predefined dictionary id of the caller, a profile tuned on another dictionary is rejected
+    image_size: (w, h) of the frames to detect on, warns when the profile was tuned on another size
+                (the perimeter rates and minMarkerLengthRatioOriginalImg are relative to the image size)
+    """
+    path = name if name.endswith('.json') else os.path.join(profiles_dir, '{}.json'.format(name))
+    with open(path) as f:
+        profile = json.load(f)
+
+    if aruco_dict is not None and profile.get('aruco_dict') is not None:
+        if common.ARUCO_DICT.get(profile['aruco_dict']) != aruco_dict:
+            names = [dict_name for dict_name, dict_id in common.ARUCO_DICT.items() if dict_id == aruco_dict]
+            raise ValueError('Detector profile {} was tuned on {}, not on {}'.format(
+                             path, profile['aruco_dict'], names[0] if names else aruco_dict))
+    if image_size is not None and profile.get('image_size') is not None:
+        if tuple(profile['image_size']) != tuple(image_size):
+            (tuned_w, tuned_h), (w, h) = profile['image_size'], image_size
+            warnings.warn('Detector profile {} was tuned on {}x{} frames, not {}x{}: '
+                          'its relative marker sizes do not match'.format(path, tuned_w, tuned_h, w, h))
+    return detector_params_from_dict(profile['params'], 'Detector profile {}'.format(path))
+
+def detector_params_from_config(config):
+    """Parameters of config['DETECTOR_PROFILE'] if set, the defaults otherwise.
+    The profile is checked against config['ARUCO_DICT'] and the optional config['IMAGE_SIZE'] (w, h).
+    """
+    if config.get('DETECTOR_PROFILE'):
+        return load_detector_profile(config['DETECTOR_PROFILE'],
+                                     config.get('DETECTOR_PROFILES_DIR', DETECTOR_PROFILES_DIR),
+                                     config.get('ARUCO_DICT'),
+                                     config.get('IMAGE_SIZE'))
+    return cv2.aruco.DetectorParameters()
+
+def offset_corners(marker_corners, x, y):
+    """Maps marker corners detected on a crop starting at (x, y) back to the full frame."""
+    offset = np.float32([x, y])
+    return tuple(corners + offset for corners in marker_corners)
+
+def crop_params(params, scale, cropped=None):
+    """Detector parameters for a crop `scale` times smaller than the full frame.
+    The marker perimeter rates are relative to the image size, they are rescaled so that
+    the crop accepts the same marker sizes (in pixels) as the full frame.
+    cropped: parameters updated in place (only the two rates), a copy of params if None
+    """
+    if cropped is None:
+        cropped = detector_params_from_dict(detector_params_to_dict(params))
+    cropped.minMarkerPerimeterRate = params.minMarkerPerimeterRate * scale
+    cropped.maxMarkerPerimeterRate = params.maxMarkerPerimeterRate * scale
+    return cropped
+
+class RoiTracker(object):
+    """Predicts the region of interest of the next frame from the last detected marker corners.
+
+    The region is the bounding box of the last corners, moved by the last displacement
+    and padded by `padding` times its size (at least min_padding_px).
+    next_roi() returns None when a full-frame scan is needed: nothing tracked yet,
+    the markers were lost or every full_scan_every frames (to pick up new markers).
+    """
+    def __init__(self, padding=0.5, min_padding_px=32, full_scan_every=30):
+        self.padding = padding
+        self.min_padding_px = min_padding_px
+        self.full_scan_every = full_scan_every
+
+        self.bbox = None
+        self.velocity = np.zeros(2, dtype=np.float32)
+        self.frames_since_full_scan = 0
+
+    def next_roi(self, image_shape):
+        """Returns (x0, y0, x1, y1) or None for a full-frame scan."""
+        if self.bbox is None or self.frames_since_full_scan >= self.full_scan_every:
+            return None
+
+        h, w = image_shape[:2]
+        x0, y0, x1, y1 = self.bbox
+        pad_x = max(self.padding * (x1 - x0), self.min_padding_px)
+        pad_y = max(self.padding * (y1 - y0), self.min_padding_px)
+        dx, dy = self.velocity
+
+        x0 = int(max(0, np.floor(x0 + dx - pad_x)))
+        y0 = int(max(0, np.floor(y0 + dy - pad_y)))
+        x1 = int(min(w, np.ceil(x1 + dx + pad_x)))
+        y1 = int(min(h, np.ceil(y1 + dy + pad_y)))
+        if x1 - x0 <= 0 or y1 - y0 <= 0:
+            return None
+        return x0, y0, x1, y1
+
+    def update(self, marker_corners, full_scan):
+        """marker_corners in full-frame coordinates, empty when the markers were lost."""
+        if full_scan:
+            self.frames_since_full_scan = 0
+        else:
+            self.frames_since_full_scan += 1
+
+        if len(marker_corners) == 0:
+            self.bbox = None
+            self.velocity[:] = 0
+            return
+
+        points = np.concatenate(marker_corners).reshape(-1,2)
+        bbox = np.concatenate([points.min(axis=0), points.max(axis=0)])
+        if self.bbox is not None:
+            center = (bbox[:2] + bbox[2:]) / 2
+            prev_center = (self.bbox[:2] + self.bbox[2:]) / 2
+            self.velocity = center - prev_center
+        self.bbox = bbox
+
+def pack_markers(marker_corners, marker_ids):
+    """Tuple of (1,4,2) corners and (N,1) ids from detectMarkers -> (N,4,2) float32 and (N,) int32 arrays."""
+    if len(marker_corners) == 0:
+        return np.zeros((0,4,2), dtype=np.float32), np.zeros(0, dtype=np.int32)
+    corners = np.concatenate(marker_corners).reshape(-1,4,2).astype(np.float32, copy=False)
+    ids = np.asarray(marker_ids, dtype=np.int32).reshape(-1)
+    return corners, ids
 
 class ArucoDetector(object):
-    def __init__(self, config_dict):
-        pass
+    """Plain ArUco markers detector built around one long-lived cv2.aruco.ArucoDetector.
+
+    Sample:
+        config = {}
+        config['ARUCO_DICT'] = cv2.aruco.DICT_4X4_50
+        config['ROI_TRACKING'] = False # optional, see RoiTracker
+        config['MARKER_IDS'] = [3, 17]  # optional allow-list, see dictionaries.RestrictedDictionary
+        config['DETECTOR_PROFILE'] = 'cell_3'  # optional tuned parameters, see detector_tuning.py
+        config['IMAGE_SIZE'] = (1920, 1080)    # optional, checked against the size the profile was tuned on
+
+        detector = ArucoDetector(config)
+        corners, ids = detector.detect(frame)
+        corners, ids, frame_idx = detector.detect_batch(frames)
+
+    profiler: optional profiling.Profiler, times the 'detect_markers' stage
+    """
+    def __init__(self, config_dict, profiler=None):
+        self.config = config_dict
+        self.profiler = profiler or NULL_PROFILER
+
+        self.dictionary = cv2.aruco.getPredefinedDictionary(config_dict['ARUCO_DICT'])
+        # Allow-list: only the ids in use are searched, the others are never decoded
+        self.restricted = None
+        if config_dict.get('MARKER_IDS') is not None:
+            self.restricted = RestrictedDictionary(config_dict['ARUCO_DICT'], config_dict['MARKER_IDS'])
+            self.dictionary = self.restricted.dictionary
+        self.params = detector_params_from_config(config_dict)
+        self.detector = cv2.aruco.ArucoDetector(self.dictionary, self.params)
+
+        # Tracking mode: only search around the markers found on the previous frame
+        self.tracker = None
+        self._crop_detector = None
+        self._crop_params = None
+        if config_dict.get('ROI_TRACKING', False):
+            self.tracker = RoiTracker(padding=config_dict.get('ROI_PADDING', 0.5),
+                                      full_scan_every=config_dict.get('ROI_FULL_SCAN_EVERY', 30))
+            self._crop_detector = cv2.aruco.ArucoDetector(self.dictionary, self.params)
+            # copied once, only the perimeter rates change from frame to frame
+            self._crop_params = crop_params(self.params, 1.0)
+
+    def _detect(self, image, detector=None):
+        with self.profiler.span('detect_markers'):
+            marker_corners, marker_ids, _ = (detector or self.detector).detectMarkers(image)
+        corners, ids = pack_markers(marker_corners, marker_ids)
+        if self.restricted is not None:
+            ids = self.restricted.to_original(ids)
+        return corners, ids
+
     def detect(self, image):
-        pass
+        """Returns corners (N,4,2) float32 and ids (N,) int32."""
+        if self.tracker is None:
+            return self._detect(image)
+
+        corners, ids = np.zeros((0,4,2), dtype=np.float32), np.zeros(0, dtype=np.int32)
+        roi = self.tracker.next_roi(image.shape)
+        if roi is not None:
+            x0, y0, x1, y1 = roi
+            self._crop_detector.setDetectorParameters(crop_params(self.params,
+                                                                  max(image.shape[:2]) / max(y1 - y0, x1 - x0),
+                                                                  self._crop_params))
+            corners, ids = self._detect(image[y0:y1, x0:x1], self._crop_detector)
+            corners += np.float32([x0, y0])
+
+        full_scan = roi is None or len(corners) == 0
+        if full_scan:
+            corners, ids = self._detect(image)
+
+        self.tracker.update(corners, full_scan)
+        return corners, ids
+
+    def detect_batch(self, images, workers=None):
+        """Detects the markers on a list or generator of frames with a thread pool.
+
+        The frames are independent, ROI tracking is not used here.
+        Returns corners (M,4,2) float32, ids (M,) int32 and frame_idx (M,) int32,
+        the index of the frame where each marker was found.
+        """
+        workers = workers or os.cpu_count() or 1
+        results = []
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for image in images:
+                # bounded number of frames in flight, generators are not loaded at once
+                if len(pending) >= 2*workers:
+                    results.append(pending.popleft().result())
+                pending.append(executor.submit(self._detect, image))
+            while pending:
+                results.append(pending.popleft().result())
+
+        counts = np.array([len(ids) for _, ids in results], dtype=np.int32)
+        frame_idx = np.repeat(np.arange(len(results), dtype=np.int32), counts)
+        if len(frame_idx) == 0:
+            return np.zeros((0,4,2), dtype=np.float32), np.zeros(0, dtype=np.int32), frame_idx
+        corners = np.concatenate([corners for corners, _ in results])
+        ids = np.concatenate([ids for _, ids in results])
+        return corners, ids, frame_idx
 
 class CharucoDetector(object):
-    def __init__(self, config):
+    """profiler: optional profiling.Profiler, times the detect_markers, refine_corners,
+    interpolate_corners, board_pose, marker_pose and draw stages and counts the
+    detection attempts/hits.
+
+    config['RESTRICT_DICTIONARY'] = True: markers of ids outside the board are not decoded,
+    see dictionaries.board_dictionary.
+    config['DETECTOR_PROFILE'] = name: detector parameters tuned by detector_tuning.py,
+    checked against config['ARUCO_DICT'] and config['IMAGE_SIZE'] (w, h) if set.
+    """
+    def __init__(self, config, profiler=None):
         self.config = config
+        self.profiler = profiler or NULL_PROFILER
 
         # Define the aruco dictionary and charuco board
-        self.dictionary = cv2.aruco.getPredefinedDictionary(config['ARUCO_DICT'])
+        self.dictionary = board_dictionary(config)
         self.board = cv2.aruco.CharucoBoard((config['SQUARES_VERTICALLY'],
                                              config['SQUARES_HORIZONTALLY']),
                                              config['SQUARE_LENGTH'],
                                              config['MARKER_LENGTH'],
                                              self.dictionary)
-        self.params = cv2.aruco.DetectorParameters()
+        self.params = detector_params_from_config(config)
+
+        square_size = config['SQUARE_LENGTH']
+        self.axis_boxes = np.float32([
+                                      [-square_size, square_size, 0],
+                                      [square_size, square_size, 0],
+                                      [square_size,-square_size, 0],
+                                      [-square_size,-square_size, 0],
+                                      [-square_size, square_size, 2*square_size],
+                                      [square_size, square_size, 2*square_size],
+                                      [square_size,-square_size, 2*square_size],
+                                      [-square_size,-square_size, 2*square_size],
+                                     ])
+
+        # Pyramid mode: detect on a downscaled frame and refine the corners at full resolution.
+        # The scale is given directly or chosen so that markers of EXPECTED_MARKER_PX pixels
+        # are still about PYRAMID_TARGET_MARKER_PX pixels wide in the downscaled frame.
+        self.pyramid_scale = config.get('PYRAMID_SCALE', 1.0)
+        if 'EXPECTED_MARKER_PX' in config:
+            target_px = config.get('PYRAMID_TARGET_MARKER_PX', 32)
+            self.pyramid_scale = min(1.0, max(0.125, target_px / float(config['EXPECTED_MARKER_PX'])))
+
+        # Tracking mode: only search around the markers found on the previous frame
+        self.tracker = None
+        self._crop_params = None
+        if config.get('ROI_TRACKING', False):
+            self.tracker = RoiTracker(padding=config.get('ROI_PADDING', 0.5),
+                                      full_scan_every=config.get('ROI_FULL_SCAN_EVERY', 30))
+            # copied once, only the perimeter rates change from frame to frame
+            self._crop_params = crop_params(self.params, 1.0)
+
+    def _detect_markers(self, image, params=None):
+        if self.pyramid_scale < 1.0:
+            return self._detect_markers_pyramid(image, params)
 
-    def detect(self, image):
-        # Detect markers in the undistorted image
         marker_corners, marker_ids, _ = cv2.aruco.detectMarkers(image,
                                                                 self.dictionary,
-                                                                parameters=self.params)
+                                                                parameters=params or self.params)
+        return marker_corners, marker_ids
+
+    def _detect_markers_pyramid(self, image, params=None):
+        """Coarse-to-fine: detects the markers on a downscaled copy of the image,
+        then refines the upscaled corners at full resolution.
+        """
+        scale = self.pyramid_scale
+        small_image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        marker_corners, marker_ids, _ = cv2.aruco.detectMarkers(small_image,
+                                                                self.dictionary,
+                                                                parameters=params or self.params)
+        if len(marker_corners) == 0:
+            return marker_corners, marker_ids
 
+        # back to full resolution (pixel centers), then sub-pixel refinement
+        # in a small window around each upscaled corner
+        points = (np.concatenate(marker_corners).reshape(-1,1,2) + 0.5) / scale - 0.5
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        half_window = max(3, int(np.ceil(1.5 / scale)) + 1)
+        points = points.astype(np.float32)
+        with self.profiler.span('refine_corners'):
+            refined = cv2.cornerSubPix(gray,
+                                       points.copy(),
+                                       (half_window, half_window),
+                                       (-1, -1),
+                                       (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.01))
+        # keep the upscaled corner when the refinement ran away to a neighbouring structure
+        moved = np.abs(refined - points).max(axis=-1) > half_window
+        refined[moved] = points[moved]
+        marker_corners = tuple(refined.reshape(-1,1,4,2))
+        return marker_corners, marker_ids
+
+    def detect_markers(self, image):
+        with self.profiler.span('detect_markers'):
+            return self._detect_markers_tracked(image)
+
+    def _detect_markers_tracked(self, image):
+        if self.tracker is None:
+            return self._detect_markers(image)
+
+        marker_corners, marker_ids = (), None
+        roi = self.tracker.next_roi(image.shape)
+        if roi is not None:
+            x0, y0, x1, y1 = roi
+            params = crop_params(self.params, max(image.shape[:2]) / max(y1 - y0, x1 - x0), self._crop_params)
+            marker_corners, marker_ids = self._detect_markers(image[y0:y1, x0:x1], params)
+            marker_corners = offset_corners(marker_corners, x0, y0)
+
+        full_scan = roi is None or len(marker_corners) == 0
+        if full_scan:
+            # nothing tracked yet, periodic scan or the markers were lost in the roi
+            marker_corners, marker_ids = self._detect_markers(image)
+
+        self.tracker.update(marker_corners, full_scan)
+        return marker_corners, marker_ids
+
+    def interpolate_corners(self, image, marker_corners, marker_ids):
         charuco_retval, charuco_corners, charuco_ids = 0, [], []
         if len(marker_corners) > 0:
             # Interpolate CharUco corners
-            charuco_retval, charuco_corners, charuco_ids = cv2.aruco.interpolateCornersCharuco(marker_corners,
-                                                                                               marker_ids,
-                                                                                               image,
-                                                                                               self.board)
-            # print('marker_ids', marker_ids)
-            # print('marker_ids: {} | charuco_ids: {}'.format(marker_ids, charuco_ids))
-            # print('marker_corners: {}'.format(np.array(marker_corners).shape))
-            # print('charuco_corners: {}'.format(np.array(charuco_corners).shape))
-            # if charuco_retval:
-            #     for charuco_corner in charuco_corners:
-            #         xc = int(charuco_corner[0][0])
-            #         yc = int(charuco_corner[0][1])
-            #         cv2.circle(image, (xc, yc), 10, (0, 255, 0), -1)
-            # print('marker_corners: {} | charuco_corners: {}'.format(marker_corners, charuco_corners))
-        # return charuco_retval, marker_corners, marker_ids, charuco_corners, charuco_ids
-        # return charuco_retval, marker_corners, marker_ids
+            with self.profiler.span('interpolate_corners'):
+                charuco_retval, charuco_corners, charuco_ids = cv2.aruco.interpolateCornersCharuco(marker_corners,
+                                                                                                   marker_ids,
+                                                                                                   image,
+                                                                                                   self.board)
+        self.profiler.count('detection_attempts')
+        if charuco_retval:
+            self.profiler.count('detection_hits')
         return charuco_retval, charuco_corners, charuco_ids
 
+    def detect_all(self, image):
+        """Returns marker_corners, marker_ids, charuco_retval, charuco_corners, charuco_ids."""
+        marker_corners, marker_ids = self.detect_markers(image)
+        charuco_retval, charuco_corners, charuco_ids = self.interpolate_corners(image, marker_corners, marker_ids)
+        return marker_corners, marker_ids, charuco_retval, charuco_corners, charuco_ids
+
+    def detect(self, image):
+        """Markers and charuco corners of the image as a single frame detections.Detections,
+        detection.charuco(0) gives the corners/ids in the shapes of the cv2.aruco functions.
+        """
+        marker_corners, marker_ids, _, charuco_corners, charuco_ids = self.detect_all(image)
+        return Detections.from_frame(marker_corners, marker_ids, charuco_corners, charuco_ids)
+
+    def estimate_board_pose(self, charuco_corners, charuco_ids, camera_matrix, dist_coeffs):
+        """Board pose from corners detected on the raw (distorted) frame,
+        the distortion is handled by the solver so the frame never needs to be undistorted.
+        Returns retval, rvec, tvec.
+        """
+        if charuco_ids is None or len(charuco_ids) < 4:
+            return False, None, None
+        with self.profiler.span('board_pose'):
+            return cv2.aruco.estimatePoseCharucoBoard(charuco_corners,
+                                                      charuco_ids,
+                                                      self.board,
+                                                      camera_matrix,
+                                                      dist_coeffs,
+                                                      None,
+                                                      None)
+
+    def undistort_corners(self, corners, camera_matrix, dist_coeffs):
+        """Undistorts only the detected corners instead of the whole frame.
+        The output is in pixel coordinates of the undistorted image.
+        """
+        return undistort_points(corners, camera_matrix, dist_coeffs)
+
     def estimate_pose(self,
                       image,
                       marker_corners,
                       marker_ids,
                       camera_matrix,
                       dist_coeffs,
-                      draw_on_image=False):
+                      draw_on_image=False,
+                      tracker=None,
+                      timestamp=None):
+        """Poses of all the detected markers, estimated in one batched call.
+        marker_corners: tuple of (1,4,2) arrays or packed (N,4,2) array (e.g. Detections.markers)
+        With a pose_tracking.PoseTracker the poses are filtered per marker id.
+        Nothing is drawn on the image unless draw_on_image is True.
+        Returns rvecs (N,3) and tvecs (N,3).
+        """
+        with self.profiler.span('marker_pose'):
+            rvecs, tvecs, _ = estimate_marker_poses(marker_corners,
+                                                    self.config['MARKER_LENGTH'],
+                                                    camera_matrix,
+                                                    dist_coeffs)
+            if tracker is not None and len(rvecs) > 0:
+                rvecs, tvecs = tracker.update_batch(list(np.asarray(marker_ids).flatten()), rvecs, tvecs, timestamp)
 
+        # headless unless asked: the rendering is a separate stage (draw_poses)
         if draw_on_image:
-            cv2.aruco.drawDetectedMarkers(image, marker_corners, marker_ids)
-
-        for i, marker_id in enumerate(marker_ids):
-            rvec, tvec, _ = cv2.aruco.estimatePoseSingleMarkers(marker_corners[i],
-                                                                self.config['MARKER_LENGTH'],
-                                                                camera_matrix,
-                                                                dist_coeffs)
-
-            for corner in marker_corners[i].reshape(-1,2):
-                cv2.circle(image, tuple(np.int32(corner)), 2, (0,255,255), -1)
-
-            cv2.drawFrameAxes(image,
-                              camera_matrix,
-                              dist_coeffs,
-                              rvec,
-                              tvec,
-                              0.02)
-            square_size = self.config['SQUARE_LENGTH']
-            axisBoxes = np.float32([
-                                    [-square_size, square_size, 0],
-                                    [square_size, square_size, 0],
-                                    [square_size,-square_size, 0],
-                                    [-square_size,-square_size, 0],
-                                    [-square_size, square_size, 2*square_size],
-                                    [square_size, square_size, 2*square_size],
-                                    [square_size,-square_size, 2*square_size],
-                                    [-square_size,-square_size, 2*square_size],
-                                   ])
-
-            # project 3D points to image plane
-            imgpts, jac = cv2.projectPoints(axisBoxes, rvec, tvec, camera_matrix, dist_coeffs)
-            imgpts = imgpts.astype('int32').reshape(-1, 2)
-            drawBoxes(image, marker_corners[i], imgpts)
\ No newline at end of file
+            with self.profiler.span('draw'):
+                self.draw_poses(image, marker_corners, marker_ids, rvecs, tvecs, camera_matrix, dist_coeffs)
+
+        return rvecs, tvecs
+
+    def draw_poses(self, image, marker_corners, marker_ids, rvecs, tvecs, camera_matrix, dist_coeffs):
+        """Rendering stage of estimate_pose: outlines, corners, axes and boxes of all the markers
+        with batched drawing calls, one projection for all the boxes.
+        """
+        draw_markers(image, marker_corners, marker_ids)
+        draw_axes(image, camera_matrix, dist_coeffs, rvecs, tvecs, 0.02)
+        draw_boxes(image, project_points_batch(self.axis_boxes, rvecs, tvecs, camera_matrix, dist_coeffs))
+        return image
@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*-
+
+# Synthetic scene benchmark.
+# ChArUco boards (create_new_charuco_board) and marker sheets (gen_ArUco_marker) are warped
+# into frames with known poses, optionally distorted, blurred and noised. Every frame comes
+# with its ground truth corners and pose, so the detection and pose stack is measured
+# without a camera: throughput, latency percentiles, detection rate, corner and pose errors.
+# The results go to a JSON report to compare revisions.
+#
+# Ground truth corners use the pixel center convention of cv2.projectPoints
+# (the center of the top-left pixel is (0,0)). Depending on the OpenCV release the ChArUco
+# corners can come out half a pixel off in this convention, it shows up in corner_bias_px
+# (the report records the OpenCV version).
+
+import itertools
+import json
+import os
+import platform
+import subprocess
+import time
+
+import cv2
+import numpy as np
+
+import common
+from aruco_detectors import ArucoDetector, CharucoDetector
+from charuco_board_generator import create_new_charuco_board
+from marker_generator import gen_ArUco_marker
+from marker_pose import estimate_marker_poses
+
+def synthetic_camera_matrix(image_size, hfov_deg=65.0):
+    w, h = image_size
+    f = 0.5 * w / np.tan(np.radians(hfov_deg) / 2)
+    return np.float64([[f, 0, (w - 1) / 2.0],
+                       [0, f, (h - 1) / 2.0],
+                       [0, 0, 1]])
+
+def random_pose(rng, object_size, camera_matrix, image_size, fill=(0.3, 0.6), max_tilt_deg=40):
+    """Random pose of a planar object of object_size (w,h) [m], its frame at the top-left corner
+    (x right, y down). The object spans fill of the image width and is centered near the image center.
+    """
+    object_w, object_h = object_size
+    z = camera_matrix[0,0] * object_w / (rng.uniform(*fill) * image_size[0])
+
+    # tilt around a random in-plane axis, then a random roll
+    tilt_axis = rng.uniform(0, 2*np.pi)
+    tilt = np.radians(rng.uniform(0, max_tilt_deg))
+    R_tilt = cv2.Rodrigues(tilt * np.float64([np.cos(tilt_axis), np.sin(tilt_axis), 0]))[0]
+    R_roll = cv2.Rodrigues(np.float64([0, 0, rng.uniform(-np.pi, np.pi)]))[0]
+    R = R_tilt @ R_roll
+
+    u = image_size[0] * rng.uniform(0.4, 0.6)
+    v = image_size[1] * rng.uniform(0.4, 0.6)
+    center = z * np.linalg.solve(camera_matrix, np.float64([u, v, 1]))
+    tvec = center - R @ np.float64([object_w / 2, object_h / 2, 0])
+    return cv2.Rodrigues(R)[0].ravel(), tvec
+
+class SceneRenderer(object):
+    """Warps a planar texture into a frame of a camera (K, D).
+
+    The texture is given with its scale px_per_meter and the pixel position origin_px of
+    the object frame origin (x right, y down, as the texture pixels).
+    """
+    def __init__(self, camera_matrix, dist_coeffs, image_size, noise_sigma=0.0, blur_sigma=0.0, background=128):
+        self.camera_matrix = np.float64(camera_matrix)
+        self.dist_coeffs = np.float64(dist_coeffs).reshape(-1)
+        self.image_size = tuple(image_size)
+        self.noise_sigma = noise_sigma
+        self.blur_sigma = blur_sigma
+        self.background = background
+
+        # undistorted position of every frame pixel, the distortion is applied by a
+        # single remap composed with the homography
+        self._undistorted_grid = None
+        if np.any(self.dist_coeffs != 0):
+            w, h = self.image_size
+            grid = np.mgrid[0:h, 0:w][::-1].reshape(2,-1).T.astype(np.float64)
+            undistorted = cv2.undistortPoints(grid.reshape(-1,1,2), self.camera_matrix, self.dist_coeffs,
+                                              P=self.camera_matrix)
+            self._undistorted_grid = undistorted.reshape(h, w, 2)
+
+    def texture_homography(self, px_per_meter, origin_px, rvec, tvec):
+        """Homography texture pixel (center convention) -> undistorted frame pixel."""
+        R = cv2.Rodrigues(np.float64(rvec))[0]
+        object_to_image = self.camera_matrix @ np.column_stack([R[:,0], R[:,1], np.float64(tvec).ravel()])
+        texture_to_object = np.float64([[1.0 / px_per_meter, 0, (0.5 - origin_px[0]) / px_per_meter],
+                                        [0, 1.0 / px_per_meter, (0.5 - origin_px[1]) / px_per_meter],
+                                        [0, 0, 1]])
+        return object_to_image @ texture_to_object
+
+    def render(self, texture, px_per_meter, origin_px, rvec, tvec, rng=None):
+        H = self.texture_homography(px_per_meter, origin_px, rvec, tvec)
+        if self._undistorted_grid is None:
+            frame = cv2.warpPerspective(texture, H, self.image_size,
+                                        flags=cv2.INTER_LINEAR, borderValue=self.background)
+        else:
+            w, h = self.image_size
+            source = cv2.perspectiveTransform(self._undistorted_grid.reshape(-1,1,2), np.linalg.inv(H))
+            source = source.reshape(h, w, 2).astype(np.float32)
+            frame = cv2.remap(texture, source, None, cv2.INTER_LINEAR,
+                              borderMode=cv2.BORDER_CONSTANT, borderValue=self.background)
+
+        if self.blur_sigma > 0:
+            frame = cv2.GaussianBlur(frame, (0, 0), self.blur_sigma)
+        if self.noise_sigma > 0:
+            rng = np.random.default_rng() if rng is None else rng
+            noisy = frame.astype(np.float32) + rng.normal(0, self.noise_sigma, frame.shape).astype(np.float32)
+            frame = np.clip(noisy, 0, 255).astype(np.uint8)
+        return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+
+    def project(self, object_points, rvec, tvec):
+        points, _ = cv2.projectPoints(np.float64(object_points).reshape(-1,3), np.float64(rvec), np.float64(tvec),
+                                      self.camera_matrix, self.dist_coeffs)
+        return points.reshape(-1,2)
+
+    def inside(self, points, border=4):
+        w, h = self.image_size
+        return ((points[:,0] >= border) & (points[:,0] < w - border) &
+                (points[:,1] >= border) & (points[:,1] < h - border))
+
+class CharucoScene(object):
+    """A ChArUco board texture with a white margin of one square."""
+    def __init__(self, config, px_per_square=64):
+        self.config = config
+        board_config = dict(config)
+        board_config['LENGTH_PX'] = config['SQUARES_VERTICALLY'] * px_per_square
+        board_config['MARGIN_PX'] = 0
+        self.board, image = create_new_charuco_board(board_config)
+
+        # margin added around so that the square size in pixels stays an integer
+        self.texture = cv2.copyMakeBorder(image, px_per_square, px_per_square, px_per_square, px_per_square,
+                                          cv2.BORDER_CONSTANT, value=255)
+        self.px_per_meter = px_per_square / config['SQUARE_LENGTH']
+        self.origin_px = (px_per_square, px_per_square)
+        self.size = (config['SQUARES_VERTICALLY'] * config['SQUARE_LENGTH'],
+                     config['SQUARES_HORIZONTALLY'] * config['SQUARE_LENGTH'])
+        self.object_points = np.float64(self.board.getChessboardCorners())
+
+class MarkerSheetScene(object):
+    """marker_count markers (ids 0..marker_count-1, or the given marker_ids) on a grid,
+    spaced by half a marker. object_corners follow the order of marker_ids.
+    """
+    def __init__(self, aruco_dict, marker_count, marker_length=0.05, marker_px=64, marker_ids=None):
+        self.dictionary = cv2.aruco.getPredefinedDictionary(aruco_dict)
+        self.marker_length = marker_length
+        self.marker_ids = np.arange(marker_count) if marker_ids is None else np.asarray(marker_ids)
+        marker_count = len(self.marker_ids)
+
+        cols = int(np.ceil(np.sqrt(marker_count)))
+        rows = int(np.ceil(marker_count / float(cols)))
+        gap = marker_px // 2
+        pitch = marker_px + gap
+        self.texture = np.full((rows*pitch + gap, cols*pitch + gap), 255, dtype=np.uint8)
+
+        # (N,4,3) corners in the sheet frame, top-left, top-right, bottom-right, bottom-left
+        self.px_per_meter = marker_px / marker_length
+        self.origin_px = (0, 0)
+        corners = []
+        for i, marker_id in enumerate(self.marker_ids):
+            x = gap + (i % cols) * pitch
+            y = gap + (i // cols) * pitch
+            self.texture[y:y+marker_px, x:x+marker_px] = gen_ArUco_marker(self.dictionary, int(marker_id), marker_px)
+            corners.append([[x, y, 0], [x + marker_px, y, 0],
+                            [x + marker_px, y + marker_px, 0], [x, y + marker_px, 0]])
+        self.object_corners = np.float64(corners) / self.px_per_meter
+        self.size = (self.texture.shape[1] / self.px_per_meter, self.texture.shape[0] / self.px_per_meter)
+
+    def marker_poses(self, rvec, tvec):
+        """Ground truth marker poses in the estimatePoseSingleMarkers convention
+        (origin at the marker center, y up, z towards the camera).
+        """
+        R = cv2.Rodrigues(np.float64(rvec))[0]
+        centers = self.object_corners.mean(axis=1)
+        tvecs = centers @ R.T + np.float64(tvec).ravel()
+        R_marker = R @ np.diag([1.0, -1.0, -1.0])
+        return cv2.Rodrigues(R_marker)[0].ravel(), tvecs
+
+def rotation_error_deg(rvec_estimated, rvec_true):
+    R_estimated = cv2.Rodrigues(np.float64(rvec_estimated).reshape(3,1))[0]
+    R_true = cv2.Rodrigues(np.float64(rvec_true).reshape(3,1))[0]
+    return np.degrees(np.linalg.norm(cv2.Rodrigues(R_estimated @ R_true.T)[0]))
+
+def summary_stats(values, percentiles=(50, 90, 99)):
+    """Mean, max and percentiles of values, None if empty."""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return None
+    stats = {'mean': float(values.mean()), 'max': float(values.max())}
+    for p in percentiles:
+        stats['p{}'.format(p)] = float(np.percentile(values, p))
+    return stats
+
+class _CaseResult(object):
+    def __init__(self):
+        self.latency_ms = []
+        self.corner_errors = []
+        self.corner_offsets = []
+        self.rotation_errors = []
+        self.translation_errors = []
+        self.expected = 0
+        self.detected = 0
+        self.false_positives = 0
+        self.frames = 0
+        self.elapsed = 0.0
+
+    def add_corners(self, detected, ground_truth):
+        offsets = np.asarray(detected, dtype=np.float64).reshape(-1,2) - ground_truth.reshape(-1,2)
+        self.corner_offsets.append(offsets)
+        self.corner_errors.extend(np.linalg.norm(offsets, axis=1))
+
+    def add_pose(self, rvec, tvec, rvec_true, tvec_true):
+        self.rotation_errors.append(rotation_error_deg(rvec, rvec_true))
+        self.translation_errors.append(1000.0 * np.linalg.norm(np.ravel(tvec) - np.ravel(tvec_true)))
+
+    def report(self):
+        offsets = np.concatenate(self.corner_offsets) if self.corner_offsets else np.zeros((0,2))
+        return {'frames': self.frames,
+                'fps': self.frames / self.elapsed if self.elapsed > 0 else None,
+                'latency_ms': summary_stats(self.latency_ms),
+                'detection_rate': self.detected / float(self.expected) if self.expected else None,
+                'false_positives': self.false_positives,
+                'corner_error_px': summary_stats(self.corner_errors),
+                'corner_bias_px': offsets.mean(axis=0).tolist() if len(offsets) else None,
+                'rotation_error_deg': summary_stats(self.rotation_errors),
+                'translation_error_mm': summary_stats(self.translation_errors)}
+
+def make_renderer(case):
+    """SceneRenderer of a case: RESOLUTION, optional DISTORTION, NOISE_SIGMA, BLUR_SIGMA."""
+    image_size = tuple(case['RESOLUTION'])
+    camera_matrix = synthetic_camera_matrix(image_size)
+    dist_coeffs = np.float64(case.get('DISTORTION', [0, 0, 0, 0, 0]))
+    return SceneRenderer(camera_matrix, dist_coeffs, image_size,
+                         noise_sigma=case.get('NOISE_SIGMA', 0.0),
+                         blur_sigma=case.get('BLUR_SIGMA', 0.0))
+
+def benchmark_charuco(case, frames=30, seed=0):
+    """case: RESOLUTION, ARUCO_DICT (name in common.ARUCO_DICT), SQUARES_VERTICALLY, SQUARES_HORIZONTALLY,
+    SQUARE_LENGTH, MARKER_LENGTH, optional DISTORTION, NOISE_SIGMA, BLUR_SIGMA.
+    Times CharucoDetector.detect + estimate_board_pose.
+    """
+    rng = np.random.default_rng(seed)
+    config = dict(case)
+    config['ARUCO_DICT'] = common.ARUCO_DICT[case['ARUCO_DICT']]
+    scene = CharucoScene(config)
+    renderer = make_renderer(case)
+    detector = CharucoDetector(config)
+    K, D = renderer.camera_matrix, renderer.dist_coeffs
+
+    result = _CaseResult()
+    for i in range(frames + 1):
+        rvec, tvec = random_pose(rng, scene.size, K, renderer.image_size)
+        frame = renderer.render(scene.texture, scene.px_per_meter, scene.origin_px, rvec, tvec, rng)
+
+        start = time.perf_counter()
+        charuco_corners, charuco_ids = detector.detect(frame).charuco(0)
+        retval, rvec_estimated, tvec_estimated = detector.estimate_board_pose(charuco_corners, charuco_ids, K, D)
+        latency = time.perf_counter() - start
+        # the first frame only warms up
+        if i == 0:
+            continue
+
+        result.frames += 1
+        result.elapsed += latency
+        result.latency_ms.append(1000.0 * latency)
+
+        ground_truth = renderer.project(scene.object_points, rvec, tvec)
+        visible = renderer.inside(ground_truth)
+        result.expected += int(visible.sum())
+        if len(charuco_ids) > 0:
+            ids = charuco_ids.ravel()
+            result.detected += int(visible[ids].sum())
+            result.add_corners(charuco_corners, ground_truth[ids])
+        if retval:
+            result.add_pose(rvec_estimated, tvec_estimated, rvec, tvec)
+    return result.report()
+
+def benchmark_markers(case, frames=30, seed=0):
+    """case: RESOLUTION, ARUCO_DICT (name in common.ARUCO_DICT), MARKER_COUNT,
+    optional MARKER_LENGTH, DISTORTION, NOISE_SIGMA, BLUR_SIGMA.
+    Times ArucoDetector.detect + marker_pose.estimate_marker_poses.
+    """
+    rng = np.random.default_rng(seed)
+    aruco_dict = common.ARUCO_DICT[case['ARUCO_DICT']]
+    marker_length = case.get('MARKER_LENGTH', 0.05)
+    scene = MarkerSheetScene(aruco_dict, case['MARKER_COUNT'], marker_length)
+    renderer = make_renderer(case)
+    detector = ArucoDetector({'ARUCO_DICT': aruco_dict})
+    K, D = renderer.camera_matrix, renderer.dist_coeffs
+
+    result = _CaseResult()
+    for i in range(frames + 1):
+        rvec, tvec = random_pose(rng, scene.size, K, renderer.image_size)
+        frame = renderer.render(scene.texture, scene.px_per_meter, scene.origin_px, rvec, tvec, rng)
+
+        start = time.perf_counter()
+        marker_corners, marker_ids = detector.detect(frame)
+        rvecs, tvecs, _ = estimate_marker_poses(marker_corners, marker_length, K, D)
+        latency = time.perf_counter() - start
+        # the first frame only warms up
+        if i == 0:
+            continue
+
+        result.frames += 1
+        result.elapsed += latency
+        result.latency_ms.append(1000.0 * latency)
+
+        ground_truth = renderer.project(scene.object_corners, rvec, tvec).reshape(-1,4,2)
+        visible = np.all(renderer.inside(ground_truth.reshape(-1,2)).reshape(-1,4), axis=1)
+        result.expected += int(visible.sum())
+
+        rvec_marker, tvecs_marker = scene.marker_poses(rvec, tvec)
+        seen = set()
+        for j, marker_id in enumerate(marker_ids):
+            if marker_id >= len(scene.marker_ids) or marker_id in seen:
+                result.false_positives += 1
+                continue
+            seen.add(marker_id)
+            result.detected += int(visible[marker_id])
+            result.add_corners(marker_corners[j], ground_truth[marker_id])
+            result.add_pose(rvecs[j], tvecs[j], rvec_marker, tvecs_marker[marker_id])
+    return result.report()
+
+def _revision():
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+        return output.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run_benchmark(charuco_cases, marker_cases, frames=30, seed=0, report_path=None):
+    """Runs all the cases, returns the report (and writes it as JSON to report_path)."""
+    report = {'meta': {'revision': _revision(),
+                       'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'opencv': cv2.__version__,
+                       'numpy': np.__version__,
+                       'python': platform.python_version(),
+                       'platform': platform.platform(),
+                       'cpu_count': os.cpu_count(),
+                       'frames': frames,
+                       'seed': seed},
+              'charuco': [],
+              'markers': []}
+
+    for case in charuco_cases:
+        print('[INFO] ChArUco {} {}'.format(case['ARUCO_DICT'], tuple(case['RESOLUTION'])))
+        report['charuco'].append({'case': case, 'result': benchmark_charuco(case, frames, seed)})
+
+    for case in marker_cases:
+        print('[INFO] Markers {} x{} {}'.format(case['ARUCO_DICT'], case['MARKER_COUNT'], tuple(case['RESOLUTION'])))
+        report['markers'].append({'case': case, 'result': benchmark_markers(case, frames, seed)})
+
+    if report_path is not None:
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+def _print_summary(report):
+    row = '{:<8} {:<20} {:>10} {:>6} {:>8} {:>8} {:>7} {:>9} {:>8}'
+    print(row.format('scene', 'case', 'resolution', 'fps', 'p50 ms', 'p99 ms', 'det %', 'err px', 'rot deg'))
+    for scene in ('charuco', 'markers'):
+        for entry in report[scene]:
+            case, result = entry['case'], entry['result']
+            name = case['ARUCO_DICT'] + ('' if scene == 'charuco' else ' x{}'.format(case['MARKER_COUNT']))
+            print(row.format(scene, name,
+                             '{}x{}'.format(*case['RESOLUTION']),
+                             '{:.0f}'.format(result['fps']),
+                             '{:.2f}'.format(result['latency_ms']['p50']),
+                             '{:.2f}'.format(result['latency_ms']['p99']),
+                             '{:.0f}'.format(100 * (result['detection_rate'] or 0)),
+                             '{:.3f}'.format(result['corner_error_px']['mean']) if result['corner_error_px'] else '-',
+                             '{:.2f}'.format(result['rotation_error_deg']['p50']) if result['rotation_error_deg'] else '-'))
+
+def main():
+    # ------------------------------
+    resolutions = [(640, 480), (1280, 720), (1920, 1080)]
+    dictionaries = ['DICT_4X4_50', 'DICT_6X6_250', 'DICT_APRILTAG_36h11']
+    marker_counts = [1, 4, 16]
+    imaging = {'NOISE_SIGMA': 3.0,
+               'BLUR_SIGMA': 0.8,
+               'DISTORTION': [-0.1, 0.02, 0, 0, 0]}
+    frames = 30
+    report_path = 'benchmark_report.json'
+    # ------------------------------
+
+    charuco_cases = []
+    for resolution, aruco_dict in itertools.product(resolutions, dictionaries):
+        case = {'RESOLUTION': resolution,
+                'ARUCO_DICT': aruco_dict,
+                'SQUARES_VERTICALLY': 6,
+                'SQUARES_HORIZONTALLY': 4,
+                'SQUARE_LENGTH': 30 / 1000.0,
+                'MARKER_LENGTH': 15 / 1000.0}
+        case.update(imaging)
+        charuco_cases.append(case)
+
+    marker_cases = []
+    for resolution, aruco_dict, marker_count in itertools.product(resolutions, dictionaries, marker_counts):
+        case = {'RESOLUTION': resolution,
+                'ARUCO_DICT': aruco_dict,
+                'MARKER_COUNT': marker_count,
+                'MARKER_LENGTH': 50 / 1000.0}
+        case.update(imaging)
+        marker_cases.append(case)
+
+    report = run_benchmark(charuco_cases, marker_cases, frames=frames, report_path=report_path)
+    _print_summary(report)
+    print('[INFO] Report saved to {}'.format(report_path))
+
+if __name__ == '__main__':
+    main()
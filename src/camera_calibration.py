@@ -6,6 +6,7 @@
 
 import os
 from glob import glob
+from concurrent.futures import ProcessPoolExecutor
 
 import cv2
 import numpy as np
@@ -15,55 +16,204 @@ from tqdm import tqdm
 from uuid import uuid4
 
 from aruco_detectors import CharucoDetector
+from common import init_pool_worker
+from detection_cache import DetectionCache
+from detections import Detections, DetectionsRecorder
+from image_writer import AsyncImageWriter
+from profiling import NULL_PROFILER
+from rendering import Display, draw_charuco_corners
+from undistortion import undistort
+from video_stream import FrameGrabber
+from view_selection import CoverageViewSelector
+
+# detections of the accepted views, saved with the frames of a stream session
+SESSION_DETECTIONS = 'detections.det'
+
+def _detect_image(board_detector, imagepath, cache=None):
+    """Returns the single frame Detections of the image and its size (w, h), (None, None) if unreadable."""
+    profiler = board_detector.profiler
+    if cache is None:
+        with profiler.span('read_image'):
+            image = cv2.imread(imagepath)
+    else:
+        image_bytes, key = cache.read(imagepath)
+        entry = cache.get(key)
+        if entry is not None:
+            profiler.count('cache_hits')
+            return entry
+        with profiler.span('read_image'):
+            image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    if image is None:
+        return None, None
 
-def camera_calibrate(config, images_path_list):
-    # Define the aruco dictionary and charuco board
-    dictionary = cv2.aruco.getPredefinedDictionary(config['ARUCO_DICT'])
-    board = cv2.aruco.CharucoBoard((config['SQUARES_VERTICALLY'],
-                                    config['SQUARES_HORIZONTALLY']),
-                                    config['SQUARE_LENGTH'],
-                                    config['MARKER_LENGTH'],
-                                    dictionary)
-    params = cv2.aruco.DetectorParameters()
-
-    all_charuco_corners = []
-    all_charuco_ids = []
-
-    h, w = cv2.imread(images_path_list[0]).shape[:2]
-    for imagepath in tqdm(images_path_list):
+    h, w = image.shape[:2]
+    detection = board_detector.detect(image)
+    if cache is not None:
+        cache.put(key, detection, (w, h))
+    return detection, (w, h)
+
+def _collect_detections(results):
+    recorder = DetectionsRecorder()
+    image_size = None
+
+    for detection, size in results:
+        if detection is None:
+            # unreadable image, an empty frame keeps the frames aligned with the images
+            recorder.append((), None)
+            continue
+        if image_size is None:
+            image_size = size
+        recorder.append_frame(detection)
+
+    return recorder.build(), image_size
+
+def detect_charuco_corners(board_detector, images_path_list, cache=None):
+    """Runs the charuco detection over all images.
+    Returns the detections.Detections of all the images (frame i is images_path_list[i])
+    and the image size (w, h), detections.charuco_lists() gives the calibration inputs.
+    With a DetectionCache, images already seen with the same board config are not decoded nor detected again.
+    """
+    results = (_detect_image(board_detector, imagepath, cache) for imagepath in tqdm(images_path_list))
+    return _collect_detections(results)
+
+# one detector (and detection cache) per worker process, built by the pool initializer
+_worker_detector = None
+_worker_cache = None
+
+def _init_detection_worker(config, cache_dir):
+    global _worker_detector, _worker_cache
+    init_pool_worker()
+    _worker_detector = CharucoDetector(config)
+    if cache_dir is not None:
+        _worker_cache = DetectionCache(cache_dir, config, _worker_detector.params)
+
+def _detect_image_in_worker(imagepath):
+    return _detect_image(_worker_detector, imagepath, _worker_cache)
+
+def detect_charuco_corners_parallel(config, images_path_list, workers=None, chunksize=4, cache_dir=None):
+    """Same as detect_charuco_corners, but the image decoding and the detection are spread
+    over a pool of `workers` processes (all cores by default).
+    Only the packed detections come back to the parent, in the order of images_path_list.
+    """
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_detection_worker,
+                             initargs=(config, cache_dir)) as executor:
+        results = executor.map(_detect_image_in_worker, images_path_list, chunksize=chunksize)
+        return _collect_detections(tqdm(results, total=len(images_path_list)))
+
+def calibrate_from_detections(board,
+                              all_charuco_corners,
+                              all_charuco_ids,
+                              image_size,
+                              camera_matrix=None,
+                              dist_coeffs=None,
+                              flags=0):
+    """Single calibration solve over all the collected detections.
+    Pass camera_matrix/dist_coeffs together with cv2.CALIB_USE_INTRINSIC_GUESS to warm-start it.
+    Returns retval, camera_matrix, dist_coeffs, rvecs, tvecs.
+    """
+    return cv2.aruco.calibrateCameraCharuco(all_charuco_corners,
+                                            all_charuco_ids,
+                                            board,
+                                            image_size,
+                                            camera_matrix,
+                                            dist_coeffs,
+                                            flags=flags)
+
+class IncrementalCalibrator(object):
+    """Refines the camera intrinsics as new views arrive.
+
+    Every solve after the first one is warm-started from the previous solution
+    with cv2.CALIB_USE_INTRINSIC_GUESS, so it converges in a few iterations
+    instead of starting from scratch.
+    """
+    def __init__(self, board, image_size, min_views=5, refine_every=1, flags=0):
+        self.board = board
+        self.image_size = image_size
+        self.min_views = min_views
+        self.refine_every = refine_every
+        self.flags = flags
+
+        self.all_charuco_corners = []
+        self.all_charuco_ids = []
+        self.camera_matrix = None
+        self.dist_coeffs = None
+        self.retval = None
+        self._views_since_refine = 0
+
+    def add_view(self, charuco_corners, charuco_ids):
+        """Adds the detections of a new view, returns True when the intrinsics were refined."""
+        self.all_charuco_corners.append(charuco_corners)
+        self.all_charuco_ids.append(charuco_ids)
+        self._views_since_refine += 1
+
+        if len(self.all_charuco_corners) < self.min_views:
+            return False
+        if self.camera_matrix is not None and self._views_since_refine < self.refine_every:
+            return False
+        self.refine()
+        return True
+
+    def finish(self):
+        """Last solve including the views added since the previous one, returns camera_matrix, dist_coeffs."""
+        if self.camera_matrix is None or self._views_since_refine > 0:
+            self.refine()
+        return self.camera_matrix, self.dist_coeffs
+
+    def refine(self):
+        flags = self.flags
+        if self.camera_matrix is not None:
+            flags |= cv2.CALIB_USE_INTRINSIC_GUESS
+
+        self.retval, self.camera_matrix, self.dist_coeffs, _, _ = calibrate_from_detections(self.board,
+                                                                                            self.all_charuco_corners,
+                                                                                            self.all_charuco_ids,
+                                                                                            self.image_size,
+                                                                                            self.camera_matrix,
+                                                                                            self.dist_coeffs,
+                                                                                            flags)
+        self._views_since_refine = 0
+        return self.camera_matrix, self.dist_coeffs
+
+def camera_calibrate(config, images_path_list, flags=0, workers=1, cache_dir=None, profiler=None, preview=True):
+    """cache_dir: optional DetectionCache directory, re-calibrating the same images
+    with other flags then skips the image decoding and detection.
+    preview: shows a few undistorted images once calibrated, False for headless runs.
+    profiler: optional profiling.Profiler, the per-image stages are only timed
+    with workers=1 (the parallel detection runs in other processes).
+    """
+    profiler = profiler or NULL_PROFILER
+    board_detector = CharucoDetector(config, profiler=profiler)
+
+    with profiler.span('detection'):
+        if workers == 1:
+            cache = None
+            if cache_dir is not None:
+                cache = DetectionCache(cache_dir, config, board_detector.params)
+            detections, image_size = detect_charuco_corners(board_detector, images_path_list, cache)
+        else:
+            detections, image_size = detect_charuco_corners_parallel(config,
+                                                                     images_path_list,
+                                                                     workers,
+                                                                     cache_dir=cache_dir)
+    all_charuco_corners, all_charuco_ids = detections.charuco_lists()
+
+    # Calibrate camera once over all the collected detections
+    with profiler.span('calibrate'):
+        retval, camera_matrix, dist_coeffs, rvecs, tvecs = calibrate_from_detections(board_detector.board,
+                                                                                     all_charuco_corners,
+                                                                                     all_charuco_ids,
+                                                                                     image_size,
+                                                                                     flags=flags)
+    if not preview:
+        return camera_matrix, dist_coeffs
 
-        image = cv2.imread(imagepath)
-        image_copy = image.copy()
-
-        # print(imagepath)
-        # print(image.shape)
-
-        marker_corners, marker_ids, _ = cv2.aruco.detectMarkers(image,
-                                                                dictionary,
-                                                                parameters=params)
-
-        # If at least one marker is detected
-        if len(marker_corners) > 0:
-            cv2.aruco.drawDetectedMarkers(image_copy, marker_corners, marker_ids)
-            charuco_retval, charuco_corners, charuco_ids = cv2.aruco.interpolateCornersCharuco(marker_corners, marker_ids, image, board)
-            if charuco_retval:
-                all_charuco_corners.append(charuco_corners)
-                all_charuco_ids.append(charuco_ids)
-
-            # cv2.imshow('drawDetectedMarkers', image_copy)
-            # cv2.waitKey(0)
-
-        # Calibrate camera
-        retval, camera_matrix, dist_coeffs, rvecs, tvecs = cv2.aruco.calibrateCameraCharuco(all_charuco_corners,
-                                                                                            all_charuco_ids,
-                                                                                            board,
-                                                                                            (h, w),
-                                                                                            None,
-                                                                                            None)
     # Iterate through displaying all the images
     for i, imagepath in enumerate(images_path_list):
         image = cv2.imread(imagepath)
-        undistorted_image = cv2.undistort(image, camera_matrix, dist_coeffs)
+        with profiler.span('undistort'):
+            undistorted_image = undistort(image, camera_matrix, dist_coeffs)
         cv2.imshow('Undistorted Image', undistorted_image)
         cv2.waitKey(0)
         if i > 10:
@@ -72,82 +222,143 @@ def camera_calibrate(config, images_path_list):
 
     return camera_matrix, dist_coeffs
 
-def camera_calibration_from_images_dir(config, images_dir):
+def camera_calibration_from_images_dir(config, images_dir, workers=None, cache_dir=None):
+    """workers: number of detection processes, None uses all the cores.
+    cache_dir: optional on-disk detection cache (see detection_cache.DetectionCache).
+    """
     images_path_list = glob(f'{images_dir}/*.jpg')
     images_path_list += glob(f'{images_dir}/*.png')
 
     assert len(images_path_list) != 0, 'Fail to find images in images_dir: {}'.format(images_dir)
 
-    camera_matrix, dist_coeffs = camera_calibrate(config, images_path_list)
+    camera_matrix, dist_coeffs = camera_calibrate(config, images_path_list, workers=workers, cache_dir=cache_dir)
+    return camera_matrix, dist_coeffs
+
+def camera_calibration_from_session_dir(config, session_dir, flags=0):
+    """Calibrates again a session saved by camera_calibration_from_stream(save_frames=True)
+    from its saved detections (e.g. with other flags), the frames are neither decoded nor detected,
+    only the first one is read for the image size.
+    """
+    detections = Detections.load(os.path.join(session_dir, SESSION_DETECTIONS))
+    images_path_list = glob(f'{session_dir}/*.jpg')
+    assert len(images_path_list) != 0, 'Fail to find images in session_dir: {}'.format(session_dir)
+    h, w = cv2.imread(images_path_list[0]).shape[:2]
+
+    all_charuco_corners, all_charuco_ids = detections.charuco_lists()
+    board = CharucoDetector(config).board
+    retval, camera_matrix, dist_coeffs, rvecs, tvecs = calibrate_from_detections(board,
+                                                                                 all_charuco_corners,
+                                                                                 all_charuco_ids,
+                                                                                 (w, h),
+                                                                                 flags=flags)
     return camera_matrix, dist_coeffs
 
-def camera_calibration_from_stream(config, video_stream, max_frames=25):
+def camera_calibration_from_stream(config, video_stream, max_frames=25, selector_kwargs=None, save_frames=False, flags=0,
+                                   profiler=None, headless=False, display_fps=15, refine_every=5):
     """
-        It will read the video stream and save all frames where
-        the program can detect the expected charuco board.
+        It will read the video stream and keep the charuco detections of the frames where
+        the program can detect the expected charuco board and that add
+        new image coverage or a new board orientation (see view_selection.CoverageViewSelector).
+        The capture stops once the coverage targets are met, max_frames is only a safety limit.
+
+        The live detections are fed directly to an IncrementalCalibrator, refined every
+        refine_every accepted views during the capture, the frames are only
+        written to disk (on a background thread) when save_frames is True.
+        The saved session also gets the detections of the accepted views (detections.det),
+        see camera_calibration_from_session_dir to calibrate it again without detecting.
+
+        profiler: optional profiling.Profiler for the capture, detection, view selection
+        and calibration stages.
+        The detections are drawn and shown on a rendering.Display at display_fps,
+        nothing is drawn nor shown with headless=True.
     """
+    profiler = profiler or NULL_PROFILER
 
-    # Create a new folder to store the frames containing charuco board
-    images_dir = os.path.join('assets/frames_automatic_saved-{}'.format(time.strftime("%Y%m%d-%H%M%S")))
-    os.makedirs(images_dir)
+    writer = None
+    recorder = None
+    if save_frames:
+        # Create a new folder to store the frames containing charuco board
+        images_dir = os.path.join('assets/frames_automatic_saved-{}'.format(time.strftime("%Y%m%d-%H%M%S")))
+        os.makedirs(images_dir)
+        writer = AsyncImageWriter()
+        recorder = DetectionsRecorder()
 
     # open the video stream
-    video = cv2.VideoCapture(video_stream)
+    video = FrameGrabber(video_stream)
 
     # create charuco board detector
-    board_detector = CharucoDetector(config)
+    board_detector = CharucoDetector(config, profiler=profiler)
+    display = None if headless else Display('input', max_fps=display_fps, quit_keys=(ord('q'),))
+
+    def capture_views():
+        """Returns the number of accepted views and the IncrementalCalibrator fed with them."""
+        selector = None
+        calibrator = None
+        frames_saved = 0
+        with tqdm(total=max_frames) as prog_bar:
+            while True:
+
+                if frames_saved >= max_frames or (selector is not None and selector.done):
+                    print(frames_saved)
+                    break
+
+                if display is not None and display.stopped:
+                    break
+
+                with profiler.span('capture'):
+                    ret, frame = video.read()
+                if ret == False: break
+
+                if selector is None:
+                    h, w = frame.shape[:2]
+                    image_size = (w, h)
+                    selector = CoverageViewSelector(board_detector.board, image_size, **(selector_kwargs or {}))
+                    calibrator = IncrementalCalibrator(board_detector.board, image_size, refine_every=refine_every,
+                                                       flags=flags)
+
+                # pass to charuco board detector
+                detection = board_detector.detect(frame)
+                charuco_corners, charuco_ids = detection.charuco(0)
+                if len(charuco_ids) > 0:
+                    # only keep the views adding information to the calibration
+                    with profiler.span('view_selection'):
+                        accepted = selector.accept(charuco_corners, charuco_ids)
+                    if accepted:
+                        with profiler.span('calibrate'):
+                            calibrator.add_view(charuco_corners, charuco_ids)
+
+                        if writer is not None:
+                            filename = '{}.jpg'.format(uuid4().hex)
+                            writer.write(os.path.join(images_dir, filename), frame)
+                            recorder.append_frame(detection)
+
+                        prog_bar.update(1)
+                        prog_bar.set_postfix(coverage='{:.0%}'.format(selector.coverage),
+                                             poses=len(selector.pose_bins))
+                        frames_saved += 1
+
+                if display is not None:
+                    # the frame is not used here anymore (the writer keeps its own copy), drawn in place
+                    display.submit(frame, draw_charuco_corners, charuco_corners, charuco_ids)
+                profiler.set_counter('frames_dropped', video.frames_dropped)
+                profiler.tick()
+        return frames_saved, calibrator
 
     print('[INFO] Taking photos of the charuco board...')
-    frames_saved = 0
-    prog_bar = tqdm(total=max_frames)
-    prev_timestamp = time.time()
-    while True:
-
-        if frames_saved >= max_frames:
-            print(frames_saved)
-            break
-
-        ret, frame = video.read()
-        if ret == False: break
-        viz_image = frame.copy()
-
-        # pass to charuco board detector
-        charuco_retval, charuco_corners, charuco_ids = board_detector.detect(frame)
-        if charuco_retval:
-
-            for idx, charuco_corner in enumerate(charuco_corners):
-                xc = int(charuco_corner[0][0])
-                yc = int(charuco_corner[0][1])
-
-                color = (0, 255, 0) # BGR
-
-                cv2.circle(viz_image, (xc, yc), 5, color, -1)
-
-                corner_id = charuco_ids[idx]
-                cv2.putText(viz_image, '{}'.format(corner_id), (xc-10, yc-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-
-                # print(time.time() - prev_timestamp)
-                if (time.time() - prev_timestamp) >= 5:
-                    filename = '{}.jpg'.format(uuid4().hex)
-                    imagepath = os.path.join(images_dir, filename)
-                    cv2.imwrite(imagepath, frame)
-
-                    prog_bar.update(1)
-                    frames_saved += 1
-                    prev_timestamp = time.time()
-
-        cv2.imshow('input', viz_image)
-        k = cv2.waitKey(1) & 0xFF
-        if k == ord('q'):
-            break
+    # the display stays on the main thread, the capture then runs on a worker
+    frames_saved, calibrator = capture_views() if display is None else display.run(capture_views)
 
+    video.release()
+    if writer is not None:
+        writer.close()
+        recorder.build().save(os.path.join(images_dir, SESSION_DETECTIONS))
 
     print('[INFO] Computing camera parameters...')
     if frames_saved == 0:
         return None, None
-    images_path_list = glob(f'{images_dir}/*.jpg')
-    camera_matrix, dist_coeffs = camera_calibrate(config, images_path_list)
-    return camera_matrix, dist_coeffs
+    # only the views accepted since the last refinement are left to solve
+    with profiler.span('calibrate'):
+        return calibrator.finish()
 
 def main():
     # ------------------------------
@@ -25,10 +25,19 @@
 # in the same way that the standard calibration does with the traditional chessboard pattern.
 # However, due to the benefits of using ChArUco, occlusions and partial views are allowed, and not all the corners need to be visible in all the viewpoints.
 
+import os
+import sys
+import json
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 import cv2.aruco as aruco
+import numpy as np
 
 import common
+from marker_atlas import mm_to_px, save_pages
 
 def create_new_charuco_board(config_dict):
     """Sample:
@@ -57,6 +66,152 @@ def create_new_charuco_board(config_dict):
 
     return board, image
 
+def board_label(config_dict):
+    text = 'Pattern: {}x{} | Square Size: {:.1f} mm | Marker: {:.1f} mm | Dictionary: {}'
+    dict_names = {value: name for name, value in common.ARUCO_DICT.items()}
+    return text.format(config_dict['SQUARES_HORIZONTALLY'],
+                       config_dict['SQUARES_VERTICALLY'],
+                       config_dict['SQUARE_LENGTH']*1000.0,
+                       config_dict['MARKER_LENGTH']*1000.0,
+                       dict_names.get(config_dict['ARUCO_DICT'], config_dict['ARUCO_DICT']))
+
+def true_scale_config(config_dict, dpi):
+    """Copy of the config rendered at dpi without margin: a whole number of pixels per square,
+    so the board prints at SQUARE_LENGTH (up to half a pixel per square).
+    """
+    config_dict = dict(config_dict)
+    square_px = mm_to_px(config_dict['SQUARE_LENGTH']*1000.0, dpi)
+    config_dict['LENGTH_PX'] = config_dict['SQUARES_VERTICALLY'] * square_px
+    config_dict['MARGIN_PX'] = 0
+    return config_dict
+
+def board_image_key(config_dict):
+    """Hash of everything the rendered image depends on: board config, output size and OpenCV version."""
+    key = {name: config_dict[name] for name in common.BOARD_CONFIG_KEYS + ('LENGTH_PX', 'MARGIN_PX')}
+    key['opencv'] = cv2.__version__
+    text = json.dumps(key, sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+class BoardImageCache(object):
+    """Rendered board images stored as PNG files named by board_image_key.
+
+    Sample:
+        cache = BoardImageCache('assets/board_cache')
+        image = cache.render(config)  # only rendered the first time
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, '{}.png'.format(key))
+
+    def get(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is not None:
+            self.hits += 1
+        return image
+
+    def put(self, key, image):
+        path = self._path(key)
+        tmp_path = '{}.{}.tmp.png'.format(path[:-len('.png')], os.getpid())
+        cv2.imwrite(tmp_path, image)
+        # atomic, a concurrent reader never sees a partially written image
+        os.replace(tmp_path, path)
+
+    def render(self, config_dict):
+        key = board_image_key(config_dict)
+        image = self.get(key)
+        if image is None:
+            self.misses += 1
+            _, image = create_new_charuco_board(config_dict)
+            self.put(key, image)
+        return image
+
+def render_boards(config_list, cache_dir='assets/board_cache', workers=None):
+    """Board images of all the configs (same order), rendered on a thread pool
+    or read back from the cache.
+    """
+    cache = BoardImageCache(cache_dir)
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        images = list(executor.map(cache.render, config_list))
+    return images, cache
+
+def layout_boards_on_pages(images, labels=None, dpi=300, margin_mm=10, gap_mm=10):
+    """Places the images (at their size, so at true scale for the dpi they were rendered at)
+    on as few A4 portrait pages as the shelf packing finds: tallest first, left to right,
+    a new row when the page width is full and a new page when the height is.
+    A board wider than the page is turned by 90 degrees when it then fits.
+    The label, if any, is written under its board. Returns the list of pages.
+    """
+    page_w = mm_to_px(common.A4_width, dpi)
+    page_h = mm_to_px(common.A4_height, dpi)
+    margin = mm_to_px(margin_mm, dpi)
+    gap = mm_to_px(gap_mm, dpi)
+    label_h = gap if labels is not None else 0
+    font_scale = gap / 120.0
+
+    fits = lambda image: (image.shape[1] <= page_w - 2*margin and
+                          image.shape[0] + label_h <= page_h - 2*margin)
+    images = [np.rot90(image) if not fits(image) and fits(np.rot90(image)) else image for image in images]
+
+    pages = []
+    page = None
+    x = y = row_h = 0
+    for i in sorted(range(len(images)), key=lambda i: -images[i].shape[0]):
+        image = images[i]
+        h, w = image.shape[:2]
+        if not fits(image):
+            raise ValueError('Board {} ({}x{} px) does not fit on an A4 page at {} dpi'.format(i, w, h, dpi))
+
+        if page is not None and x + w > page_w - margin:
+            # next row
+            x, y, row_h = margin, y + row_h + gap, 0
+        if page is None or y + h + label_h > page_h - margin:
+            page = np.full((page_h, page_w), 255, dtype=np.uint8)
+            pages.append(page)
+            x, y, row_h = margin, margin, 0
+
+        page[y:y+h, x:x+w] = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if labels is not None:
+            cv2.putText(page, labels[i], (x, y + h + int(label_h*0.7)), cv2.FONT_HERSHEY_SIMPLEX,
+                        font_scale, 27, max(1, int(round(font_scale*2))))
+        x += w + gap
+        row_h = max(row_h, h + label_h)
+    return pages
+
+def batch_main():
+    # ------------------------------
+    dpi = 300
+    cache_dir = 'assets/board_cache'
+    save_name = 'ChArUco_Boards.tif'
+
+    config_list = []
+    for aruco_dict in (cv2.aruco.DICT_4X4_50, cv2.aruco.DICT_5X5_100):
+        for squares, square_length, marker_length in (((6, 4), 30, 15),
+                                                      ((7, 5), 25, 18),
+                                                      ((5, 3), 40, 30)):
+            config = {}
+            config['ARUCO_DICT'] = aruco_dict
+            config['SQUARES_VERTICALLY'] = squares[0]
+            config['SQUARES_HORIZONTALLY'] = squares[1]
+            config['SQUARE_LENGTH'] = square_length / 1000.0
+            config['MARKER_LENGTH'] = marker_length / 1000.0
+            config_list.append(true_scale_config(config, dpi))
+    # ------------------------------
+
+    start = time.perf_counter()
+    images, cache = render_boards(config_list, cache_dir)
+    pages = layout_boards_on_pages(images, [board_label(config) for config in config_list], dpi)
+    save_pages(pages, save_name, dpi)
+    print('[INFO] {} boards ({} rendered, {} cached) on {} pages in {:.2f} s -> {}'.format(
+          len(images), cache.misses, cache.hits, len(pages), time.perf_counter() - start, save_name))
+
 def main():
     # ------------------------------
     config = {}
@@ -72,13 +227,7 @@ def main():
 
     _, charuco_image = create_new_charuco_board(config)
 
-    text = 'Pattern: {}x{} | Square Size: {:.1f} mm | Marker: {:.1f} mm | Dictionary: {}'
-    text = text.format(config['SQUARES_HORIZONTALLY'],
-                       config['SQUARES_VERTICALLY'],
-                       config['SQUARE_LENGTH']*1000.0,
-                       config['MARKER_LENGTH']*1000.0,
-                       'DICT_4X4_50'
-                       )
+    text = board_label(config)
     h, w  = charuco_image.shape[:2]
     org = (config['MARGIN_PX']//2, h-config['MARGIN_PX']//2)
 
@@ -96,4 +245,8 @@ def main():
     cv2.waitKey(0)
 
 if __name__=='__main__':
-    main()
\ No newline at end of file
+    # python charuco_board_generator.py --batch: all the boards of batch_main on A4 pages
+    if '--batch' in sys.argv[1:]:
+        batch_main()
+    else:
+        main()
\ No newline at end of file
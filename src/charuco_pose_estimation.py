@@ -6,103 +6,211 @@
 
 # Axis X (red color) - first coordinate, axis Y (green color) - second coordinate, axis Z (blue color)
 
+import threading
+from collections import OrderedDict
+
 import numpy as np
 import cv2
 
 from glob import glob
 
-def drawBoxes(image, corners, imgpts):
-    imgpts = np.int32(imgpts).reshape(-1,2)
-    # draw ground floor in green
-    image = cv2.drawContours(image, [imgpts[:4]], -1, (0,255,0), -1)
-    # draw pillars in blue color
-    for i, j in zip(range(4), range(4,8)):
-        image = cv2.line(image, tuple(imgpts[i]), tuple(imgpts[j]), (255,0,0),2)
-    # draw top layer in red color
-    image = cv2.drawContours(image, [imgpts[4:]], -1, (0,0,255),2)
-    return image
-
-def detect_pose(config, image, camera_matrix, dist_coeffs):
-    # Undistort the image
-    undistorted_image = cv2.undistort(image, camera_matrix, dist_coeffs)
-
-    # Define the aruco dictionary and charuco board
-    dictionary = cv2.aruco.getPredefinedDictionary(config['ARUCO_DICT'])
-    board = cv2.aruco.CharucoBoard((config['SQUARES_VERTICALLY'],
-                                    config['SQUARES_HORIZONTALLY']),
-                                    config['SQUARE_LENGTH'],
-                                    config['MARKER_LENGTH'],
-                                    dictionary)
-    params = cv2.aruco.DetectorParameters()
-
-    # Detect markers in the undistorted image
-    marker_corners, marker_ids, _ = cv2.aruco.detectMarkers(undistorted_image,
-                                                            dictionary,
-                                                            parameters=params)
-
-    # If at least one marker is detected
-    if len(marker_corners) > 0:
-        # Interpolate CharUco corners
-        charuco_retval, charuco_corners, charuco_ids = cv2.aruco.interpolateCornersCharuco(marker_corners,
-                                                                                           marker_ids,
-                                                                                           undistorted_image,
-                                                                                           board)
-
-        cv2.aruco.drawDetectedMarkers(undistorted_image, marker_corners, marker_ids)
-        # for i, marker_id in enumerate(marker_ids):
-        #     rvec, tvec, _ = cv2.aruco.estimatePoseSingleMarkers(marker_corners[i], 30/1000.0, camera_matrix, dist_coeffs)
-
-        #     for corner in marker_corners[i].reshape(-1,2):
-        #         cv2.circle(undistorted_image, tuple(np.int32(corner)), 2, (0,255,255), -1)
-
-        #     cv2.drawFrameAxes(undistorted_image,
-        #                       camera_matrix,
-        #                       dist_coeffs,
-        #                       rvec,
-        #                       tvec,
-        #                       0.02)
-        #     square_size = 15/1000.0
-        #     axisBoxes = np.float32([
-        #                             [-square_size, square_size, 0],
-        #                             [square_size, square_size, 0],
-        #                             [square_size,-square_size, 0],
-        #                             [-square_size,-square_size, 0],
-        #                             [-square_size, square_size, 2*square_size],
-        #                             [square_size, square_size, 2*square_size],
-        #                             [square_size,-square_size, 2*square_size],
-        #                             [-square_size,-square_size, 2*square_size],
-        #                            ]
-        #                             )
-        #     # project 3D points to image plane
-        #     imgpts, jac = cv2.projectPoints(axisBoxes, rvec, tvec, camera_matrix, dist_coeffs)
-        #     imgpts = imgpts.astype('int32').reshape(-1, 2)
-        #     drawBoxes(undistorted_image, marker_corners[i], imgpts)
-
-
+from aruco_detectors import CharucoDetector
+from common import BOARD_CONFIG_KEYS, DETECTION_MODE_KEYS
+from pose_tracking import PoseTracker
+from profiling import NULL_PROFILER, Profiler, print_summary
+from rendering import Display
+from undistortion import undistort, undistort_points
+from video_stream import FrameGrabber
+
+class CharucoPoseEstimator(object):
+    """Long-lived ChArUco board pose estimator.
+
+    The board and the aruco_detectors.CharucoDetector are built once here and reused
+    for every frame given to process(), the detection modes of the config (ROI_TRACKING,
+    PYRAMID_SCALE/EXPECTED_MARKER_PX, RESTRICT_DICTIONARY, DETECTOR_PROFILE) apply.
+
+    With corner_space=True the detection runs on the raw distorted frame and the
+    distortion is handled by the pose solver, the full frame is only undistorted
+    when draw() is called.
+
+    With a pose_tracking.PoseTracker the solver is seeded with the predicted pose
+    (useExtrinsicGuess), the output is filtered, and the pose is predicted when the
+    detection fails or is skipped (the detection only runs every detect_every frames).
+
+    With a profiling.Profiler the undistort, pose_solve and draw stages are timed
+    along with the stages of the CharucoDetector (detect_markers, interpolate_corners...),
+    which also counts the detection attempts/hits.
+    """
+    def __init__(self, config, camera_matrix, dist_coeffs, corner_space=False, tracker=None, detect_every=1,
+                 profiler=None):
+        self.config = config
+        self.profiler = profiler or NULL_PROFILER
+        self.corner_space = corner_space
+        self.tracker = tracker
+        self.detect_every = detect_every
+        self.frame_count = 0
+        self.camera_matrix = np.array(camera_matrix, dtype=np.float64).reshape(3,3)
+        self.dist_coeffs   = np.array(dist_coeffs, dtype=np.float64).reshape(1,-1)
+
+        self.detector = CharucoDetector(config, profiler=self.profiler)
+        self.board = self.detector.board
+
+        # results of the last processed frame, kept for drawing
+        self.image = None
+        self.marker_corners = ()
+        self.marker_ids = None
+
+    def process(self, frame, timestamp=None):
+        """Returns rvec, tvec, charuco_corners, charuco_ids for the given frame.
+        rvec and tvec are None when the board pose could not be estimated (nor predicted).
+        timestamp: capture time in seconds, only used by the tracker.
+        """
+        if self.corner_space:
+            self.image = frame
+        else:
+            # Undistort the image
+            with self.profiler.span('undistort'):
+                self.image = undistort(frame, self.camera_matrix, self.dist_coeffs)
+
+        rvec_guess, tvec_guess = None, None
+        if self.tracker is not None:
+            rvec_guess, tvec_guess = self.tracker.predict('board', timestamp)
+
+        skip_detection = self.frame_count % self.detect_every != 0
+        self.frame_count += 1
+        if skip_detection and rvec_guess is not None:
+            # detection skipped on this frame, the pose is predicted
+            self.marker_corners, self.marker_ids = (), None
+            return rvec_guess, tvec_guess, None, None
+
+        # Detect markers and interpolate CharUco corners
+        detection = self.detector.detect(self.image)
+        marker_corners, marker_ids = detection.markers(0)
+        # in the layout of the cv2.aruco functions for drawing
+        self.marker_corners = tuple(marker_corners.reshape(-1,1,4,2))
+        self.marker_ids = marker_ids.reshape(-1,1) if len(marker_ids) > 0 else None
+        charuco_corners, charuco_ids = detection.charuco(0)
+
+        rvec, tvec = None, None
         # If enough corners are found, estimate the pose
-        if charuco_retval:
-            retval, rvec, tvec = cv2.aruco.estimatePoseCharucoBoard(charuco_corners,
-                                                                    charuco_ids,
-                                                                    board,
-                                                                    camera_matrix,
-                                                                    dist_coeffs,
-                                                                    None,
-                                                                    None)
-
-            # If pose estimation is successful, draw the axis
-            if retval:
-                camera_distance = np.linalg.norm(tvec)
-                text = '({:.2f}, {:.2f}, {:.2f}) [m] | Camera distance: {:.2f} m'.format(*tvec.flatten(), camera_distance)
-                print(text)
-                cv2.drawFrameAxes(undistorted_image,
-                                  camera_matrix,
-                                  dist_coeffs,
-                                  rvec,
-                                  tvec,
-                                  length=0.1,
-                                  thickness=5)
-
-    return undistorted_image
+        if len(charuco_ids) >= 4:
+            use_guess = rvec_guess is not None
+            # the corners of an undistorted image must not be corrected again by the solver
+            dist_coeffs = self.dist_coeffs if self.corner_space else None
+            # the solver writes into the guess arrays, keep the prediction untouched
+            with self.profiler.span('pose_solve'):
+                retval, rvec, tvec = cv2.aruco.estimatePoseCharucoBoard(charuco_corners,
+                                                                        charuco_ids,
+                                                                        self.board,
+                                                                        self.camera_matrix,
+                                                                        dist_coeffs,
+                                                                        None if rvec_guess is None else rvec_guess.copy(),
+                                                                        None if tvec_guess is None else tvec_guess.copy(),
+                                                                        use_guess)
+            if not retval:
+                rvec, tvec = None, None
+
+        if self.tracker is not None:
+            if rvec is not None:
+                rvec, tvec = self.tracker.update('board', rvec, tvec, timestamp)
+            else:
+                # detection failed, fall back to the predicted pose
+                rvec, tvec = rvec_guess, tvec_guess
+
+        return rvec, tvec, charuco_corners, charuco_ids
+
+    def undistort_points(self, corners):
+        """Maps points detected on the raw frame to the undistorted image."""
+        return undistort_points(corners, self.camera_matrix, self.dist_coeffs)
+
+    def draw(self, rvec, tvec):
+        """Draws the last detected markers and the board axis on the last processed image,
+        the returned image is always undistorted.
+        """
+        with self.profiler.span('draw'):
+            return self.render(self.image, self.marker_corners, self.marker_ids, rvec, tvec)
+
+    def render(self, image, marker_corners, marker_ids, rvec, tvec):
+        """Rendering stage, only reads the camera parameters so it can run on another thread
+        (e.g. rendering.Display) with the state of the frame it draws.
+        """
+        if self.corner_space:
+            # Visualization is the only place where the full frame gets undistorted
+            image = undistort(image, self.camera_matrix, self.dist_coeffs)
+            marker_corners = tuple(self.undistort_points(c) for c in marker_corners)
+
+        if len(marker_corners) > 0:
+            cv2.aruco.drawDetectedMarkers(image, marker_corners, marker_ids)
+
+        # If pose estimation is successful, draw the axis
+        if rvec is not None:
+            # the image is undistorted in both modes
+            cv2.drawFrameAxes(image,
+                              self.camera_matrix,
+                              None,
+                              rvec,
+                              tvec,
+                              length=0.1,
+                              thickness=5)
+        return image
+
+class _EstimatorCache(object):
+    """Bounded LRU of the estimators of detect_pose, keyed by the board and camera parameters
+    and the profiler. Each estimator comes with a lock: it keeps the state of the frame it processes.
+    """
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._estimators = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, config, camera_matrix, dist_coeffs, corner_space, profiler):
+        # only the hashable fields the estimator depends on
+        board = tuple(config[name] for name in BOARD_CONFIG_KEYS)
+        options = tuple(config.get(name) for name in DETECTION_MODE_KEYS + ('DETECTOR_PROFILE',
+                                                                            'DETECTOR_PROFILES_DIR'))
+        return (board,
+                options,
+                np.ascontiguousarray(camera_matrix, dtype=np.float64).tobytes(),
+                np.ascontiguousarray(dist_coeffs, dtype=np.float64).tobytes(),
+                corner_space,
+                profiler)
+
+    def get(self, config, camera_matrix, dist_coeffs, corner_space, profiler=None):
+        """Returns (estimator, lock)."""
+        profiler = profiler or NULL_PROFILER
+        key = self._key(config, camera_matrix, dist_coeffs, corner_space, profiler)
+        with self._lock:
+            entry = self._estimators.get(key)
+            if entry is not None:
+                self._estimators.move_to_end(key)
+                return entry
+
+        entry = (CharucoPoseEstimator(config, camera_matrix, dist_coeffs, corner_space, profiler=profiler),
+                 threading.Lock())
+        with self._lock:
+            entry = self._estimators.setdefault(key, entry)
+            self._estimators.move_to_end(key)
+            while len(self._estimators) > self.max_entries:
+                self._estimators.popitem(last=False)
+        return entry
+
+_estimators = _EstimatorCache()
+
+def detect_pose(config, image, camera_matrix, dist_coeffs, corner_space=False, profiler=None):
+    """Returns the image with the board axis drawn.
+    Thin wrapper kept for compatibility, prefer holding a CharucoPoseEstimator
+    (headless callers use CharucoPoseEstimator.process, which only returns the pose).
+    """
+    # one estimator per profiler, never shared by two calls at the same time
+    estimator, lock = _estimators.get(config, camera_matrix, dist_coeffs, corner_space, profiler)
+    with lock:
+        rvec, tvec, _, _ = estimator.process(image)
+        if rvec is not None:
+            camera_distance = np.linalg.norm(tvec)
+            text = '({:.2f}, {:.2f}, {:.2f}) [m] | Camera distance: {:.2f} m'.format(*tvec.flatten(), camera_distance)
+            print(text)
+
+        return estimator.draw(rvec, tvec)
 
 def test_on_images_dir():
     # Load calibration data
@@ -125,18 +233,21 @@ def test_on_images_dir():
 
     assert len(images_path_list) != 0, 'Fail to find images in images_dir: {}'.format(images_dir)
 
+    estimator = CharucoPoseEstimator(config, camera_matrix, dist_coeffs)
+
     for imagepath in images_path_list:
         # Load an image
         image = cv2.imread(imagepath)
 
         # Detect pose and draw axis
-        pose_image = detect_pose(config, image, camera_matrix, dist_coeffs)
+        rvec, tvec, _, _ = estimator.process(image)
+        pose_image = estimator.draw(rvec, tvec)
 
         # Show the image
         cv2.imshow('Pose Image', pose_image)
         cv2.waitKey(0)
 
-def test_on_video(camera_matrix, dist_coeffs):
+def test_on_video(camera_matrix, dist_coeffs, headless=False, display_fps=15):
     # Load calibration data
     # camera_matrix = np.load('/home/lcondados/workspace/arucodiscoveries/assets/camera_matrix.npy')
     # dist_coeffs = np.load('/home/lcondados/workspace/arucodiscoveries/assets/dist_coeffs.npy')
@@ -156,18 +267,32 @@ def test_on_video(camera_matrix, dist_coeffs):
     config['SQUARE_LENGTH'] = 30 / 1000.0
     config['MARKER_LENGTH'] = 15 / 1000.0
 
-    video = cv2.VideoCapture(0)
-
-    while True:
-        ret, frame = video.read()
-        if ret == False: break
-
-        undistorted_image = detect_pose(config, frame, camera_matrix, dist_coeffs)
-
-        cv2.imshow('video', undistorted_image)
-        k = cv2.waitKey(1) & 0xFF
-        if k == 27 or k == ord('q'):
-            break
+    # stage timings printed every 5 seconds
+    profiler = Profiler(callback=print_summary, callback_interval=5.0)
+    estimator = CharucoPoseEstimator(config, camera_matrix, dist_coeffs, tracker=PoseTracker(), profiler=profiler)
+
+    video = FrameGrabber(0)
+    # drawing and display run on the main thread, at most display_fps frames per second
+    display = None if headless else Display('video', max_fps=display_fps)
+
+    def loop():
+        while display is None or not display.stopped:
+            with profiler.span('capture'):
+                ret, frame, timestamp, _ = video.read_with_timestamp()
+            if ret == False: break
+
+            rvec, tvec, _, _ = estimator.process(frame, timestamp)
+            if display is not None:
+                display.submit(estimator.image, estimator.render, estimator.marker_corners, estimator.marker_ids, rvec, tvec)
+            profiler.set_counter('frames_dropped', video.frames_dropped)
+            profiler.tick()
+
+    if display is None:
+        loop()
+    else:
+        display.run(loop)
+    video.release()
+    print(profiler.format())
 
 if __name__ == '__main__':
     camera_matrix = np.load('assets/webcam_parameters/camera_matrix.npy')
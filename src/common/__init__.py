@@ -33,4 +33,29 @@ ARUCO_DICT = {
 
 # [mm]
 A4_width = 210
-A4_height = 297
\ No newline at end of file
+A4_height = 297
+
+# config fields that define a ChArUco board
+BOARD_CONFIG_KEYS = ('ARUCO_DICT',
+                     'SQUARES_VERTICALLY',
+                     'SQUARES_HORIZONTALLY',
+                     'SQUARE_LENGTH',
+                     'MARKER_LENGTH')
+
+# optional config fields that change what the CharucoDetector detects on a frame
+DETECTION_MODE_KEYS = ('RESTRICT_DICTIONARY',
+                       'PYRAMID_SCALE',
+                       'EXPECTED_MARKER_PX',
+                       'PYRAMID_TARGET_MARKER_PX',
+                       'ROI_TRACKING',
+                       'ROI_PADDING',
+                       'ROI_FULL_SCAN_EVERY')
+
+# Parallelism: the cv2 calls release the GIL, so the per-frame work of the live paths
+# runs on thread pools (ArucoDetector.detect_batch, multi_camera, render_boards).
+# The offline paths use process pools whose workers call init_pool_worker first.
+def init_pool_worker():
+    """Process pool initializer: the parallelism comes from the processes, each worker
+    runs OpenCV single-threaded so that the pool does not oversubscribe the cores.
+    """
+    cv2.setNumThreads(1)
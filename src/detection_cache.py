@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+# Content addressed on-disk cache of per-image ChArUco detections.
+# An entry is keyed by the hash of the image file plus the board config and the
+# detector parameters, so re-running the calibration with other flags or
+# distortion models skips image decoding and detection entirely.
+
+import os
+import json
+import hashlib
+
+import numpy as np
+
+from aruco_detectors import detector_params_to_dict
+from common import BOARD_CONFIG_KEYS, DETECTION_MODE_KEYS
+from detections import Detections
+
+def board_config_hash(config, params):
+    board_config = {key: config[key] for key in BOARD_CONFIG_KEYS}
+    # the pyramid and ROI tracking modes detect other corners than the full resolution scan
+    board_config.update((key, config.get(key)) for key in DETECTION_MODE_KEYS)
+    board_config['detector_params'] = detector_params_to_dict(params)
+    text = json.dumps(board_config, sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+class DetectionCache(object):
+    """Sample:
+        cache = DetectionCache('assets/detection_cache', config, board_detector.params)
+        image_bytes, key = cache.read(imagepath)
+        entry = cache.get(key)
+        if entry is None:
+            image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+            detection = board_detector.detect(image)
+            cache.put(key, detection, image.shape[1::-1])
+        else:
+            detection, image_size = entry
+    """
+    def __init__(self, cache_dir, config, params, max_bytes=256*1024*1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.config_hash = board_config_hash(config, params)
+        os.makedirs(cache_dir, exist_ok=True)
+        # size of the store, only known after the first directory scan
+        self._total_bytes = None
+
+    def read(self, imagepath):
+        """Returns the file content and its cache key.
+        The content is returned so that a cache miss does not read the file twice.
+        """
+        with open(imagepath, 'rb') as f:
+            image_bytes = f.read()
+        key = hashlib.sha1(image_bytes)
+        key.update(self.config_hash.encode('ascii'))
+        return image_bytes, key.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, '{}.npz'.format(key))
+
+    def get(self, key):
+        """Returns the cached (detection, image_size) or None,
+        detection is a single frame detections.Detections and image_size is (w, h).
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                detection = Detections(*(data[name] for name in Detections.__slots__))
+                image_size = tuple(int(v) for v in data['image_size'])
+        except (OSError, ValueError, KeyError):
+            # missing, partially written or of an older layout
+            return None
+        # keep the access time for the LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return detection, image_size
+
+    def put(self, key, detection, image_size):
+        path = self._path(key)
+        tmp_path = '{}.{}.tmp.npz'.format(path[:-len('.npz')], os.getpid())
+
+        # the contiguous arrays of the detection are stored as they are
+        np.savez(tmp_path,
+                 image_size=np.int32(image_size),
+                 **{name: getattr(detection, name) for name in Detections.__slots__})
+        # atomic, other processes never see a partially written entry
+        os.replace(tmp_path, path)
+
+        if self._total_bytes is None:
+            self.evict()
+        else:
+            self._total_bytes += os.path.getsize(path)
+            if self._total_bytes > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """Removes the least recently used entries while the cache is larger than max_bytes."""
+        entries = []
+        total_bytes = 0
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith('.npz') or '.tmp.' in entry.name:
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_bytes += stat.st_size
+
+        if total_bytes > self.max_bytes:
+            for _, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total_bytes -= size
+                if total_bytes <= self.max_bytes:
+                    break
+        self._total_bytes = total_bytes
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+# Compact detection results.
+# All the frames of a session share a few contiguous arrays (corners, ids and per-frame
+# offsets) instead of tuples of Python lists of small arrays per frame.
+# The binary layout is a fixed header followed by the raw arrays, so it is read back
+# zero-copy from any buffer (np.frombuffer) or file (np.memmap).
+
+import numpy as np
+
+_MAGIC = b'ARUCODET'
+_VERSION = 1
+_HEADER = np.dtype([('magic', 'S8'),
+                    ('version', '<i8'),
+                    ('frames', '<i8'),
+                    ('markers', '<i8'),
+                    ('charuco', '<i8')])
+
+def _sections(frames, markers, charuco):
+    """(name, dtype, shape) of the arrays following the header, in file order."""
+    return (('marker_offsets', np.dtype('<i8'), (frames + 1,)),
+            ('charuco_offsets', np.dtype('<i8'), (frames + 1,)),
+            ('marker_corners', np.dtype('<f4'), (markers, 4, 2)),
+            ('marker_ids', np.dtype('<i4'), (markers,)),
+            ('charuco_corners', np.dtype('<f4'), (charuco, 2)),
+            ('charuco_ids', np.dtype('<i4'), (charuco,)))
+
+def _aligned(nbytes):
+    return (nbytes + 7) // 8 * 8
+
+class Detections(object):
+    """Detections of F frames.
+
+    marker_corners  (M,4,2) float32 | marker_ids  (M,) int32 | marker_offsets  (F+1,) int64
+    charuco_corners (C,2)   float32 | charuco_ids (C,) int32 | charuco_offsets (F+1,) int64
+
+    The markers of frame i are marker_corners[marker_offsets[i]:marker_offsets[i+1]],
+    same for the charuco corners.
+    """
+    __slots__ = ('marker_corners', 'marker_ids', 'marker_offsets',
+                 'charuco_corners', 'charuco_ids', 'charuco_offsets')
+
+    def __init__(self, marker_corners, marker_ids, marker_offsets,
+                 charuco_corners, charuco_ids, charuco_offsets):
+        self.marker_corners = marker_corners
+        self.marker_ids = marker_ids
+        self.marker_offsets = marker_offsets
+        self.charuco_corners = charuco_corners
+        self.charuco_ids = charuco_ids
+        self.charuco_offsets = charuco_offsets
+
+    @classmethod
+    def from_frame(cls, marker_corners, marker_ids, charuco_corners=None, charuco_ids=None):
+        """Single frame from the OpenCV outputs (tuples of (1,4,2) corners, (N,1) ids...)."""
+        if len(marker_corners) > 0:
+            marker_corners = np.concatenate(marker_corners).reshape(-1,4,2).astype(np.float32, copy=False)
+            marker_ids = np.asarray(marker_ids, dtype=np.int32).reshape(-1)
+        else:
+            marker_corners = np.zeros((0,4,2), dtype=np.float32)
+            marker_ids = np.zeros(0, dtype=np.int32)
+
+        if charuco_ids is not None and len(charuco_ids) > 0:
+            charuco_corners = np.asarray(charuco_corners, dtype=np.float32).reshape(-1,2)
+            charuco_ids = np.asarray(charuco_ids, dtype=np.int32).reshape(-1)
+        else:
+            charuco_corners = np.zeros((0,2), dtype=np.float32)
+            charuco_ids = np.zeros(0, dtype=np.int32)
+
+        return cls(marker_corners, marker_ids, np.array([0, len(marker_ids)], dtype=np.int64),
+                   charuco_corners, charuco_ids, np.array([0, len(charuco_ids)], dtype=np.int64))
+
+    def __len__(self):
+        return len(self.marker_offsets) - 1
+
+    def markers(self, i):
+        """(N,4,2) corners and (N,) ids views of frame i."""
+        a, b = self.marker_offsets[i], self.marker_offsets[i+1]
+        return self.marker_corners[a:b], self.marker_ids[a:b]
+
+    def charuco(self, i):
+        """(C,1,2) corners and (C,1) ids views of frame i, the shapes used by the cv2.aruco functions."""
+        a, b = self.charuco_offsets[i], self.charuco_offsets[i+1]
+        return self.charuco_corners[a:b].reshape(-1,1,2), self.charuco_ids[a:b].reshape(-1,1)
+
+    def charuco_lists(self, min_corners=1):
+        """Per frame charuco corners/ids lists (views) for calibrateCameraCharuco,
+        frames with less than min_corners corners are skipped.
+        """
+        all_charuco_corners = []
+        all_charuco_ids = []
+        for i in range(len(self)):
+            charuco_corners, charuco_ids = self.charuco(i)
+            if len(charuco_ids) >= min_corners:
+                all_charuco_corners.append(charuco_corners)
+                all_charuco_ids.append(charuco_ids)
+        return all_charuco_corners, all_charuco_ids
+
+    # --- serialization ---
+
+    def nbytes(self):
+        total = _HEADER.itemsize
+        for name, dtype, shape in _sections(len(self), len(self.marker_ids), len(self.charuco_ids)):
+            total += _aligned(int(np.prod(shape)) * dtype.itemsize)
+        return total
+
+    def write_into(self, buffer):
+        """Writes the binary layout into a writable buffer of at least nbytes() bytes."""
+        frames, markers, charuco = len(self), len(self.marker_ids), len(self.charuco_ids)
+        header = np.frombuffer(buffer, dtype=_HEADER, count=1)
+        header[0] = (_MAGIC, _VERSION, frames, markers, charuco)
+        offset = _HEADER.itemsize
+        for name, dtype, shape in _sections(frames, markers, charuco):
+            count = int(np.prod(shape))
+            view = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+            view[:] = np.asarray(getattr(self, name)).reshape(-1)
+            offset += _aligned(count * dtype.itemsize)
+
+    def tobytes(self):
+        buffer = bytearray(self.nbytes())
+        self.write_into(buffer)
+        return bytes(buffer)
+
+    @classmethod
+    def from_buffer(cls, buffer):
+        """Zero-copy: the arrays are views of buffer (bytes, bytearray, memoryview, mmap...)."""
+        header = np.frombuffer(buffer, dtype=_HEADER, count=1)[0]
+        if header['magic'] != _MAGIC or header['version'] != _VERSION:
+            raise ValueError('Not a detections buffer (or unsupported version)')
+        frames, markers, charuco = int(header['frames']), int(header['markers']), int(header['charuco'])
+
+        arrays = {}
+        offset = _HEADER.itemsize
+        for name, dtype, shape in _sections(frames, markers, charuco):
+            count = int(np.prod(shape))
+            arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset).reshape(shape)
+            offset += _aligned(count * dtype.itemsize)
+        return cls(**arrays)
+
+    def save(self, path):
+        memmap = np.memmap(path, dtype=np.uint8, mode='w+', shape=(self.nbytes(),))
+        self.write_into(memmap)
+        memmap.flush()
+        del memmap
+
+    @classmethod
+    def load(cls, path, mode='r'):
+        """Memory-maps the file, nothing is read until the arrays are accessed."""
+        return cls.from_buffer(np.memmap(path, dtype=np.uint8, mode=mode))
+
+class DetectionsRecorder(object):
+    """Accumulates per-frame detections of a long session into growing contiguous arrays
+    (amortized doubling), build() returns the Detections without copying.
+
+    Sample:
+        recorder = DetectionsRecorder()
+        recorder.append(marker_corners, marker_ids, charuco_corners, charuco_ids)
+        detections = recorder.build()
+    """
+    def __init__(self, capacity=1024):
+        self._marker_corners = np.zeros((capacity,4,2), dtype=np.float32)
+        self._marker_ids = np.zeros(capacity, dtype=np.int32)
+        self._charuco_corners = np.zeros((capacity,2), dtype=np.float32)
+        self._charuco_ids = np.zeros(capacity, dtype=np.int32)
+        self._marker_offsets = [0]
+        self._charuco_offsets = [0]
+
+    @staticmethod
+    def _grow(array, size):
+        if size <= len(array):
+            return array
+        grown = np.zeros((max(size, 2*len(array)),) + array.shape[1:], dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def append(self, marker_corners, marker_ids, charuco_corners=None, charuco_ids=None):
+        self.append_frame(Detections.from_frame(marker_corners, marker_ids, charuco_corners, charuco_ids))
+
+    def append_frame(self, detections):
+        m0 = self._marker_offsets[-1]
+        m1 = m0 + len(detections.marker_ids)
+        self._marker_corners = self._grow(self._marker_corners, m1)
+        self._marker_ids = self._grow(self._marker_ids, m1)
+        self._marker_corners[m0:m1] = detections.marker_corners
+        self._marker_ids[m0:m1] = detections.marker_ids
+        self._marker_offsets.extend(m0 + detections.marker_offsets[1:])
+
+        c0 = self._charuco_offsets[-1]
+        c1 = c0 + len(detections.charuco_ids)
+        self._charuco_corners = self._grow(self._charuco_corners, c1)
+        self._charuco_ids = self._grow(self._charuco_ids, c1)
+        self._charuco_corners[c0:c1] = detections.charuco_corners
+        self._charuco_ids[c0:c1] = detections.charuco_ids
+        self._charuco_offsets.extend(c0 + detections.charuco_offsets[1:])
+
+    def __len__(self):
+        return len(self._marker_offsets) - 1
+
+    def build(self):
+        markers = self._marker_offsets[-1]
+        charuco = self._charuco_offsets[-1]
+        return Detections(self._marker_corners[:markers],
+                          self._marker_ids[:markers],
+                          np.array(self._marker_offsets, dtype=np.int64),
+                          self._charuco_corners[:charuco],
+                          self._charuco_ids[:charuco],
+                          np.array(self._charuco_offsets, dtype=np.int64))
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+# DetectorParameters tuning on recorded frames.
+# The markers found with the default parameters are the reference. Coordinate descent
+# over the adaptive threshold windows, the min/max perimeter rates, the corner refinement
+# and the ArUco3 mode: each option is tried with the others fixed and kept when it is
+# faster while the recall (reference markers still found, by id) stays above the target.
+# The winner is saved as a named profile that ArucoDetector, CharucoDetector and
+# CharucoPoseEstimator load with config['DETECTOR_PROFILE'] = name.
+#
+# Sample:
+#   python detector_tuning.py recordings/cell3/*.png --name cell_3 --aruco-dict DICT_4X4_50 --min-recall 0.99
+
+import json
+import os
+import time
+from glob import glob
+
+import click
+import cv2
+import numpy as np
+
+import common
+from aruco_detectors import DETECTOR_PROFILES_DIR, detector_params_from_dict, detector_params_to_dict
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+CORNER_REFINEMENT = {'none': cv2.aruco.CORNER_REFINE_NONE,
+                     'subpix': cv2.aruco.CORNER_REFINE_SUBPIX,
+                     'contour': cv2.aruco.CORNER_REFINE_CONTOUR,
+                     'apriltag': cv2.aruco.CORNER_REFINE_APRILTAG}
+
+# (group, options), an option is a dict of DetectorParameters fields
+SEARCH_SPACE = [
+    ('adaptive_threshold_windows', [{'adaptiveThreshWinSizeMin': w_min,
+                                     'adaptiveThreshWinSizeMax': w_max,
+                                     'adaptiveThreshWinSizeStep': step} for w_min, w_max, step in ((3, 23, 10),
+                                                                                                   (3, 13, 10),
+                                                                                                   (5, 25, 20),
+                                                                                                   (5, 35, 15),
+                                                                                                   (7, 7, 10),
+                                                                                                   (13, 13, 10),
+                                                                                                   (23, 23, 10))]),
+    ('min_perimeter_rate', [{'minMarkerPerimeterRate': rate} for rate in (0.01, 0.03, 0.05, 0.08, 0.12, 0.2)]),
+    ('max_perimeter_rate', [{'maxMarkerPerimeterRate': rate} for rate in (4.0, 2.0, 1.0, 0.6)]),
+    ('corner_refinement', [{'cornerRefinementMethod': method} for method in (cv2.aruco.CORNER_REFINE_NONE,
+                                                                            cv2.aruco.CORNER_REFINE_SUBPIX,
+                                                                            cv2.aruco.CORNER_REFINE_CONTOUR)]),
+    ('aruco3', [{'useAruco3Detection': False},
+                {'useAruco3Detection': True, 'minMarkerLengthRatioOriginalImg': 0.02},
+                {'useAruco3Detection': True, 'minMarkerLengthRatioOriginalImg': 0.05}]),
+]
+
+def load_frames(paths, stride=1, max_frames=200):
+    """Frames of image files and videos (every stride-th video frame), at most max_frames."""
+    frames = []
+    for path in paths:
+        if len(frames) >= max_frames:
+            break
+        if path.lower().endswith(VIDEO_EXTENSIONS):
+            capture = cv2.VideoCapture(path)
+            frame_idx = 0
+            while len(frames) < max_frames:
+                if frame_idx % stride:
+                    if not capture.grab():
+                        break
+                else:
+                    ret, frame = capture.read()
+                    if not ret:
+                        break
+                    frames.append(frame)
+                frame_idx += 1
+            capture.release()
+        else:
+            frame = cv2.imread(path)
+            if frame is not None:
+                frames.append(frame)
+    return frames
+
+class _Evaluation(object):
+    def __init__(self, values, fps, recall, extra):
+        self.values = values
+        self.fps = fps
+        self.recall = recall
+        # detections not in the reference (new true markers or false positives)
+        self.extra = extra
+
+    def as_dict(self):
+        return {'fps': self.fps, 'recall': self.recall, 'extra_detections': self.extra}
+
+class DetectorTuner(object):
+    """Sample:
+        tuner = DetectorTuner(frames, cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_50), min_recall=0.99)
+        best = tuner.tune()
+        tuner.save_profile('cell_3', best)
+
+    frames: representative frames of the camera, the reference is detected on them with the defaults
+    fixed: DetectorParameters fields not searched, e.g. {'cornerRefinementMethod': cv2.aruco.CORNER_REFINE_SUBPIX}
+    repeats: each setting is timed repeats times over all the frames, the fastest run counts
+    min_gain: relative fps gain needed to switch to an option (timing noise)
+    """
+    def __init__(self, frames, dictionary, min_recall=0.98, fixed=None, search_space=SEARCH_SPACE,
+                 repeats=2, min_gain=0.02, max_passes=3):
+        if len(frames) == 0:
+            raise ValueError('No frames to tune on')
+        self.frames = frames
+        self.dictionary = dictionary
+        self.min_recall = min_recall
+        self.fixed = dict(fixed or {})
+        self.search_space = search_space
+        self.repeats = repeats
+        self.min_gain = min_gain
+        self.max_passes = max_passes
+
+        self.default_values = detector_params_to_dict(cv2.aruco.DetectorParameters())
+        self.reference = self._detect_ids(detector_params_from_dict(self.default_values))[0]
+        self.reference_count = sum(len(ids) for ids in self.reference)
+        if self.reference_count == 0:
+            raise ValueError('No marker detected on the frames with the default parameters')
+        self._evaluated = {}
+        self.baseline = None
+
+    def _detect_ids(self, params):
+        """Ids found on every frame and the best total time over the repeats."""
+        detector = cv2.aruco.ArucoDetector(self.dictionary, params)
+        best_elapsed = float('inf')
+        for _ in range(self.repeats):
+            frame_ids = []
+            start = time.perf_counter()
+            for frame in self.frames:
+                _, ids, _ = detector.detectMarkers(frame)
+                frame_ids.append(ids)
+            best_elapsed = min(best_elapsed, time.perf_counter() - start)
+        frame_ids = [set() if ids is None else set(np.ravel(ids).tolist()) for ids in frame_ids]
+        return frame_ids, best_elapsed
+
+    def evaluate(self, values):
+        key = json.dumps(values, sort_keys=True)
+        if key not in self._evaluated:
+            frame_ids, elapsed = self._detect_ids(detector_params_from_dict(values))
+            found = sum(len(ids & reference) for ids, reference in zip(frame_ids, self.reference))
+            extra = sum(len(ids - reference) for ids, reference in zip(frame_ids, self.reference))
+            self._evaluated[key] = _Evaluation(values, len(self.frames) / elapsed,
+                                               found / float(self.reference_count), extra)
+        return self._evaluated[key]
+
+    def tune(self, log=None):
+        """Coordinate descent from the defaults (with the fixed fields), returns the best _Evaluation."""
+        best = self.evaluate(dict(self.default_values, **self.fixed))
+        self.baseline = best
+        if log:
+            log('baseline: {:.1f} fps, recall {:.3f}'.format(best.fps, best.recall))
+
+        for _ in range(self.max_passes):
+            improved = False
+            for group, options in self.search_space:
+                for option in options:
+                    if any(name in self.fixed for name in option):
+                        continue
+                    values = dict(best.values, **option)
+                    if values == best.values:
+                        continue
+                    candidate = self.evaluate(values)
+                    if candidate.recall >= self.min_recall and candidate.fps > best.fps * (1 + self.min_gain):
+                        best = candidate
+                        improved = True
+                        if log:
+                            log('{}: {} -> {:.1f} fps, recall {:.3f}'.format(group, option, best.fps, best.recall))
+            if not improved:
+                break
+        return best
+
+    def save_profile(self, name, best, profiles_dir=DETECTOR_PROFILES_DIR, aruco_dict_name=None):
+        """Writes <profiles_dir>/<name>.json: all the parameters plus the tuning results."""
+        os.makedirs(profiles_dir, exist_ok=True)
+        profile = {'name': name,
+                   'params': best.values,
+                   'changed': {field: value for field, value in best.values.items()
+                               if self.default_values.get(field) != value},
+                   'result': best.as_dict(),
+                   'baseline': self.baseline.as_dict(),
+                   'min_recall': self.min_recall,
+                   'frames': len(self.frames),
+                   'image_size': list(self.frames[0].shape[1::-1]),
+                   'aruco_dict': aruco_dict_name,
+                   'opencv': cv2.__version__,
+                   'date': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        path = os.path.join(profiles_dir, '{}.json'.format(name))
+        with open(path, 'w') as f:
+            json.dump(profile, f, indent=2)
+        return path
+
+@click.command()
+@click.argument('inputs', nargs=-1, required=True)
+@click.option('--name', required=True, help='Profile name, loaded with config["DETECTOR_PROFILE"] = name.')
+@click.option('--aruco-dict', type=click.Choice(sorted(common.ARUCO_DICT)), default='DICT_4X4_50', show_default=True)
+@click.option('--min-recall', default=0.98, show_default=True, type=click.FloatRange(0, 1),
+              help='Share of the markers found with the defaults that must still be found.')
+@click.option('--corner-refinement', type=click.Choice(['search'] + sorted(CORNER_REFINEMENT)), default='search',
+              show_default=True, help='Searched, or fixed to the method the poses need.')
+@click.option('--stride', default=1, show_default=True, type=click.IntRange(min=1), help='Every n-th video frame.')
+@click.option('--max-frames', default=200, show_default=True, type=click.IntRange(min=1))
+@click.option('--repeats', default=2, show_default=True, type=click.IntRange(min=1))
+@click.option('--profiles-dir', default=DETECTOR_PROFILES_DIR, show_default=True)
+def main(inputs, name, aruco_dict, min_recall, corner_refinement, stride, max_frames, repeats, profiles_dir):
+    """Tunes the detector parameters on the INPUTS images/videos (glob patterns are expanded)."""
+    paths = []
+    for pattern in inputs:
+        paths.extend(sorted(glob(pattern)) or [pattern])
+    frames = load_frames(paths, stride, max_frames)
+    print('[INFO] {} frames'.format(len(frames)))
+
+    fixed = {}
+    if corner_refinement != 'search':
+        fixed['cornerRefinementMethod'] = CORNER_REFINEMENT[corner_refinement]
+
+    dictionary = cv2.aruco.getPredefinedDictionary(common.ARUCO_DICT[aruco_dict])
+    tuner = DetectorTuner(frames, dictionary, min_recall, fixed, repeats=repeats)
+    best = tuner.tune(log=lambda message: print('[INFO] ' + message))
+    path = tuner.save_profile(name, best, profiles_dir, aruco_dict)
+
+    print('[INFO] {:.1f} -> {:.1f} fps ({:.2f}x), recall {:.3f}, profile saved to {}'.format(
+          tuner.baseline.fps, best.fps, best.fps / tuner.baseline.fps, best.recall, path))
+
+if __name__ == '__main__':
+    main()
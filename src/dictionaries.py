@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+# Dictionaries restricted to the marker ids in use.
+# The candidate identification compares every candidate with all the markers (and
+# rotations) of the dictionary, a dictionary of the few ids deployed out of e.g.
+# DICT_4X4_1000 is cheaper to search and can not decode the markers of other ids,
+# stray markers and clutter are rejected at identification instead of later.
+# The detections of a restricted dictionary are indices into the subset,
+# to_original() maps them back to the ids of the full dictionary.
+
+import cv2
+import numpy as np
+
+import common
+
+def get_dictionary(aruco_dict):
+    """cv2.aruco.Dictionary from a name of common.ARUCO_DICT, a predefined id or a dictionary."""
+    if isinstance(aruco_dict, cv2.aruco.Dictionary):
+        return aruco_dict
+    if isinstance(aruco_dict, str):
+        aruco_dict = common.ARUCO_DICT[aruco_dict]
+    return cv2.aruco.getPredefinedDictionary(aruco_dict)
+
+class RestrictedDictionary(object):
+    """Sample:
+        restricted = RestrictedDictionary(cv2.aruco.DICT_4X4_1000, [3, 17, 250])
+        detector = cv2.aruco.ArucoDetector(restricted.dictionary)
+        corners, subset_ids, _ = detector.detectMarkers(image)
+        ids = restricted.to_original(subset_ids)
+
+    ids: allow-list of the ids of the full dictionary, sorted and deduplicated
+    """
+    def __init__(self, aruco_dict, ids):
+        self.base = get_dictionary(aruco_dict)
+        self.ids = np.unique(np.asarray(ids, dtype=np.int32).ravel())
+        if len(self.ids) == 0:
+            raise ValueError('Empty id allow-list')
+        if self.ids[0] < 0 or self.ids[-1] >= len(self.base.bytesList):
+            raise ValueError('Marker ids out of the dictionary range [0, {})'.format(len(self.base.bytesList)))
+
+        # same marker size and error correction as the full dictionary
+        self.dictionary = cv2.aruco.Dictionary(self.base.bytesList[self.ids],
+                                               self.base.markerSize,
+                                               self.base.maxCorrectionBits)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def to_original(self, subset_ids):
+        """Ids of the full dictionary, same shape as subset_ids (None stays None)."""
+        if subset_ids is None:
+            return None
+        return self.ids[np.asarray(subset_ids, dtype=np.int32)]
+
+    def to_subset(self, ids):
+        """Indices into the restricted dictionary of ids (all in the allow-list)."""
+        ids = np.asarray(ids, dtype=np.int32)
+        subset_ids = np.searchsorted(self.ids, ids)
+        if np.any(subset_ids >= len(self.ids)) or np.any(self.ids[np.minimum(subset_ids, len(self.ids) - 1)] != ids):
+            raise ValueError('Marker ids not in the allow-list')
+        return subset_ids.astype(np.int32)
+
+def board_dictionary(config):
+    """Dictionary of a ChArUco board config, restricted to the board markers (ids 0..N-1,
+    unchanged by the restriction) when config['RESTRICT_DICTIONARY'] is True.
+    """
+    if not config.get('RESTRICT_DICTIONARY', False):
+        return cv2.aruco.getPredefinedDictionary(config['ARUCO_DICT'])
+    board_markers = config['SQUARES_VERTICALLY'] * config['SQUARES_HORIZONTALLY'] // 2
+    return RestrictedDictionary(config['ARUCO_DICT'], np.arange(board_markers)).dictionary
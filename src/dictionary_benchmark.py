@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+# Full dictionary vs restricted dictionary (allow-list of the ids in use).
+# Each synthetic frame (see benchmark.py) shows the markers in use next to stray markers
+# of other ids of the same dictionary, plus frames of random marker-like clutter.
+# Both detectors run on the same frames:
+#   recall          markers in use detected / visible
+#   stray_accepted  detections whose id is not in use (stray markers or misread clutter)
+#   fps             of ArucoDetector.detect alone
+
+import json
+import time
+
+import cv2
+import numpy as np
+
+import common
+from aruco_detectors import ArucoDetector
+from benchmark import MarkerSheetScene, make_renderer, random_pose, summary_stats
+
+def clutter_texture(rng, size, cell_px):
+    """Random black and white cells of cell_px pixels, the blobs form marker-like quads."""
+    cells = (rng.random((size[1] // cell_px, size[0] // cell_px)) > 0.5).astype(np.uint8) * 255
+    return cv2.resize(cells, (cells.shape[1]*cell_px, cells.shape[0]*cell_px), interpolation=cv2.INTER_NEAREST)
+
+class _VariantResult(object):
+    def __init__(self):
+        self.latency_ms = []
+        self.expected = 0
+        self.detected = 0
+        self.stray_accepted = 0
+
+    def report(self):
+        elapsed = sum(self.latency_ms) / 1000.0
+        return {'fps': len(self.latency_ms) / elapsed if elapsed > 0 else None,
+                'latency_ms': summary_stats(self.latency_ms),
+                'recall': self.detected / float(self.expected) if self.expected else None,
+                'stray_accepted': self.stray_accepted}
+
+def benchmark_allow_list(case, frames=30, seed=0):
+    """case: RESOLUTION, ARUCO_DICT (name in common.ARUCO_DICT), MARKER_IDS (ids in use),
+    STRAY_COUNT (markers of other ids on the same sheet), optional CLUTTER_FRAMES,
+    MARKER_LENGTH, DISTORTION, NOISE_SIGMA, BLUR_SIGMA.
+    Returns {'full': ..., 'restricted': ...}.
+    """
+    rng = np.random.default_rng(seed)
+    aruco_dict = common.ARUCO_DICT[case['ARUCO_DICT']]
+    marker_ids = np.asarray(case['MARKER_IDS'])
+    dictionary_size = len(cv2.aruco.getPredefinedDictionary(aruco_dict).bytesList)
+    stray_ids = rng.choice(np.setdiff1d(np.arange(dictionary_size), marker_ids), case['STRAY_COUNT'], replace=False)
+
+    scene = MarkerSheetScene(aruco_dict, 0, case.get('MARKER_LENGTH', 0.05),
+                             marker_ids=np.concatenate([marker_ids, stray_ids]))
+    renderer = make_renderer(case)
+    detectors = {'full': ArucoDetector({'ARUCO_DICT': aruco_dict}),
+                 'restricted': ArucoDetector({'ARUCO_DICT': aruco_dict, 'MARKER_IDS': marker_ids})}
+    results = {name: _VariantResult() for name in detectors}
+    in_use = set(marker_ids.tolist())
+
+    # marker frames, then clutter frames (nothing to detect)
+    clutter_frames = case.get('CLUTTER_FRAMES', frames // 2)
+    for i in range(frames + clutter_frames + 1):
+        if i <= frames:
+            rvec, tvec = random_pose(rng, scene.size, renderer.camera_matrix, renderer.image_size)
+            frame = renderer.render(scene.texture, scene.px_per_meter, scene.origin_px, rvec, tvec, rng)
+            ground_truth = renderer.project(scene.object_corners, rvec, tvec).reshape(-1,4,2)
+            visible = np.all(renderer.inside(ground_truth.reshape(-1,2)).reshape(-1,4), axis=1)
+            expected = int(visible[:len(marker_ids)].sum())
+        else:
+            # fronto-parallel at 1 m, one texture pixel per frame pixel
+            texture = clutter_texture(rng, renderer.image_size, int(rng.integers(8, 24)))
+            fx, cx, cy = renderer.camera_matrix[0,0], renderer.camera_matrix[0,2], renderer.camera_matrix[1,2]
+            frame = renderer.render(texture, fx, (cx + 0.5, cy + 0.5), np.zeros(3), np.float64([0, 0, 1]), rng)
+            expected = 0
+
+        for name, detector in detectors.items():
+            start = time.perf_counter()
+            _, ids = detector.detect(frame)
+            latency = time.perf_counter() - start
+            # the first frame only warms up
+            if i == 0:
+                continue
+            result = results[name]
+            result.latency_ms.append(1000.0 * latency)
+            result.expected += expected
+            detected = set(ids.tolist())
+            result.detected += len(detected & in_use)
+            result.stray_accepted += int(sum(marker_id not in in_use for marker_id in ids.tolist()))
+
+    return {name: result.report() for name, result in results.items()}
+
+def main():
+    # ------------------------------
+    cases = []
+    for aruco_dict in ('DICT_4X4_1000', 'DICT_APRILTAG_36h11'):
+        for resolution in ((1280, 720), (1920, 1080)):
+            cases.append({'RESOLUTION': resolution,
+                          'ARUCO_DICT': aruco_dict,
+                          'MARKER_IDS': [3, 17, 42, 101, 250],
+                          'STRAY_COUNT': 11,
+                          'NOISE_SIGMA': 3.0,
+                          'BLUR_SIGMA': 0.8})
+    frames = 30
+    report_path = 'dictionary_benchmark.json'
+    # ------------------------------
+
+    report = []
+    row = '{:<20} {:>10} {:<10} {:>6} {:>8} {:>7} {:>6}'
+    print(row.format('dictionary', 'resolution', 'variant', 'fps', 'p50 ms', 'recall', 'stray'))
+    for case in cases:
+        result = benchmark_allow_list(case, frames)
+        report.append({'case': case, 'result': result})
+        for name, variant in result.items():
+            print(row.format(case['ARUCO_DICT'], '{}x{}'.format(*case['RESOLUTION']), name,
+                             '{:.0f}'.format(variant['fps']),
+                             '{:.2f}'.format(variant['latency_ms']['p50']),
+                             '{:.2f}'.format(variant['recall'] or 0),
+                             variant['stray_accepted']))
+
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('[INFO] Report saved to {}'.format(report_path))
+
+if __name__ == '__main__':
+    main()
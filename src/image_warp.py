@@ -1,6 +1,110 @@
+
+# Overlay compositing ("AR"): an image is warped onto a destination quad of the frame,
+# usually the corners of a detected marker.
+# Only the bounding box of the quad is warped and blended, in uint16 fixed point
+# (weights 0..256, >> 8) instead of full-frame float64 multiplies, and the antialiased
+# dilated mask is only redrawn when the quad shape moves within its box.
+
+import sys
+
 import cv2
 import numpy as np
 
+from aruco_detectors import ArucoDetector
+from rendering import Display
+from video_stream import FrameGrabber
+
+class OverlayCompositor(object):
+    """Sample:
+        compositor = OverlayCompositor(board_image)
+        compositor.composite(frame, marker_corners[0])   # in place, quad (4,2) ordered as src_points
+        compositor.composite_homography(frame, H)        # or from a homography overlay -> frame
+
+    src_points: overlay points mapped to the quad, the overlay corners clockwise from top-left by default
+    dilate_iterations: growth of the mask (3x3), the warped black border around the overlay is kept
+    mask_tolerance: [px] quad displacement within its ROI under which the last mask is reused
+    """
+    def __init__(self, overlay, src_points=None, dilate_iterations=2, mask_tolerance=0.5):
+        self.overlay = overlay
+        h, w = overlay.shape[:2]
+        if src_points is None:
+            src_points = [(0, 0), (w, 0), (w, h), (0, h)]
+        self.src_points = np.float32(src_points).reshape(4,2)
+        self.dilate_iterations = dilate_iterations
+        self.mask_tolerance = mask_tolerance
+        # dilation growth plus the antialiased edge
+        self.pad = dilate_iterations + 2
+        self._kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+
+        self._mask_quad = None
+        self._weights = None
+        self._inv_weights = None
+        self.masks_drawn = 0
+        self.masks_reused = 0
+
+    def composite(self, frame, dst_points):
+        """Blends the overlay into frame (in place) on the quad dst_points (4,2). Returns frame."""
+        dst_points = np.float32(dst_points).reshape(4,2)
+        H = cv2.getPerspectiveTransform(self.src_points, dst_points)
+        return self._composite(frame, H, dst_points)
+
+    def composite_homography(self, frame, H):
+        """Same as composite() with the overlay -> frame homography H (3,3)."""
+        H = np.asarray(H, dtype=np.float64)
+        dst_points = cv2.perspectiveTransform(self.src_points.reshape(-1,1,2), H).reshape(4,2)
+        return self._composite(frame, H, dst_points)
+
+    def _roi(self, frame_shape, dst_points):
+        frame_h, frame_w = frame_shape[:2]
+        x0, y0 = np.floor(dst_points.min(axis=0)).astype(int) - self.pad
+        x1, y1 = np.ceil(dst_points.max(axis=0)).astype(int) + self.pad + 1
+        return max(x0, 0), max(y0, 0), min(x1, frame_w), min(y1, frame_h)
+
+    def _mask_weights(self, quad, size):
+        """Blend weights (h,w,1) uint16 of the overlay and of the frame, quad relative to the ROI."""
+        w, h = size
+        if (self._mask_quad is not None and self._weights.shape[:2] == (h, w) and
+                np.abs(quad - self._mask_quad).max() <= self.mask_tolerance):
+            self.masks_reused += 1
+            return self._weights, self._inv_weights
+
+        mask = np.zeros((h, w), dtype=np.uint8)
+        # 4 bits of sub-pixel precision
+        cv2.fillConvexPoly(mask, np.round(quad * 16).astype(np.int32), 255, cv2.LINE_AA, 4)
+        if self.dilate_iterations > 0:
+            mask = cv2.dilate(mask, self._kernel, iterations=self.dilate_iterations)
+
+        # 0..255 -> 0..256, so that a full mask copies the overlay exactly
+        weights = mask.astype(np.uint16)
+        weights += weights >> 7
+        self._weights = weights[:,:,None]
+        self._inv_weights = 256 - self._weights
+        self._mask_quad = quad
+        self.masks_drawn += 1
+        return self._weights, self._inv_weights
+
+    def _composite(self, frame, H, dst_points):
+        x0, y0, x1, y1 = self._roi(frame.shape, dst_points)
+        if x0 >= x1 or y0 >= y1:
+            return frame
+
+        # warp straight into the ROI: overlay -> frame, then frame -> ROI
+        H_roi = np.float64([[1, 0, -x0], [0, 1, -y0], [0, 0, 1]]).dot(H)
+        warped = cv2.warpPerspective(self.overlay, H_roi, (x1 - x0, y1 - y0))
+        weights, inv_weights = self._mask_weights(dst_points - np.float32([x0, y0]), (x1 - x0, y1 - y0))
+
+        roi = frame[y0:y1, x0:x1]
+        if roi.ndim == 2:
+            weights, inv_weights = weights[:,:,0], inv_weights[:,:,0]
+        # (overlay * a + frame * (256 - a) + 128) >> 8, at most 65408: fits uint16
+        blended = warped.astype(np.uint16)
+        blended *= weights
+        blended += roi * inv_weights
+        blended += 128
+        blended >>= 8
+        roi[:] = blended
+        return frame
+
 def main():
     dest_imagepath  = r'C:\Users\lcondados\Documents\Novelis\Data\Marcacao_cones\PINDA\Camera8\Camera 8 - frame at 4m19s.jpg'
     board_imagepath = r'C:\Users\lcondados\Documents\Novelis\workspace\arucodiscoveries\src\ChArUco_Marker_4x4_50_larger.png'
@@ -11,48 +115,53 @@ def main():
     board_h = board_image.shape[0]
     board_w = board_image.shape[1]
 
-    imgH, imgW = dest_image.shape[:2]
-
     # pts_src = np.float32([(0,0), (0, board_w), (board_w, board_h), (0, board_h)])
     # pts_src = np.float32([(0,0), (board_w, 0), (board_w, board_h), (0, board_h)])
     pts_src = np.float32([(0,0), (0, board_w), (board_h, board_w), (board_h, 0)])
     pts_dst = np.float32([(72,484), (111,459), (135,473), (98,496)])
 
-    # compute the homography matrix between the image and the video frame
-    H, _ = cv2.findHomography(pts_src, pts_dst)
-
-    #warp the  image to video frame based on the homography
-    warped  = cv2.warpPerspective(board_image, H, (dest_image.shape[1], dest_image.shape[0]))
-
-    #Create a mask representing region to
-    #copy from the warped image into the video frame.
-    mask = np.zeros((imgH, imgW), dtype="uint8")
-    cv2.fillConvexPoly(mask, pts_dst.astype("int32"), (255, 255, 255),cv2.LINE_AA)
-
-    # give the source image a black border
-    # surrounding it when applied to the source image,
-    #you can apply a dilation operation
-    rect = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-    mask = cv2.dilate(mask, rect, iterations=2)
-
-    # Copy the mask with the three channel version by stacking it depth-wise,
-    # This will allow copying the warped source image into the input image
-    maskScaled = mask.copy() / 255.0
-    maskScaled = np.dstack([maskScaled] * 3)
-
-    # Copy the masked warped image into the video frame by
-    # (1) multiplying the warped image and masked together,
-    # (2) multiplying the Video frame with the mask
-    # (3) adding the resulting images
-    warpedMultiplied = cv2.multiply(warped.astype("float"), maskScaled)
-    imageMultiplied = cv2.multiply(dest_image.astype(float), 1.0 - maskScaled)
-    #imgout = video frame multipled with mask
-    #        + warped image multipled with mask
-    output = cv2.add(warpedMultiplied, imageMultiplied)
-    output = output.astype("uint8")
+    # warp and blend only inside the bounding box of pts_dst
+    compositor = OverlayCompositor(board_image, pts_src)
+    output = compositor.composite(dest_image, pts_dst)
     cv2.imshow("output", output)
 
     cv2.waitKey(0)
 
+def stream_main():
+    # ------------------------------
+    overlay_imagepath = 'ChArUco_Marker.png'
+    video_stream = 0
+
+    config = {}
+    config['ARUCO_DICT'] = cv2.aruco.DICT_4X4_50
+    # ------------------------------
+
+    overlay = cv2.imread(overlay_imagepath)
+    video = FrameGrabber(video_stream)
+    detector = ArucoDetector(config)
+    display = Display('overlay', max_fps=30)
+
+    # one compositor per marker id, each keeps the mask of its own quad
+    compositors = {}
+    def loop():
+        while not display.stopped:
+            ret, frame = video.read()
+            if not ret:
+                break
+
+            marker_corners, marker_ids = detector.detect(frame)
+            for corners, marker_id in zip(marker_corners, marker_ids.tolist()):
+                if marker_id not in compositors:
+                    compositors[marker_id] = OverlayCompositor(overlay)
+                compositors[marker_id].composite(frame, corners)
+            display.submit(frame)
+
+    display.run(loop)
+    video.release()
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    # python image_warp.py --stream: overlay on the markers of the live video
+    if '--stream' in sys.argv[1:]:
+        stream_main()
+    else:
+        main()
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+import queue
+import threading
+
+import cv2
+
+class AsyncImageWriter(object):
+    """Writes images on a background thread so that the capture loop never waits on cv2.imwrite.
+
+    Sample:
+        writer = AsyncImageWriter()
+        writer.write('assets/frames/0001.jpg', frame)
+        ...
+        writer.close() # waits for the pending images
+    """
+    def __init__(self, max_pending=64):
+        self._queue = queue.Queue(maxsize=max_pending)
+        self.written = 0
+        self.failed = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            imagepath, image = item
+            if cv2.imwrite(imagepath, image):
+                self.written += 1
+            else:
+                self.failed += 1
+
+    def write(self, imagepath, image):
+        # the caller may reuse its buffer, keep our own copy
+        # (only blocks when max_pending images are already waiting)
+        self._queue.put((imagepath, image.copy()))
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
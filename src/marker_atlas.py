@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+# Printable marker sheets.
+# The markers of a page are rendered together from the decoded dictionary bits
+# (marker_generator.gen_ArUco_markers) and tiled on A4 pages with a reshape,
+# the ids are written under each marker. The pages go to a multi-page TIFF with
+# the DPI set, so they print at the physical marker size.
+
+import os
+import time
+
+import cv2
+import numpy as np
+
+import common
+from marker_generator import dictionary_bits, gen_ArUco_markers
+
+MM_PER_INCH = 25.4
+
+def mm_to_px(mm, dpi):
+    return int(round(mm / MM_PER_INCH * dpi))
+
+class PageLayout(object):
+    """Grid of markers on an A4 page (common.A4_width x common.A4_height mm)."""
+    def __init__(self, marker_mm, dpi=300, gap_mm=8, margin_mm=10):
+        self.dpi = dpi
+        self.page_w = mm_to_px(common.A4_width, dpi)
+        self.page_h = mm_to_px(common.A4_height, dpi)
+        self.marker_px = mm_to_px(marker_mm, dpi)
+        self.gap_px = mm_to_px(gap_mm, dpi)
+        margin_px = mm_to_px(margin_mm, dpi)
+
+        self.cell_px = self.marker_px + self.gap_px
+        self.cols = (self.page_w - 2*margin_px + self.gap_px) // self.cell_px
+        self.rows = (self.page_h - 2*margin_px + self.gap_px) // self.cell_px
+        if self.cols < 1 or self.rows < 1:
+            raise ValueError('A {} mm marker does not fit on the page'.format(marker_mm))
+
+        # grid centered on the page
+        self.x0 = (self.page_w - (self.cols*self.cell_px - self.gap_px)) // 2
+        self.y0 = (self.page_h - (self.rows*self.cell_px - self.gap_px)) // 2
+
+    @property
+    def per_page(self):
+        return self.rows * self.cols
+
+    def positions(self, count):
+        """Top-left corners (x, y) of the first count markers of a page."""
+        i = np.arange(count)
+        return np.stack([self.x0 + (i % self.cols)*self.cell_px, self.y0 + (i // self.cols)*self.cell_px], axis=1)
+
+    def render_page(self, markers, labels=None):
+        """markers (n, marker_px, marker_px) with n <= per_page."""
+        n = len(markers)
+        cell = self.cell_px
+        tiles = np.full((self.per_page, cell, cell), 255, dtype=np.uint8)
+        tiles[:n, :self.marker_px, :self.marker_px] = markers
+        mosaic = tiles.reshape(self.rows, self.cols, cell, cell).transpose(0, 2, 1, 3)
+        mosaic = mosaic.reshape(self.rows*cell, self.cols*cell)
+
+        page = np.full((self.page_h, self.page_w), 255, dtype=np.uint8)
+        h = min(mosaic.shape[0], self.page_h - self.y0)
+        w = min(mosaic.shape[1], self.page_w - self.x0)
+        page[self.y0:self.y0+h, self.x0:self.x0+w] = mosaic[:h, :w]
+
+        if labels is not None:
+            # label in the gap under each marker
+            scale = self.gap_px / 80.0
+            thickness = max(1, int(round(scale * 2)))
+            baseline = self.marker_px + int(self.gap_px * 0.6)
+            for (x, y), label in zip(self.positions(n).tolist(), labels):
+                cv2.putText(page, label, (x, y + baseline), cv2.FONT_HERSHEY_SIMPLEX, scale, 0, thickness)
+        return page
+
+def render_atlas(aruco_dict_name, marker_mm, dpi=300, ids=None, gap_mm=8, margin_mm=10, labels=True):
+    """Yields the pages (grayscale images) with the markers ids (all the dictionary by default)."""
+    dictionary = cv2.aruco.getPredefinedDictionary(common.ARUCO_DICT[aruco_dict_name])
+    bits = dictionary_bits(dictionary)
+    ids = np.arange(len(bits)) if ids is None else np.asarray(ids)
+    layout = PageLayout(marker_mm, dpi, gap_mm, margin_mm)
+
+    for start in range(0, len(ids), layout.per_page):
+        page_ids = ids[start:start + layout.per_page]
+        markers = gen_ArUco_markers(dictionary, page_ids, layout.marker_px, bits)
+        page_labels = None
+        if labels:
+            page_labels = ['{} #{}'.format(aruco_dict_name, marker_id) for marker_id in page_ids.tolist()]
+        yield layout.render_page(markers, page_labels)
+
+def save_pages(pages, path, dpi=300):
+    """.tif/.tiff: one multi-page file with the DPI set, other formats: one file per page (path_001.png...)."""
+    pages = list(pages)
+    stem, ext = os.path.splitext(path)
+    if ext.lower() in ('.tif', '.tiff'):
+        params = [cv2.IMWRITE_TIFF_RESUNIT, 2,  # inches
+                  cv2.IMWRITE_TIFF_XDPI, dpi,
+                  cv2.IMWRITE_TIFF_YDPI, dpi,
+                  cv2.IMWRITE_TIFF_COMPRESSION, 32946]  # deflate
+        cv2.imwritemulti(path, pages, params)
+        return [path]
+
+    paths = []
+    for i, page in enumerate(pages):
+        page_path = '{}_{:03d}{}'.format(stem, i + 1, ext)
+        cv2.imwrite(page_path, page)
+        paths.append(page_path)
+    return paths
+
+def main():
+    # ------------------------------
+    dictionaries = ['DICT_4X4_1000', 'DICT_5X5_1000', 'DICT_6X6_1000']
+    marker_mm = 30
+    dpi = 300
+    output_dir = 'assets/marker_sheets'
+    # ------------------------------
+
+    os.makedirs(output_dir, exist_ok=True)
+    for aruco_dict_name in dictionaries:
+        start = time.perf_counter()
+        path = os.path.join(output_dir, '{}_{}mm_{}dpi.tif'.format(aruco_dict_name, marker_mm, dpi))
+        pages = list(render_atlas(aruco_dict_name, marker_mm, dpi))
+        save_pages(pages, path, dpi)
+        print('[INFO] {}: {} pages in {:.1f} s -> {}'.format(aruco_dict_name, len(pages),
+                                                            time.perf_counter() - start, path))
+
+if __name__ == '__main__':
+    main()
@@ -11,6 +11,38 @@ def gen_ArUco_marker(dictionary, id, size):
     markerImage = cv2.aruco.generateImageMarker(dictionary, id, size, None, 1)
     return markerImage
 
+def dictionary_bits(dictionary):
+    """(N, markerSize, markerSize) uint8 bits of all the markers, decoded from bytesList at once.
+
+    Each row of bytesList holds the 4 rotations one after the other, the bits of the first one
+    are packed MSB first, the last byte only holds the remaining bits (in its low bits).
+    """
+    marker_size = dictionary.markerSize
+    full_bytes, remaining_bits = divmod(marker_size * marker_size, 8)
+    nbytes = full_bytes + (1 if remaining_bits else 0)
+
+    byte_list = dictionary.bytesList
+    bits = np.unpackbits(byte_list.reshape(len(byte_list), -1)[:,:nbytes], axis=1)
+    if remaining_bits:
+        bits = np.concatenate([bits[:,:8*full_bytes], bits[:,8*full_bytes + 8 - remaining_bits:]], axis=1)
+    return bits.reshape(-1, marker_size, marker_size)
+
+def gen_ArUco_markers(dictionary, ids, size, bits=None, border_bits=1):
+    """Same images as gen_ArUco_marker for all the ids, (N, size, size) uint8,
+    with a single nearest neighbour upscale of the bits.
+    bits: optional dictionary_bits(dictionary), to decode the dictionary only once.
+    """
+    if bits is None:
+        bits = dictionary_bits(dictionary)
+    marker_size = bits.shape[1]
+    cells = marker_size + 2*border_bits
+
+    grid = np.zeros((len(ids), cells, cells), dtype=np.uint8)
+    grid[:, border_bits:cells-border_bits, border_bits:cells-border_bits] = bits[np.asarray(ids, dtype=np.intp)] * 255
+    # cell of every output pixel (as cv2.resize INTER_NEAREST)
+    index = np.arange(size) * cells // size
+    return grid[:, index[:,None], index[None,:]]
+
 def main():
     # load predefined dictionary
     dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_50)
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+# Batched square marker pose estimation.
+# Closed-form planar pose (IPPE, Collins & Bartoli 2014) vectorized with NumPy over
+# all the N detected markers at once, instead of one estimatePoseSingleMarkers call per marker.
+# Object points follow cv2.aruco.estimatePoseSingleMarkers:
+# (-L/2, L/2, 0), (L/2, L/2, 0), (L/2, -L/2, 0), (-L/2, -L/2, 0)
+
+import cv2
+import numpy as np
+
+def marker_object_points(marker_length):
+    half = marker_length / 2.0
+    return np.float64([[-half,  half, 0],
+                       [ half,  half, 0],
+                       [ half, -half, 0],
+                       [-half, -half, 0]])
+
+def _square_homographies(normalized):
+    """Homographies (N,3,3) from the canonical square (-1,1),(1,1),(1,-1),(-1,-1) to the (N,4,2) points."""
+    n = len(normalized)
+    sx = np.float64([-1, 1, 1, -1])
+    sy = np.float64([1, 1, -1, -1])
+    u = normalized[:,:,0]
+    v = normalized[:,:,1]
+
+    # DLT with h22 = 1, two rows per correspondence
+    A = np.zeros((n, 8, 8))
+    b = np.zeros((n, 8))
+    A[:,0::2,0] = sx
+    A[:,0::2,1] = sy
+    A[:,0::2,2] = 1
+    A[:,0::2,6] = -sx * u
+    A[:,0::2,7] = -sy * u
+    A[:,1::2,3] = sx
+    A[:,1::2,4] = sy
+    A[:,1::2,5] = 1
+    A[:,1::2,6] = -sx * v
+    A[:,1::2,7] = -sy * v
+    b[:,0::2] = u
+    b[:,1::2] = v
+
+    h = np.linalg.solve(A, b[...,None])[...,0]
+    return np.concatenate([h, np.ones((n,1))], axis=1).reshape(n,3,3)
+
+def _rotate_vectors_to_z(p, q):
+    """Rotations (N,3,3) taking the unit vectors along (p, q, 1) to the z axis."""
+    norm = np.sqrt(p*p + q*q + 1)
+    ax, ay, az = p/norm, q/norm, 1/norm
+    d = 1.0 / (1.0 + az)
+    R = np.empty((len(p), 3, 3))
+    R[:,0,0] = 1 - ax*ax*d
+    R[:,0,1] = -ax*ay*d
+    R[:,0,2] = -ax
+    R[:,1,0] = -ax*ay*d
+    R[:,1,1] = 1 - ay*ay*d
+    R[:,1,2] = -ay
+    R[:,2,0] = ax
+    R[:,2,1] = ay
+    R[:,2,2] = 1 - (ax*ax + ay*ay)*d
+    return R
+
+def _ippe_rotations(H):
+    """The two IPPE rotation candidates for each homography (plane origin at the square center)."""
+    # Jacobian of the homography at the origin and image of the origin
+    p = H[:,0,2]
+    q = H[:,1,2]
+    J = np.empty((len(H), 2, 2))
+    J[:,0,0] = H[:,0,0] - H[:,2,0]*p
+    J[:,0,1] = H[:,0,1] - H[:,2,1]*p
+    J[:,1,0] = H[:,1,0] - H[:,2,0]*q
+    J[:,1,1] = H[:,1,1] - H[:,2,1]*q
+
+    Rv = np.transpose(_rotate_vectors_to_z(p, q), (0,2,1))
+    B = Rv[:,:2,:2] - np.stack([p, q], axis=1)[:,:,None] * Rv[:,2,None,:2]
+    A = np.linalg.solve(B, J)
+
+    # largest singular value of A
+    AAt = A @ np.transpose(A, (0,2,1))
+    trace = AAt[:,0,0] + AAt[:,1,1]
+    gamma = np.sqrt(0.5 * (trace + np.sqrt((AAt[:,0,0] - AAt[:,1,1])**2 + 4*AAt[:,0,1]**2)))
+    R22 = A / gamma[:,None,None]
+
+    b0 = np.sqrt(np.clip(1 - R22[:,0,0]**2 - R22[:,1,0]**2, 0, None))
+    b1 = np.sqrt(np.clip(1 - R22[:,0,1]**2 - R22[:,1,1]**2, 0, None))
+    sp = -R22[:,0,0]*R22[:,0,1] - R22[:,1,0]*R22[:,1,1]
+    b1 = np.where(sp < 0, -b1, b1)
+
+    rotations = []
+    for sign in (1, -1):
+        c0 = np.stack([R22[:,0,0], R22[:,1,0], sign*b0], axis=1)
+        c1 = np.stack([R22[:,0,1], R22[:,1,1], sign*b1], axis=1)
+        c2 = np.cross(c0, c1)
+        rotations.append(Rv @ np.stack([c0, c1, c2], axis=2))
+    return rotations
+
+def _translations(R, object_points, normalized):
+    """Least squares translations (N,3) given the rotations and the normalized image points."""
+    X = np.einsum('nij,kj->nki', R, object_points)
+    u = normalized[:,:,0]
+    v = normalized[:,:,1]
+
+    # t_x - u t_z = u X_z - X_x ; t_y - v t_z = v X_z - X_y
+    n, k = u.shape
+    A = np.zeros((n, 2*k, 3))
+    A[:,0::2,0] = 1
+    A[:,0::2,2] = -u
+    A[:,1::2,1] = 1
+    A[:,1::2,2] = -v
+    b = np.empty((n, 2*k))
+    b[:,0::2] = u*X[:,:,2] - X[:,:,0]
+    b[:,1::2] = v*X[:,:,2] - X[:,:,1]
+
+    At = np.transpose(A, (0,2,1))
+    return np.linalg.solve(At @ A, (At @ b[...,None]))[...,0]
+
+def _reprojection_errors(R, t, object_points, normalized):
+    X = np.einsum('nij,kj->nki', R, object_points) + t[:,None,:]
+    projected = X[:,:,:2] / X[:,:,2:]
+    return np.sum((projected - normalized)**2, axis=(1,2))
+
+def rotation_matrices_to_rvecs(R):
+    """Vectorized cv2.Rodrigues for (N,3,3) rotation matrices."""
+    cos_angle = np.clip((np.trace(R, axis1=1, axis2=2) - 1) / 2, -1, 1)
+    angle = np.arccos(cos_angle)
+    axis = np.stack([R[:,2,1] - R[:,1,2],
+                     R[:,0,2] - R[:,2,0],
+                     R[:,1,0] - R[:,0,1]], axis=1)
+    sin_angle = np.sin(angle)
+    small = sin_angle < 1e-6
+    rvecs = axis * (angle / (2*np.where(small, 1, sin_angle)))[:,None]
+    # identity and 180 degrees rotations are ill-conditioned above, rare enough for cv2
+    for i in np.flatnonzero(small):
+        rvecs[i] = cv2.Rodrigues(R[i])[0].ravel()
+    return rvecs
+
+def rvecs_to_rotation_matrices(rvecs):
+    """Vectorized cv2.Rodrigues for (N,3) rotation vectors."""
+    rvecs = np.asarray(rvecs, dtype=np.float64).reshape(-1,3)
+    angle = np.linalg.norm(rvecs, axis=1)
+    axis = rvecs / np.where(angle > 1e-12, angle, 1)[:,None]
+    x, y, z = axis[:,0], axis[:,1], axis[:,2]
+    zeros = np.zeros_like(x)
+    K = np.stack([zeros, -z, y,
+                  z, zeros, -x,
+                  -y, x, zeros], axis=1).reshape(-1,3,3)
+    sin_angle = np.sin(angle)[:,None,None]
+    cos_angle = np.cos(angle)[:,None,None]
+    return np.eye(3) + sin_angle*K + (1 - cos_angle)*(K @ K)
+
+def estimate_marker_poses(marker_corners, marker_length, camera_matrix, dist_coeffs):
+    """Poses of all the square markers at once.
+
+    marker_corners: (N,4,2) array, or the tuple of (1,4,2) arrays returned by detectMarkers
+    Returns rvecs (N,3), tvecs (N,3) and the object points (4,3).
+    """
+    corners = np.asarray(marker_corners, dtype=np.float64).reshape(-1,4,2)
+    object_points = marker_object_points(marker_length)
+    if len(corners) == 0:
+        return np.zeros((0,3)), np.zeros((0,3)), object_points
+
+    # a single undistortPoints call for all the corners
+    normalized = cv2.undistortPoints(corners.reshape(-1,1,2), camera_matrix, dist_coeffs)
+    normalized = normalized.reshape(-1,4,2)
+
+    H = _square_homographies(normalized)
+    # canonical square of side 2 -> marker of side marker_length
+    H[:,:,:2] *= 2.0 / marker_length
+
+    R1, R2 = _ippe_rotations(H)
+    t1 = _translations(R1, object_points, normalized)
+    t2 = _translations(R2, object_points, normalized)
+    e1 = _reprojection_errors(R1, t1, object_points, normalized)
+    e2 = _reprojection_errors(R2, t2, object_points, normalized)
+
+    best = (e1 <= e2)[:,None]
+    rvecs = np.where(best, rotation_matrices_to_rvecs(R1), rotation_matrices_to_rvecs(R2))
+    tvecs = np.where(best, t1, t2)
+    return rvecs, tvecs, object_points
+
+def project_points_batch(points, rvecs, tvecs, camera_matrix, dist_coeffs):
+    """Projects the same (K,3) points for each of the N poses with a single projectPoints call.
+    Returns (N,K,2) image points.
+    """
+    if len(rvecs) == 0:
+        return np.zeros((0, len(points), 2))
+    R = rvecs_to_rotation_matrices(rvecs)
+    X = np.einsum('nij,kj->nki', R, points) + np.asarray(tvecs, dtype=np.float64).reshape(-1,1,3)
+    projected, _ = cv2.projectPoints(X.reshape(-1,3), np.zeros(3), np.zeros(3), camera_matrix, dist_coeffs)
+    return projected.reshape(len(X), len(points), 2)
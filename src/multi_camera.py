@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+
+# Several cameras processed concurrently.
+# Every camera has its own FrameGrabber, calibration and pose processors. A dispatcher
+# thread hands the freshest frame of each camera to a shared thread pool sized to the
+# cores: round robin with a rotating start, at most max_in_flight frames per camera,
+# so a slow camera only ever holds its own slots and drops its own frames. The per-camera results are then matched across cameras by
+# capture timestamp (time.monotonic of the grabbers) within a tolerance. A camera that
+# stops producing results is declared stale and the other cameras keep producing partial sets.
+
+import logging
+import os
+import queue
+import threading
+import time
+from bisect import bisect_right
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from process_videos import VideoPoseProcessor
+from video_stream import FrameGrabber
+
+logger = logging.getLogger(__name__)
+
+CameraResult = namedtuple('CameraResult', ['camera', 'frame_index', 'timestamp',
+                                           'ids', 'corner_counts', 'rvecs', 'tvecs', 'latency'])
+
+class TimestampMatcher(object):
+    """Groups the results of all the cameras whose timestamps are within tolerance seconds.
+
+    Sample:
+        matcher = TimestampMatcher(['left', 'right'], tolerance=0.02)
+        for matched in matcher.add(result):
+            matched['left'], matched['right']
+
+    stale_after: [s] a camera without any result while the others are that far ahead of its
+                 last one is stale, the sets are then matched without it (partial sets, the
+                 stale camera is missing from the dict) until it produces results again.
+                 None waits for all the cameras forever.
+    """
+    def __init__(self, camera_names, tolerance=0.02, max_pending=32, stale_after=1.0):
+        self.camera_names = list(camera_names)
+        self.tolerance = tolerance
+        self.max_pending = max_pending
+        self.stale_after = stale_after
+        # per camera results sorted by timestamp
+        self._pending = {name: [] for name in self.camera_names}
+        self._last_timestamp = {name: None for name in self.camera_names}
+        self._first_timestamp = None
+        self._newest_timestamp = None
+        self.stale = set()
+        self.matched = 0
+        self.partial = 0
+        self.unmatched = 0
+
+    def _update_stale(self, camera):
+        if camera in self.stale:
+            self.stale.discard(camera)
+            logger.info('Camera %s produces results again, back in the matched sets', camera)
+        if self.stale_after is None:
+            return
+        for name in self.camera_names:
+            if name in self.stale or self._pending[name]:
+                continue
+            # a camera that never produced anything is late since the first result of any camera
+            last = self._last_timestamp[name]
+            if last is None:
+                last = self._first_timestamp
+            if self._newest_timestamp - last > self.stale_after:
+                self.stale.add(name)
+                logger.warning('Camera %s has no result for %.2f s, matching the other cameras without it',
+                               name, self._newest_timestamp - last)
+
+    def add(self, result):
+        """Returns the list of the matched sets ({camera: CameraResult}) completed by result."""
+        pending = self._pending[result.camera]
+        pending.insert(bisect_right([r.timestamp for r in pending], result.timestamp), result)
+        if len(pending) > self.max_pending:
+            pending.pop(0)
+            self.unmatched += 1
+
+        if self._first_timestamp is None:
+            self._first_timestamp = self._newest_timestamp = result.timestamp
+        last = self._last_timestamp[result.camera]
+        self._last_timestamp[result.camera] = result.timestamp if last is None else max(last, result.timestamp)
+        self._newest_timestamp = max(self._newest_timestamp, result.timestamp)
+        self._update_stale(result.camera)
+
+        live = [name for name in self.camera_names if name not in self.stale]
+        matched_sets = []
+        while all(self._pending[name] for name in live):
+            heads = [self._pending[name][0] for name in live]
+            timestamps = [head.timestamp for head in heads]
+            if max(timestamps) - min(timestamps) <= self.tolerance:
+                matched_sets.append({head.camera: head for head in heads})
+                for name in live:
+                    self._pending[name].pop(0)
+                if len(live) < len(self.camera_names):
+                    self.partial += 1
+                else:
+                    self.matched += 1
+            else:
+                # the oldest head can not match anymore, the other cameras only get newer frames
+                oldest = live[int(np.argmin(timestamps))]
+                self._pending[oldest].pop(0)
+                self.unmatched += 1
+        return matched_sets
+
+class _Camera(object):
+    def __init__(self, name, video_stream, camera_matrix, dist_coeffs, config, mode, max_in_flight, buffer_size):
+        self.name = name
+        self.grabber = FrameGrabber(video_stream, buffer_size=buffer_size)
+        # one processor per frame in flight, they are not shared between threads
+        self.processors = queue.Queue()
+        for _ in range(max_in_flight):
+            self.processors.put(VideoPoseProcessor(config, camera_matrix, dist_coeffs, mode))
+        self.in_flight = 0
+        self.frames_processed = 0
+        self.frames_failed = 0
+
+class MultiCameraRunner(object):
+    """Sample:
+        cameras = [{'NAME': 'left',  'VIDEO_STREAM': 0, 'CAMERA_MATRIX': K0, 'DIST_COEFFS': D0},
+                   {'NAME': 'right', 'VIDEO_STREAM': 1, 'CAMERA_MATRIX': K1, 'DIST_COEFFS': D1}]
+        runner = MultiCameraRunner(config, cameras)
+        for matched in runner:  # {camera name: CameraResult}, until the streams end or stop()
+                                # a stale camera is missing from the set
+            ...
+        runner.stop()
+
+    config: board/marker config (see process_videos.VideoPoseProcessor), mode 'charuco' or 'markers'
+    workers: shared pool size, all the cores by default
+    max_in_flight: frames of a camera processed at the same time (per-camera backpressure)
+    tolerance: [s] maximum timestamp spread of a matched set
+    stale_after: [s] a camera lagging that much is left out of the sets until it recovers (see TimestampMatcher)
+    """
+    def __init__(self, config, cameras, mode='charuco', workers=None, max_in_flight=1, tolerance=0.02,
+                 buffer_size=2, stale_after=1.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight
+        self.cameras = [_Camera(camera['NAME'],
+                                camera['VIDEO_STREAM'],
+                                camera['CAMERA_MATRIX'],
+                                camera['DIST_COEFFS'],
+                                config,
+                                mode,
+                                max_in_flight,
+                                buffer_size) for camera in cameras]
+        self.matcher = TimestampMatcher([camera.name for camera in self.cameras], tolerance,
+                                        stale_after=stale_after)
+
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._stopped = False
+        self._output = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+
+    def _dispatch(self):
+        start = 0
+        while True:
+            with self._condition:
+                if self._stopped:
+                    break
+                if self._in_flight == 0 and all(camera.grabber.finished for camera in self.cameras):
+                    break
+
+                submitted = False
+                # rotating start: no camera is always served first
+                for i in range(len(self.cameras)):
+                    camera = self.cameras[(start + i) % len(self.cameras)]
+                    if self._in_flight >= self.workers:
+                        break
+                    if camera.in_flight >= self.max_in_flight:
+                        continue
+                    ret, frame, timestamp, frame_index = camera.grabber.read_with_timestamp(timeout=0)
+                    if not ret:
+                        continue
+                    camera.in_flight += 1
+                    self._in_flight += 1
+                    self._executor.submit(self._process, camera, frame, timestamp, frame_index)
+                    submitted = True
+                start = (start + 1) % len(self.cameras)
+
+                if not submitted:
+                    # woken up by a completed frame, the grabbers are polled every few ms
+                    self._condition.wait(0.002)
+
+        self._output.put(None)
+
+    def _process(self, camera, frame, timestamp, frame_index):
+        processor = camera.processors.get()
+        started = time.perf_counter()
+        result = None
+        try:
+            ids, corner_counts, rvecs, tvecs = processor.process(frame)
+            result = CameraResult(camera.name, frame_index, timestamp, ids, corner_counts, rvecs, tvecs,
+                                  time.perf_counter() - started)
+        except Exception:
+            # nobody reads the future of the pool, the frame is logged and dropped here
+            logger.exception('Camera %s: processing of frame %d failed', camera.name, frame_index)
+        finally:
+            camera.processors.put(processor)
+            # matched and released in one step, the dispatcher only ends once the output is complete
+            with self._condition:
+                if result is not None:
+                    for matched in self.matcher.add(result):
+                        self._output.put(matched)
+                    camera.frames_processed += 1
+                else:
+                    camera.frames_failed += 1
+                camera.in_flight -= 1
+                self._in_flight -= 1
+                self._condition.notify()
+
+    def __iter__(self):
+        while True:
+            matched = self._output.get()
+            if matched is None:
+                break
+            yield matched
+
+    def stats(self):
+        """Per camera counters, frames_dropped includes the frames_failed by the processor."""
+        return {camera.name: {'frames_grabbed': camera.grabber.frames_grabbed,
+                              'frames_dropped': camera.grabber.frames_dropped + camera.frames_failed,
+                              'frames_failed': camera.frames_failed,
+                              'frames_processed': camera.frames_processed} for camera in self.cameras}
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
+        for camera in self.cameras:
+            camera.grabber.release()
+
+def main():
+    # ------------------------------
+    config = {}
+    config['ARUCO_DICT'] = cv2.aruco.DICT_4X4_50
+    config['SQUARES_VERTICALLY'] = 6
+    config['SQUARES_HORIZONTALLY'] = 4
+    config['SQUARE_LENGTH'] = 30 / 1000.0
+    config['MARKER_LENGTH'] = 15 / 1000.0
+
+    cameras = []
+    for i, name in enumerate(['cam0', 'cam1']):
+        cameras.append({'NAME': name,
+                        'VIDEO_STREAM': i,
+                        'CAMERA_MATRIX': np.load('assets/{}_parameters/camera_matrix.npy'.format(name)),
+                        'DIST_COEFFS': np.load('assets/{}_parameters/dist_coeffs.npy'.format(name))})
+    # ------------------------------
+
+    logging.basicConfig(level=logging.INFO)
+    runner = MultiCameraRunner(config, cameras, tolerance=0.02)
+    try:
+        for matched in runner:
+            poses = []
+            for name in runner.matcher.camera_names:
+                result = matched.get(name)
+                if result is None:
+                    poses.append('{}: stale'.format(name))
+                elif len(result.ids) > 0:
+                    poses.append('{}: ({:.2f}, {:.2f}, {:.2f}) m'.format(name, *result.tvecs[0]))
+                else:
+                    poses.append('{}: -'.format(name))
+            print(' | '.join(poses))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        runner.stop()
+        print(runner.stats())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+# Temporal pose tracking.
+# A constant-velocity alpha-beta filter per board/marker id. It smooths the jitter of
+# the per-frame solutions, gives the pose solver a starting point (useExtrinsicGuess)
+# and predicts the pose of the frames where the detection is skipped or fails.
+# Rotations are filtered on the rotation group: the measurement residual is the
+# rotation vector of R_measured * R_predicted^T, so there is no wrap-around at 180 degrees.
+
+import time
+
+import numpy as np
+
+from marker_pose import rotation_matrices_to_rvecs, rvecs_to_rotation_matrices
+
+class PoseTracker(object):
+    """Sample:
+        tracker = PoseTracker()
+        rvec_guess, tvec_guess = tracker.predict('board', timestamp)
+        ... solve the pose with the guess ...
+        rvec, tvec = tracker.update('board', rvec, tvec, timestamp)
+
+    timestamp is in seconds (e.g. FrameGrabber timestamps), time.monotonic() when None.
+    """
+    def __init__(self, alpha=0.6, beta=0.2, max_prediction_time=0.5):
+        self.alpha = alpha
+        self.beta = beta
+        # predictions further than this (seconds) from the last measurement are dropped
+        self.max_prediction_time = max_prediction_time
+        self._states = {}
+
+    def _now(self, timestamp):
+        return time.monotonic() if timestamp is None else timestamp
+
+    def reset(self, key=None):
+        if key is None:
+            self._states.clear()
+        else:
+            self._states.pop(key, None)
+
+    def predict_batch(self, keys, timestamp=None):
+        """Returns rvecs (N,3), tvecs (N,3) and a valid mask (N,) for the predicted poses."""
+        now = self._now(timestamp)
+        rvecs = np.zeros((len(keys), 3))
+        tvecs = np.zeros((len(keys), 3))
+        valid = np.zeros(len(keys), dtype=bool)
+
+        states = [self._states.get(key) for key in keys]
+        idx = [i for i, state in enumerate(states) if state is not None and now - state['timestamp'] <= self.max_prediction_time]
+        if not idx:
+            return rvecs, tvecs, valid
+
+        rvec = np.stack([states[i]['rvec'] for i in idx])
+        tvec = np.stack([states[i]['tvec'] for i in idx])
+        omega = np.stack([states[i]['omega'] for i in idx])
+        velocity = np.stack([states[i]['velocity'] for i in idx])
+        dt = np.array([now - states[i]['timestamp'] for i in idx])[:,None]
+
+        R = rvecs_to_rotation_matrices(omega * dt) @ rvecs_to_rotation_matrices(rvec)
+        rvecs[idx] = rotation_matrices_to_rvecs(R)
+        tvecs[idx] = tvec + velocity * dt
+        valid[idx] = True
+        return rvecs, tvecs, valid
+
+    def predict(self, key, timestamp=None):
+        """Returns the predicted (rvec, tvec) as (3,1) arrays, or (None, None)."""
+        rvecs, tvecs, valid = self.predict_batch([key], timestamp)
+        if not valid[0]:
+            return None, None
+        return rvecs[0].reshape(3,1), tvecs[0].reshape(3,1)
+
+    def update_batch(self, keys, rvecs, tvecs, timestamp=None):
+        """Feeds the measured poses, returns the filtered rvecs (N,3) and tvecs (N,3)."""
+        now = self._now(timestamp)
+        rvecs = np.asarray(rvecs, dtype=np.float64).reshape(-1,3)
+        tvecs = np.asarray(tvecs, dtype=np.float64).reshape(-1,3)
+        pred_rvecs, pred_tvecs, valid = self.predict_batch(keys, now)
+
+        filtered_rvecs = rvecs.copy()
+        filtered_tvecs = tvecs.copy()
+        if valid.any():
+            dt = np.array([max(now - self._states[key]['timestamp'], 1e-3) if v else 1.0
+                           for key, v in zip(keys, valid)])[valid,None]
+            R_pred = rvecs_to_rotation_matrices(pred_rvecs[valid])
+            R_meas = rvecs_to_rotation_matrices(rvecs[valid])
+            rotation_residual = rotation_matrices_to_rvecs(R_meas @ np.transpose(R_pred, (0,2,1)))
+            translation_residual = tvecs[valid] - pred_tvecs[valid]
+
+            filtered_rvecs[valid] = rotation_matrices_to_rvecs(rvecs_to_rotation_matrices(self.alpha * rotation_residual) @ R_pred)
+            filtered_tvecs[valid] = pred_tvecs[valid] + self.alpha * translation_residual
+
+        valid_idx = np.cumsum(valid) - 1
+        for i, key in enumerate(keys):
+            state = self._states.get(key)
+            if valid[i]:
+                j = valid_idx[i]
+                state['omega'] = state['omega'] + self.beta * rotation_residual[j] / dt[j]
+                state['velocity'] = state['velocity'] + self.beta * translation_residual[j] / dt[j]
+            else:
+                state = {'omega': np.zeros(3), 'velocity': np.zeros(3)}
+                self._states[key] = state
+            state['rvec'] = filtered_rvecs[i]
+            state['tvec'] = filtered_tvecs[i]
+            state['timestamp'] = now
+        return filtered_rvecs, filtered_tvecs
+
+    def update(self, key, rvec, tvec, timestamp=None):
+        """Feeds one measured pose, returns the filtered (rvec, tvec) as (3,1) arrays."""
+        rvecs, tvecs = self.update_batch([key], rvec, tvec, timestamp)
+        return rvecs[0].reshape(3,1), tvecs[0].reshape(3,1)
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+
+# Offline pose extraction from recorded videos.
+# Each video is split into seek-based chunks of consecutive frames that a pool of processes
+# decodes and processes independently (every `stride`-th frame, the others are only grabbed).
+# The poses are stored as columns, one row per detected board (or marker):
+#   frame, timestamp [s], id, corner_count, rvec (3), tvec (3)
+# into a compressed .npz or a .csv that is appended chunk by chunk.
+#
+# Sample:
+#   python process_videos.py recordings/*.mp4 --stride 2 --workers 8 --format csv
+
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+import cv2
+import numpy as np
+from tqdm import tqdm
+
+import common
+from aruco_detectors import ArucoDetector, CharucoDetector
+from marker_pose import estimate_marker_poses
+
+COLUMNS = ('frame', 'timestamp', 'id', 'corner_count', 'rvec', 'tvec')
+
+class VideoPoseProcessor(object):
+    """Poses of one frame, without any drawing.
+
+    mode 'charuco': pose of the board (id 0), from the corners of the raw frame
+                    (the distortion is handled by the solver, the frame is not undistorted)
+    mode 'markers': pose of every detected marker
+    process() returns ids (N,), corner counts (N,) (number of corners used), rvecs (N,3), tvecs (N,3).
+    """
+    def __init__(self, config, camera_matrix, dist_coeffs, mode='charuco'):
+        self.config = config
+        self.mode = mode
+        self.camera_matrix = np.asarray(camera_matrix, dtype=np.float64).reshape(3,3)
+        self.dist_coeffs = np.asarray(dist_coeffs, dtype=np.float64).reshape(1,-1)
+        if mode == 'charuco':
+            self.detector = CharucoDetector(config)
+        elif mode == 'markers':
+            self.detector = ArucoDetector(config)
+        else:
+            raise ValueError('Unknown mode: {}'.format(mode))
+
+    def process(self, frame):
+        if self.mode == 'charuco':
+            charuco_corners, charuco_ids = self.detector.detect(frame).charuco(0)
+            retval, rvec, tvec = self.detector.estimate_board_pose(charuco_corners, charuco_ids,
+                                                                   self.camera_matrix, self.dist_coeffs)
+            if not retval:
+                return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32), np.zeros((0,3)), np.zeros((0,3))
+            return (np.zeros(1, dtype=np.int32), np.int32([len(charuco_ids)]),
+                    np.reshape(rvec, (1,3)), np.reshape(tvec, (1,3)))
+
+        marker_corners, marker_ids = self.detector.detect(frame)
+        rvecs, tvecs, _ = estimate_marker_poses(marker_corners, self.config['MARKER_LENGTH'],
+                                                self.camera_matrix, self.dist_coeffs)
+        return marker_ids, np.full(len(marker_ids), 4, dtype=np.int32), rvecs, tvecs
+
+def _empty_columns():
+    return {'frame': np.zeros(0, dtype=np.int64),
+            'timestamp': np.zeros(0),
+            'id': np.zeros(0, dtype=np.int32),
+            'corner_count': np.zeros(0, dtype=np.int32),
+            'rvec': np.zeros((0,3)),
+            'tvec': np.zeros((0,3))}
+
+def _concatenate_columns(columns_list):
+    if not columns_list:
+        return _empty_columns()
+    return {name: np.concatenate([columns[name] for columns in columns_list]) for name in COLUMNS}
+
+def plan_chunks(frame_count, chunk_frames):
+    """(start, stop) frame ranges, stop is None for a video of unknown length (single chunk)."""
+    if frame_count <= 0:
+        return [(0, None)]
+    return [(start, min(start + chunk_frames, frame_count)) for start in range(0, frame_count, chunk_frames)]
+
+def process_chunk(processor, video_path, start, stop, stride=1, fps=0):
+    """Processes the frames start, start+1... stop-1 of the video whose index is a multiple of stride.
+    Returns the columns and the number of processed frames.
+    """
+    capture = cv2.VideoCapture(video_path)
+    if start > 0:
+        capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    rows = []
+    frames_processed = 0
+    frame_idx = start
+    while stop is None or frame_idx < stop:
+        if frame_idx % stride:
+            # skipped frames are only grabbed, never converted
+            if not capture.grab():
+                break
+            frame_idx += 1
+            continue
+
+        ret, frame = capture.read()
+        if not ret:
+            break
+        timestamp = frame_idx / fps if fps > 0 else capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        ids, corner_counts, rvecs, tvecs = processor.process(frame)
+        if len(ids) > 0:
+            rows.append({'frame': np.full(len(ids), frame_idx, dtype=np.int64),
+                         'timestamp': np.full(len(ids), timestamp),
+                         'id': np.asarray(ids, dtype=np.int32),
+                         'corner_count': np.asarray(corner_counts, dtype=np.int32),
+                         'rvec': np.asarray(rvecs, dtype=np.float64).reshape(-1,3),
+                         'tvec': np.asarray(tvecs, dtype=np.float64).reshape(-1,3)})
+        frames_processed += 1
+        frame_idx += 1
+
+    capture.release()
+    return _concatenate_columns(rows), frames_processed
+
+_worker_processor = None
+
+def _init_video_worker(config, camera_matrix, dist_coeffs, mode):
+    global _worker_processor
+    common.init_pool_worker()
+    _worker_processor = VideoPoseProcessor(config, camera_matrix, dist_coeffs, mode)
+
+def _process_chunk_in_worker(args):
+    return process_chunk(_worker_processor, *args)
+
+class CsvColumnsWriter(object):
+    """Appends the columns to a CSV file, one row per detection."""
+    header = ['frame', 'timestamp', 'id', 'corner_count', 'rx', 'ry', 'rz', 'tx', 'ty', 'tz']
+
+    def __init__(self, path):
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.header)
+
+    def write(self, columns):
+        self._writer.writerows(zip(columns['frame'].tolist(),
+                                   columns['timestamp'].tolist(),
+                                   columns['id'].tolist(),
+                                   columns['corner_count'].tolist(),
+                                   *columns['rvec'].T.tolist(),
+                                   *columns['tvec'].T.tolist()))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+def load_columns(path):
+    """Reads back a .npz or .csv output as the columns dict."""
+    if path.endswith('.npz'):
+        with np.load(path) as data:
+            return {name: data[name] for name in COLUMNS}
+    table = np.loadtxt(path, delimiter=',', skiprows=1, ndmin=2)
+    return {'frame': table[:,0].astype(np.int64),
+            'timestamp': table[:,1],
+            'id': table[:,2].astype(np.int32),
+            'corner_count': table[:,3].astype(np.int32),
+            'rvec': table[:,4:7],
+            'tvec': table[:,7:10]}
+
+def process_video(video_path, config, camera_matrix, dist_coeffs, mode='charuco', stride=1,
+                  chunk_frames=600, workers=None, output_path=None):
+    """Poses of every stride-th frame of the video, the chunks are spread over `workers` processes
+    (all the cores by default, workers=1 runs in this process).
+    output_path: optional .npz or .csv, the CSV rows are written as the chunks complete (in order).
+    Returns the columns dict and the number of processed frames.
+    """
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise IOError('Fail to open video: {}'.format(video_path))
+    frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    capture.release()
+
+    chunks = [(video_path, start, stop, stride, fps) for start, stop in plan_chunks(frame_count, chunk_frames)]
+
+    csv_writer = None
+    if output_path is not None and output_path.endswith('.csv'):
+        csv_writer = CsvColumnsWriter(output_path)
+
+    columns_list = []
+    frames_processed = 0
+    executor = None
+    try:
+        if workers == 1:
+            processor = VideoPoseProcessor(config, camera_matrix, dist_coeffs, mode)
+            results = (process_chunk(processor, *chunk) for chunk in chunks)
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers,
+                                           initializer=_init_video_worker,
+                                           initargs=(config, camera_matrix, dist_coeffs, mode))
+            results = executor.map(_process_chunk_in_worker, chunks)
+
+        for columns, frames in tqdm(results, total=len(chunks), desc=os.path.basename(video_path)):
+            columns_list.append(columns)
+            frames_processed += frames
+            if csv_writer is not None:
+                csv_writer.write(columns)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if csv_writer is not None:
+            csv_writer.close()
+
+    columns = _concatenate_columns(columns_list)
+    if output_path is not None and output_path.endswith('.npz'):
+        np.savez_compressed(output_path, **columns)
+    return columns, frames_processed
+
+@click.command()
+@click.argument('videos', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--mode', type=click.Choice(['charuco', 'markers']), default='charuco', show_default=True,
+              help='Board pose or the pose of every marker.')
+@click.option('--output-dir', default='assets/poses', show_default=True)
+@click.option('--format', 'output_format', type=click.Choice(['npz', 'csv']), default='npz', show_default=True)
+@click.option('--stride', default=1, show_default=True, type=click.IntRange(min=1), help='Process every n-th frame.')
+@click.option('--chunk-frames', default=600, show_default=True, type=click.IntRange(min=1),
+              help='Frames per chunk given to a worker.')
+@click.option('--workers', default=None, type=click.IntRange(min=1), help='Number of processes, all the cores by default.')
+@click.option('--camera-matrix', default='assets/webcam_parameters/camera_matrix.npy', show_default=True,
+              type=click.Path(exists=True, dir_okay=False))
+@click.option('--dist-coeffs', default='assets/webcam_parameters/dist_coeffs.npy', show_default=True,
+              type=click.Path(exists=True, dir_okay=False))
+@click.option('--aruco-dict', type=click.Choice(sorted(common.ARUCO_DICT)), default='DICT_4X4_50', show_default=True)
+@click.option('--squares', nargs=2, type=int, default=(6, 4), show_default=True,
+              help='SQUARES_VERTICALLY SQUARES_HORIZONTALLY of the ChArUco board.')
+@click.option('--square-length', default=30 / 1000.0, show_default=True, help='[m]')
+@click.option('--marker-length', default=15 / 1000.0, show_default=True, help='[m]')
+def main(videos, mode, output_dir, output_format, stride, chunk_frames, workers, camera_matrix, dist_coeffs,
+         aruco_dict, squares, square_length, marker_length):
+    """Extracts the ChArUco board (or markers) poses of the VIDEOS files."""
+    config = {}
+    config['ARUCO_DICT'] = common.ARUCO_DICT[aruco_dict]
+    config['SQUARES_VERTICALLY'] = squares[0]
+    config['SQUARES_HORIZONTALLY'] = squares[1]
+    config['SQUARE_LENGTH'] = square_length
+    config['MARKER_LENGTH'] = marker_length
+
+    camera_matrix = np.load(camera_matrix)
+    dist_coeffs = np.load(dist_coeffs)
+    os.makedirs(output_dir, exist_ok=True)
+
+    for video_path in videos:
+        name = os.path.splitext(os.path.basename(video_path))[0]
+        output_path = os.path.join(output_dir, '{}.{}'.format(name, output_format))
+
+        capture = cv2.VideoCapture(video_path)
+        video_fps = capture.get(cv2.CAP_PROP_FPS)
+        capture.release()
+
+        start = cv2.getTickCount()
+        columns, frames = process_video(video_path, config, camera_matrix, dist_coeffs, mode, stride,
+                                        chunk_frames, workers, output_path)
+        elapsed = (cv2.getTickCount() - start) / cv2.getTickFrequency()
+
+        # real time factor: seconds of video per second of processing
+        realtime = frames * stride / video_fps / elapsed if video_fps > 0 and elapsed > 0 else 0
+        print('[INFO] {}: {} frames, {} poses in {:.1f} s ({:.1f}x real time) -> {}'.format(
+              video_path, frames, len(columns['frame']), elapsed, realtime, output_path))
+
+if __name__ == '__main__':
+    main()
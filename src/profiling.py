@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+# Per-stage timing instrumentation.
+# Named spans around the pipeline stages (capture, undistort, detect_markers,
+# interpolate_corners, pose, draw...) feed rolling latency windows, counters track
+# frames processed/dropped and the detection hit rate.
+# Components take an optional profiler and default to NULL_PROFILER, whose span()
+# returns a shared no-op context manager, so a disabled profiler costs one method call.
+
+import csv
+import json
+import threading
+import time
+
+import numpy as np
+
+class _NullSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span(object):
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+        return False
+
+class _Window(object):
+    """Last `size` durations (ring buffer) plus the totals since the last reset."""
+    __slots__ = ('samples', 'index', 'count', 'total', 'max')
+
+    def __init__(self, size):
+        self.samples = np.zeros(size)
+        self.index = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.samples[self.index] = seconds
+        self.index = (self.index + 1) % len(self.samples)
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def recent(self):
+        return self.samples[:min(self.count, len(self.samples))]
+
+class Profiler(object):
+    """Sample:
+        profiler = Profiler()
+        with profiler.span('detect_markers'):
+            ...
+        profiler.count('frames')
+        profiler.tick()  # once per frame, pushes the summary to the callback
+        profiler.dump_json('profile.json')
+
+    window: number of recent samples per span used for the percentiles
+    callback: called with summary() at most every callback_interval seconds from tick()
+    """
+    def __init__(self, enabled=True, window=1024, callback=None, callback_interval=1.0):
+        self.enabled = enabled
+        self.window = window
+        self.callback = callback
+        self.callback_interval = callback_interval
+        self._lock = threading.Lock()
+        self._spans = {}
+        self._counters = {}
+        self._last_callback = time.monotonic()
+
+    def span(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            window = self._spans.get(name)
+            if window is None:
+                window = _Window(self.window)
+                self._spans[name] = window
+            window.add(seconds)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def set_counter(self, name, value):
+        """For counters kept elsewhere, e.g. FrameGrabber.frames_dropped."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = value
+
+    def tick(self):
+        """Counts a processed frame and pushes the summary to the callback when it is due."""
+        if not self.enabled:
+            return
+        self.count('frames')
+        if self.callback is not None:
+            now = time.monotonic()
+            if now - self._last_callback >= self.callback_interval:
+                self._last_callback = now
+                self.callback(self.summary())
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+
+    def summary(self):
+        """{'spans': {name: {count, total_ms, mean_ms, p50_ms, p90_ms, p99_ms, max_ms}},
+            'counters': {name: value}, 'detection_hit_rate': hits / attempts or None}
+        The percentiles are over the last `window` samples, the rest since the last reset.
+        """
+        with self._lock:
+            spans = {}
+            for name, window in self._spans.items():
+                recent = 1000.0 * window.recent()
+                p50, p90, p99 = np.percentile(recent, (50, 90, 99)) if len(recent) else (0.0, 0.0, 0.0)
+                spans[name] = {'count': window.count,
+                               'total_ms': 1000.0 * window.total,
+                               'mean_ms': 1000.0 * window.total / window.count,
+                               'p50_ms': float(p50),
+                               'p90_ms': float(p90),
+                               'p99_ms': float(p99),
+                               'max_ms': 1000.0 * window.max}
+            counters = dict(self._counters)
+
+        attempts = counters.get('detection_attempts', 0)
+        hit_rate = counters.get('detection_hits', 0) / float(attempts) if attempts else None
+        return {'spans': spans, 'counters': counters, 'detection_hit_rate': hit_rate}
+
+    def dump_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def dump_csv(self, path):
+        """One row per span, the counters follow as rows with only name and count."""
+        summary = self.summary()
+        fields = ['name', 'count', 'total_ms', 'mean_ms', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms']
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for name, stats in sorted(summary['spans'].items()):
+                writer.writerow(dict(stats, name=name))
+            for name, value in sorted(summary['counters'].items()):
+                writer.writerow({'name': name, 'count': value})
+
+    def format(self):
+        """Short human readable table of the spans."""
+        return format_summary(self.summary())
+
+def format_summary(summary):
+    """Short human readable table of the spans of a Profiler.summary()."""
+    lines = ['{:<24} {:>8} {:>9} {:>9} {:>9}'.format('span', 'count', 'mean ms', 'p50 ms', 'p99 ms')]
+    for name, stats in sorted(summary['spans'].items()):
+        lines.append('{:<24} {:>8} {:>9.2f} {:>9.2f} {:>9.2f}'.format(name, stats['count'], stats['mean_ms'],
+                                                                     stats['p50_ms'], stats['p99_ms']))
+    return '\n'.join(lines)
+
+def print_summary(summary):
+    """Profiler callback printing the span table, e.g. Profiler(callback=print_summary, callback_interval=5.0)."""
+    print(format_summary(summary))
+
+# shared disabled profiler, the default of every instrumented component
+NULL_PROFILER = Profiler(enabled=False)
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+# Rendering stage, kept apart from the detection and pose computation.
+# All the markers of a frame are drawn with a few batched cv2.polylines/fillPoly calls
+# (one per color) instead of per-marker and per-corner Python loops: a closed polyline
+# of a single point is drawn as a dot of the line thickness.
+# Display renders and shows only the frames it actually displays, at a throttled rate
+# on the main thread while the processing loop runs on a worker, so the loop never draws
+# nor waits on imshow/waitKey.
+
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from marker_pose import project_points_batch
+
+def _int_points(points):
+    return np.round(np.asarray(points, dtype=np.float64)).astype(np.int32)
+
+def _polylines(image, polygons, closed, color, thickness):
+    """polygons (N,K,2), cv2.polylines needs each polygon contiguous."""
+    cv2.polylines(image, list(np.ascontiguousarray(polygons)), closed, color, thickness)
+
+def draw_dots(image, points, color=(0,255,255), size=4):
+    """One dot per point, points (N,2)."""
+    points = _int_points(points).reshape(-1,1,2)
+    if len(points):
+        _polylines(image, points, True, color, size)
+    return image
+
+def draw_markers(image, marker_corners, marker_ids=None, color=(0,255,0), corner_color=(0,255,255), thickness=2):
+    """Outlines and corners of all the markers, marker_corners (N,4,2) or the tuple of (1,4,2)
+    arrays of detectMarkers. The ids are written at the first corner.
+    """
+    if len(marker_corners) == 0:
+        return image
+    quads = _int_points(np.concatenate([np.reshape(c, (-1,4,2)) for c in marker_corners]))
+    _polylines(image, quads, True, color, thickness)
+    draw_dots(image, quads.reshape(-1,2), corner_color, 2*thickness)
+    if marker_ids is not None:
+        for (x, y), marker_id in zip(quads[:,0].tolist(), np.asarray(marker_ids).ravel().tolist()):
+            cv2.putText(image, str(marker_id), (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+    return image
+
+def draw_axes(image, camera_matrix, dist_coeffs, rvecs, tvecs, length, thickness=2):
+    """Frame axes of the N poses with one projection and one polylines call per axis
+    (X red, Y green, Z blue, as cv2.drawFrameAxes).
+    """
+    if len(rvecs) == 0:
+        return image
+    axis = np.float64([[0, 0, 0], [length, 0, 0], [0, length, 0], [0, 0, length]])
+    imgpts = _int_points(project_points_batch(axis, rvecs, tvecs, camera_matrix, dist_coeffs))
+    for i, color in ((1, (0,0,255)), (2, (0,255,0)), (3, (255,0,0))):
+        _polylines(image, imgpts[:,[0, i]], False, color, thickness)
+    return image
+
+def draw_boxes(image, imgpts):
+    """Boxes of the N markers from their projected (N,8,2) box points (see CharucoDetector.axis_boxes)."""
+    if len(imgpts) == 0:
+        return image
+    imgpts = _int_points(imgpts)
+    # ground floor in green
+    cv2.fillPoly(image, list(np.ascontiguousarray(imgpts[:,:4])), (0,255,0))
+    # pillars in blue
+    pillars = np.stack([imgpts[:,:4], imgpts[:,4:]], axis=2).reshape(-1,2,2)
+    _polylines(image, pillars, False, (255,0,0), 2)
+    # top layer in red
+    _polylines(image, imgpts[:,4:], True, (0,0,255), 2)
+    return image
+
+def draw_charuco_corners(image, charuco_corners, charuco_ids=None, color=(0,255,0)):
+    if charuco_corners is None or len(charuco_corners) == 0:
+        return image
+    points = _int_points(charuco_corners).reshape(-1,2)
+    draw_dots(image, points, color, 10)
+    if charuco_ids is not None:
+        for (x, y), corner_id in zip(points.tolist(), np.asarray(charuco_ids).ravel().tolist()):
+            cv2.putText(image, str(corner_id), (x - 10, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+    return image
+
+class Display(object):
+    """Shows frames at most max_fps times per second while the processing loop runs on a worker thread.
+
+    HighGUI (imshow/waitKey) is only supported on the main thread on macOS and with some
+    Qt builds, so run() keeps the display on the calling thread, which must be the main one,
+    and moves the loop to a worker.
+    submit() only keeps the latest frame with its render function, the frames replaced
+    before being displayed are never drawn.
+
+    Sample:
+        display = Display('video', max_fps=15)
+        def loop():
+            while not display.stopped:
+                ...
+                display.submit(frame, draw_markers, marker_corners, marker_ids)
+        display.run(loop)  # returns what loop returns
+
+    stopped becomes True when one of quit_keys is pressed in the window.
+    """
+    def __init__(self, window_name, max_fps=15, quit_keys=(27, ord('q'))):
+        self.window_name = window_name
+        self.min_interval = 1.0 / max_fps
+        self.quit_keys = quit_keys
+        self.stopped = False
+        self.frames_shown = 0
+        self.frames_skipped = 0
+        self.last_key = -1
+
+        self._pending = None
+        self._condition = threading.Condition()
+
+    def submit(self, image, render=None, *args):
+        """render(image, *args) runs on the display thread, right before showing the image.
+        The image must not be modified by the caller afterwards.
+        """
+        with self._condition:
+            if self._pending is not None:
+                self.frames_skipped += 1
+            self._pending = (image, render, args)
+            self._condition.notify()
+
+    def run(self, loop, *args):
+        """Runs loop(*args) on a worker thread and displays the submitted frames on this thread
+        until the loop returns. Exceptions of the loop are raised here.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            raise RuntimeError('Display.run must be called from the main thread (HighGUI)')
+
+        result = {}
+        def worker():
+            try:
+                result['value'] = loop(*args)
+            except BaseException as e:
+                result['error'] = e
+            finally:
+                with self._condition:
+                    self._condition.notify()
+
+        thread = threading.Thread(target=worker, name='processing')
+        thread.start()
+        try:
+            self._display_loop(thread)
+        finally:
+            # a quit key or an error here: ask the loop to end
+            self.stopped = True
+            thread.join()
+            if self.frames_shown:
+                cv2.destroyWindow(self.window_name)
+
+        if 'error' in result:
+            raise result['error']
+        return result.get('value')
+
+    def _display_loop(self, thread):
+        last_shown = float('-inf')
+        while thread.is_alive():
+            with self._condition:
+                if self._pending is None:
+                    self._condition.wait(0.05)
+                delay = last_shown + self.min_interval - time.monotonic()
+                item = None
+                if self._pending is not None and delay <= 0:
+                    item, self._pending = self._pending, None
+
+            if item is None:
+                # nothing new, or throttled while newer frames keep replacing the pending one,
+                # the window stays responsive meanwhile
+                if self.frames_shown:
+                    self._poll_key(cv2.waitKey(1))
+                if delay > 0:
+                    time.sleep(min(delay, 0.05))
+                continue
+
+            image, render, args = item
+            if render is not None:
+                image = render(image, *args)
+            cv2.imshow(self.window_name, image)
+            self._poll_key(cv2.waitKey(1))
+            self.frames_shown += 1
+            last_shown = time.monotonic()
+
+    def _poll_key(self, key):
+        key &= 0xFF
+        if key != 0xFF:
+            self.last_key = key
+            if key in self.quit_keys:
+                self.stopped = True
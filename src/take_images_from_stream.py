@@ -11,9 +11,11 @@ from uuid import uuid4
 import click
 import cv2
 
+from video_stream import FrameGrabber
+
 def main():
     save_dir = 'assets/frames'
-    video = cv2.VideoCapture('/dev/video0')
+    video = FrameGrabber('/dev/video0')
 
     os.makedirs(save_dir, exist_ok=True)
 
@@ -35,5 +37,7 @@ def main():
             print('Saving {} at {}'.format(filename, save_dir))
             cv2.imwrite(filename, frame)
 
+    video.release()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
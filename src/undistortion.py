@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+# cv2.undistort recomputes the full undistortion map on every call.
+# Here the maps are computed once per (camera_matrix, dist_coeffs, image size, alpha)
+# in fixed-point (CV_16SC2) form and every following frame only pays for a remap.
+
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+class UndistortionCache(object):
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._maps = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, camera_matrix, dist_coeffs, image_size, alpha):
+        return (np.ascontiguousarray(camera_matrix, dtype=np.float64).tobytes(),
+                np.ascontiguousarray(dist_coeffs, dtype=np.float64).tobytes(),
+                tuple(image_size),
+                alpha)
+
+    def get_maps(self, camera_matrix, dist_coeffs, image_size, alpha=None):
+        """Returns (map1, map2, new_camera_matrix) for image_size = (w, h).
+
+        With alpha=None the new camera matrix is the input camera matrix, which
+        matches cv2.undistort. Otherwise cv2.getOptimalNewCameraMatrix is used.
+        """
+        key = self._key(camera_matrix, dist_coeffs, image_size, alpha)
+        with self._lock:
+            entry = self._maps.get(key)
+            if entry is not None:
+                self._maps.move_to_end(key)
+                return entry
+
+        camera_matrix = np.asarray(camera_matrix, dtype=np.float64).reshape(3,3)
+        dist_coeffs   = np.asarray(dist_coeffs, dtype=np.float64).reshape(1,-1)
+        if alpha is None:
+            new_camera_matrix = camera_matrix
+        else:
+            new_camera_matrix, _ = cv2.getOptimalNewCameraMatrix(camera_matrix,
+                                                                 dist_coeffs,
+                                                                 tuple(image_size),
+                                                                 alpha)
+        map1, map2 = cv2.initUndistortRectifyMap(camera_matrix,
+                                                 dist_coeffs,
+                                                 None,
+                                                 new_camera_matrix,
+                                                 tuple(image_size),
+                                                 cv2.CV_16SC2)
+        entry = (map1, map2, new_camera_matrix)
+
+        with self._lock:
+            self._maps[key] = entry
+            self._maps.move_to_end(key)
+            while len(self._maps) > self.max_entries:
+                self._maps.popitem(last=False)
+        return entry
+
+    def undistort(self, image, camera_matrix, dist_coeffs, alpha=None, dst=None):
+        h, w = image.shape[:2]
+        map1, map2, _ = self.get_maps(camera_matrix, dist_coeffs, (w, h), alpha)
+        return cv2.remap(image, map1, map2, cv2.INTER_LINEAR, dst=dst)
+
+    def clear(self):
+        with self._lock:
+            self._maps.clear()
+
+# shared by every module undistorting full frames
+default_cache = UndistortionCache()
+
+def undistort(image, camera_matrix, dist_coeffs, alpha=None):
+    """Drop-in replacement of cv2.undistort backed by the shared map cache."""
+    return default_cache.undistort(image, camera_matrix, dist_coeffs, alpha)
+
+def undistort_points(points, camera_matrix, dist_coeffs):
+    """Maps points detected on the raw frame to the pixels of the undistorted image
+    (same camera matrix, as undistort with alpha=None), keeps the shape of points.
+    """
+    undistorted = cv2.undistortPoints(np.asarray(points, dtype=np.float32).reshape(-1,1,2),
+                                      camera_matrix,
+                                      dist_coeffs,
+                                      P=camera_matrix)
+    return undistorted.reshape(np.shape(points))
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+# cv2.VideoCapture read on a dedicated thread.
+# The frames go to a small bounded buffer: when the processing is slower than the
+# camera the oldest frames are dropped, so the processing always sees the freshest frame
+# and the camera driver is never backed up by a slow iteration.
+
+import time
+import threading
+from collections import deque
+
+import cv2
+
+class FrameGrabber(object):
+    """Sample:
+        video = FrameGrabber(0)
+        while True:
+            ret, frame = video.read()
+            if ret == False: break
+            ...
+        video.release()
+    """
+    def __init__(self, video_stream, buffer_size=2, latest_only=True):
+        """latest_only=True: read() returns the newest frame and discards the older ones.
+        latest_only=False: read() returns the frames in order, the buffer still drops the
+        oldest frames when it is full.
+        """
+        self.video_stream = video_stream
+        self.latest_only = latest_only
+        self.capture = cv2.VideoCapture(video_stream)
+
+        self._buffer = deque(maxlen=buffer_size)
+        self._condition = threading.Condition()
+        self._running = self.capture.isOpened()
+
+        # counters
+        self.frames_grabbed = 0
+        self.frames_dropped = 0
+        self.frames_read = 0
+
+        # timestamp (time.monotonic) of the last frame returned by read()
+        self.timestamp = None
+        self.frame_index = None
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while self._running:
+            ret, frame = self.capture.read()
+            timestamp = time.monotonic()
+            with self._condition:
+                if not ret:
+                    self._running = False
+                    self._condition.notify_all()
+                    break
+                if len(self._buffer) == self._buffer.maxlen:
+                    self.frames_dropped += 1
+                self._buffer.append((self.frames_grabbed, timestamp, frame))
+                self.frames_grabbed += 1
+                self._condition.notify_all()
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    @property
+    def finished(self):
+        """True once the stream ended and every buffered frame was read."""
+        with self._condition:
+            return not self._running and not self._buffer
+
+    def read_with_timestamp(self, timeout=None):
+        """Returns (ret, frame, timestamp, frame_index), blocks until a new frame is available.
+        ret is False at the end of the stream or after timeout seconds (timeout=0 polls).
+        """
+        with self._condition:
+            while not self._buffer:
+                if not self._running:
+                    return False, None, None, None
+                if not self._condition.wait(timeout):
+                    return False, None, None, None
+
+            if self.latest_only:
+                self.frames_dropped += len(self._buffer) - 1
+                frame_index, timestamp, frame = self._buffer.pop()
+                self._buffer.clear()
+            else:
+                frame_index, timestamp, frame = self._buffer.popleft()
+
+        self.frames_read += 1
+        self.timestamp = timestamp
+        self.frame_index = frame_index
+        return True, frame, timestamp, frame_index
+
+    def read(self):
+        """Same interface as cv2.VideoCapture.read."""
+        ret, frame, _, _ = self.read_with_timestamp()
+        return ret, frame
+
+    def get(self, prop_id):
+        return self.capture.get(prop_id)
+
+    def set(self, prop_id, value):
+        return self.capture.set(prop_id, value)
+
+    def release(self):
+        self._running = False
+        self._thread.join()
+        self.capture.release()
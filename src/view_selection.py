@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+# Calibration view selection.
+# A view is only worth keeping if it puts charuco corners on parts of the image
+# that are not covered yet (distortion is estimated from where the corners land)
+# or if it shows the board under a new orientation (focal length and principal point
+# are only observable with tilted views).
+
+import numpy as np
+import cv2
+
+class CoverageViewSelector(object):
+    """Sample:
+        selector = CoverageViewSelector(board, (w, h))
+        if selector.accept(charuco_corners, charuco_ids):
+            keep the view
+        if selector.done:
+            stop capturing
+    """
+    def __init__(self,
+                 board,
+                 image_size,
+                 grid_size=(8, 6),
+                 min_new_cells=2,
+                 coverage_target=0.8,
+                 tilt_bin_deg=15,
+                 pose_target=6,
+                 min_corners=6):
+        self.board = board
+        self.image_size = image_size
+        self.grid_size = grid_size
+        self.min_new_cells = min_new_cells
+        self.coverage_target = coverage_target
+        self.tilt_bin_deg = tilt_bin_deg
+        self.pose_target = pose_target
+        self.min_corners = min_corners
+
+        # grid histogram of the accepted charuco corner locations
+        self.histogram = np.zeros((grid_size[1], grid_size[0]), dtype=np.int32)
+        self.pose_bins = set()
+        self.views = 0
+
+        # The intrinsics are unknown while calibrating, a nominal pinhole camera
+        # is enough to tell the board orientations apart
+        w, h = image_size
+        f = float(max(w, h))
+        self._nominal_camera_matrix = np.array([[f, 0, w/2.0],
+                                                [0, f, h/2.0],
+                                                [0, 0, 1]], dtype=np.float64)
+        self._board_points = board.getChessboardCorners()
+
+    @property
+    def coverage(self):
+        """Fraction of the grid cells holding at least one accepted corner."""
+        return np.count_nonzero(self.histogram) / float(self.histogram.size)
+
+    @property
+    def done(self):
+        return self.coverage >= self.coverage_target and len(self.pose_bins) >= self.pose_target
+
+    def _cells(self, charuco_corners):
+        w, h = self.image_size
+        points = np.asarray(charuco_corners, dtype=np.float32).reshape(-1,2)
+        cx = np.clip((points[:,0] * self.grid_size[0] / w).astype(np.int32), 0, self.grid_size[0]-1)
+        cy = np.clip((points[:,1] * self.grid_size[1] / h).astype(np.int32), 0, self.grid_size[1]-1)
+        return cy, cx
+
+    def _pose_bin(self, charuco_corners, charuco_ids):
+        object_points = self._board_points[np.asarray(charuco_ids).flatten()]
+        image_points = np.asarray(charuco_corners, dtype=np.float64).reshape(-1,2)
+        try:
+            retval, rvec, _ = cv2.solvePnP(object_points,
+                                           image_points,
+                                           self._nominal_camera_matrix,
+                                           None,
+                                           flags=cv2.SOLVEPNP_IPPE)
+        except cv2.error:
+            # e.g. all the visible corners on a single line
+            return None
+        if not retval:
+            return None
+        R, _ = cv2.Rodrigues(rvec)
+        normal = R[:,2]
+        tilt_x = np.degrees(np.arctan2(normal[1], abs(normal[2])))
+        tilt_y = np.degrees(np.arctan2(normal[0], abs(normal[2])))
+        return (int(np.floor(tilt_x / self.tilt_bin_deg)),
+                int(np.floor(tilt_y / self.tilt_bin_deg)))
+
+    def accept(self, charuco_corners, charuco_ids):
+        """Returns True and records the view if it adds image coverage, or a new board orientation
+        while less than pose_target orientations are covered.
+        """
+        if charuco_ids is None or len(charuco_ids) < self.min_corners:
+            return False
+
+        cy, cx = self._cells(charuco_corners)
+        cells = np.unique(cy*self.grid_size[0] + cx)
+        new_cells = np.count_nonzero(self.histogram.flat[cells] == 0)
+        pose_bin = self._pose_bin(charuco_corners, charuco_ids)
+        # once pose_target orientations are covered, a new one alone is not worth a view
+        new_pose = (pose_bin is not None and pose_bin not in self.pose_bins and
+                    len(self.pose_bins) < self.pose_target)
+
+        if new_cells < self.min_new_cells and not new_pose:
+            return False
+
+        np.add.at(self.histogram, (cy, cx), 1)
+        if pose_bin is not None:
+            self.pose_bins.add(pose_bin)
+        self.views += 1
+        return True
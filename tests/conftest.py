@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+
+# The modules of src/ are flat and import each other by name, as when run from src/.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
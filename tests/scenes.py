@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+# Synthetic frames of a ChArUco board for the tests: the board image is warped with the
+# homography of a pinhole camera (no distortion) on a white background.
+
+import cv2
+import numpy as np
+
+CONFIG = {'ARUCO_DICT': cv2.aruco.DICT_4X4_50,
+          'SQUARES_VERTICALLY': 6,
+          'SQUARES_HORIZONTALLY': 4,
+          'SQUARE_LENGTH': 0.03,
+          'MARKER_LENGTH': 0.015}
+K = np.float64([[800, 0, 640], [0, 800, 360], [0, 0, 1]])
+IMAGE_SIZE = (1280, 720)
+BOARD_PX = (600, 400)
+
+def board_image(config=CONFIG):
+    dictionary = cv2.aruco.getPredefinedDictionary(config['ARUCO_DICT'])
+    board = cv2.aruco.CharucoBoard((config['SQUARES_VERTICALLY'], config['SQUARES_HORIZONTALLY']),
+                                   config['SQUARE_LENGTH'], config['MARKER_LENGTH'], dictionary)
+    return board.generateImage(BOARD_PX, marginSize=0)
+
+def board_frame(rvec=(0.2, 0.1, 0.0), tvec=(0.0, 0.0, 0.5), image_size=IMAGE_SIZE, config=CONFIG, camera_matrix=K):
+    """BGR frame of the board, tvec is the position of the board center."""
+    width = config['SQUARES_VERTICALLY'] * config['SQUARE_LENGTH']
+    height = config['SQUARES_HORIZONTALLY'] * config['SQUARE_LENGTH']
+    object_points = np.float64([[0, 0, 0], [width, 0, 0], [width, height, 0], [0, height, 0]])
+    rvec = np.float64(rvec)
+    tvec = np.float64(tvec) - cv2.Rodrigues(rvec)[0] @ np.float64([width / 2, height / 2, 0])
+    image_points, _ = cv2.projectPoints(object_points, rvec, tvec, camera_matrix, None)
+
+    w, h = BOARD_PX
+    H = cv2.getPerspectiveTransform(np.float32([[0, 0], [w, 0], [w, h], [0, h]]),
+                                    image_points.reshape(4,2).astype(np.float32))
+    frame = cv2.warpPerspective(board_image(config), H, tuple(image_size), borderValue=255)
+    return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+import cv2
+import numpy as np
+
+from camera_calibration import IncrementalCalibrator, calibrate_from_detections
+
+K = np.float64([[800, 0, 640], [0, 800, 360], [0, 0, 1]])
+D = np.float64([0.05, -0.02, 0, 0, 0])
+IMAGE_SIZE = (1280, 720)
+
+def _board():
+    dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_50)
+    return cv2.aruco.CharucoBoard((6, 4), 0.03, 0.015, dictionary)
+
+def _views(board, count, seed=0):
+    """Projected charuco corners (C,1,2) and ids (C,1) of the board under random poses."""
+    rng = np.random.default_rng(seed)
+    object_points = board.getChessboardCorners()
+    center = object_points.mean(axis=0)
+    views = []
+    for _ in range(count):
+        rvec = rng.uniform(-0.5, 0.5, 3)
+        tvec = np.float64([rng.uniform(-0.1, 0.1), rng.uniform(-0.05, 0.05), rng.uniform(0.35, 0.6)])
+        # board centered on the optical axis before the translation
+        tvec -= cv2.Rodrigues(rvec)[0] @ center
+        image_points, _ = cv2.projectPoints(object_points, rvec, tvec, K, D)
+        image_points += rng.normal(0, 0.1, image_points.shape)
+        views.append((image_points.astype(np.float32), np.arange(len(object_points), dtype=np.int32).reshape(-1,1)))
+    return views
+
+def test_waits_for_min_views_then_refines_every_n():
+    board = _board()
+    calibrator = IncrementalCalibrator(board, IMAGE_SIZE, min_views=4, refine_every=3)
+    refined = [calibrator.add_view(*view) for view in _views(board, 10)]
+    assert refined == [False, False, False, True, False, False, True, False, False, True]
+
+def test_incremental_matches_the_batch_solve():
+    board = _board()
+    views = _views(board, 15)
+    calibrator = IncrementalCalibrator(board, IMAGE_SIZE, refine_every=4)
+    for view in views:
+        calibrator.add_view(*view)
+    camera_matrix, dist_coeffs = calibrator.finish()
+
+    _, batch_camera_matrix, _, _, _ = calibrate_from_detections(board,
+                                                                [corners for corners, _ in views],
+                                                                [ids for _, ids in views],
+                                                                IMAGE_SIZE)
+    np.testing.assert_allclose(camera_matrix, batch_camera_matrix, rtol=1e-3)
+    np.testing.assert_allclose(camera_matrix, K, rtol=0.01, atol=2)
+    assert calibrator.retval < 0.5
+
+def test_finish_solves_the_views_left():
+    board = _board()
+    views = _views(board, 7)
+    calibrator = IncrementalCalibrator(board, IMAGE_SIZE, min_views=5, refine_every=10)
+    for view in views:
+        calibrator.add_view(*view)
+    first_solution = calibrator.camera_matrix.copy()
+    camera_matrix, _ = calibrator.finish()
+    assert not np.array_equal(camera_matrix, first_solution)
+    # nothing left, the solution is kept
+    assert calibrator.finish()[0] is camera_matrix
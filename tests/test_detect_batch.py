@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from aruco_detectors import ArucoDetector
+from scenes import CONFIG, IMAGE_SIZE, board_frame
+
+def _frames():
+    blank = np.full((IMAGE_SIZE[1], IMAGE_SIZE[0], 3), 255, dtype=np.uint8)
+    frames = [board_frame(rvec=(0.1 * i, 0.2, 0.0), tvec=(0.02 * i, 0.0, 0.5)) for i in range(6)]
+    # frames without markers keep their index
+    frames.insert(2, blank)
+    frames.append(blank)
+    return frames
+
+def _check_batch(detector, frames, corners, ids, frame_idx):
+    assert corners.dtype == np.float32 and ids.dtype == np.int32 and frame_idx.dtype == np.int32
+    assert len(corners) == len(ids) == len(frame_idx)
+    for i, frame in enumerate(frames):
+        expected_corners, expected_ids = detector.detect(frame)
+        np.testing.assert_array_equal(ids[frame_idx == i], expected_ids)
+        np.testing.assert_array_equal(corners[frame_idx == i], expected_corners)
+
+def test_detect_batch_matches_detect():
+    detector = ArucoDetector(CONFIG)
+    frames = _frames()
+    for workers in (1, 4):
+        corners, ids, frame_idx = detector.detect_batch(frames, workers=workers)
+        _check_batch(detector, frames, corners, ids, frame_idx)
+    assert set(frame_idx.tolist()) == {0, 1, 3, 4, 5, 6}
+
+def test_detect_batch_of_a_generator():
+    detector = ArucoDetector(CONFIG)
+    frames = _frames()
+    corners, ids, frame_idx = detector.detect_batch((frame for frame in frames), workers=2)
+    _check_batch(detector, frames, corners, ids, frame_idx)
+
+def test_detect_batch_with_restricted_ids():
+    detector = ArucoDetector(dict(CONFIG, MARKER_IDS=[1, 4, 7]))
+    frames = _frames()
+    corners, ids, frame_idx = detector.detect_batch(frames, workers=3)
+    _check_batch(detector, frames, corners, ids, frame_idx)
+    assert set(ids.tolist()) == {1, 4, 7}
+
+def test_detect_batch_without_markers():
+    detector = ArucoDetector(CONFIG)
+    corners, ids, frame_idx = detector.detect_batch([], workers=2)
+    assert corners.shape == (0, 4, 2) and ids.shape == (0,) and frame_idx.shape == (0,)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import cv2
+import numpy as np
+
+from aruco_detectors import CharucoDetector
+from camera_calibration import detect_charuco_corners
+from detection_cache import DetectionCache, board_config_hash
+from profiling import Profiler
+from scenes import CONFIG, board_frame
+
+def _images(tmp_path, count=3):
+    paths = []
+    for i in range(count):
+        path = str(tmp_path / 'view_{}.png'.format(i))
+        cv2.imwrite(path, board_frame(rvec=(0.1 * i, 0.2, 0.0), tvec=(0.01 * i, 0.0, 0.5)))
+        paths.append(path)
+    return paths
+
+def _counters(profiler):
+    return profiler.summary()['counters']
+
+def test_second_run_is_served_from_the_cache(tmp_path):
+    paths = _images(tmp_path)
+    profiler = Profiler()
+    detector = CharucoDetector(CONFIG, profiler=profiler)
+    cache = DetectionCache(str(tmp_path / 'cache'), CONFIG, detector.params)
+
+    detections, image_size = detect_charuco_corners(detector, paths, cache)
+    assert _counters(profiler).get('cache_hits', 0) == 0
+    cached, cached_size = detect_charuco_corners(detector, paths, cache)
+    assert _counters(profiler)['cache_hits'] == len(paths)
+
+    assert image_size == cached_size == (1280, 720)
+    assert len(detections.charuco_lists()[1]) == len(paths)
+    np.testing.assert_array_equal(cached.charuco_corners, detections.charuco_corners)
+    np.testing.assert_array_equal(cached.charuco_ids, detections.charuco_ids)
+    np.testing.assert_array_equal(cached.marker_ids, detections.marker_ids)
+    np.testing.assert_array_equal(cached.charuco_offsets, detections.charuco_offsets)
+
+def test_key_changes_with_the_content_board_and_params(tmp_path):
+    path = _images(tmp_path, 1)[0]
+    params = cv2.aruco.DetectorParameters()
+    cache = DetectionCache(str(tmp_path / 'cache'), CONFIG, params)
+    _, key = cache.read(path)
+    assert cache.read(path)[1] == key
+
+    other_board = DetectionCache(str(tmp_path / 'cache'), dict(CONFIG, SQUARE_LENGTH=0.04), params)
+    assert other_board.read(path)[1] != key
+    other_params = cv2.aruco.DetectorParameters()
+    other_params.minMarkerPerimeterRate = 0.1
+    assert DetectionCache(str(tmp_path / 'cache'), CONFIG, other_params).read(path)[1] != key
+
+    cv2.imwrite(path, board_frame(rvec=(0.3, 0.2, 0.0)))
+    assert cache.read(path)[1] != key
+
+def test_key_changes_with_the_detection_mode():
+    params = cv2.aruco.DetectorParameters()
+    key = board_config_hash(CONFIG, params)
+    assert board_config_hash(dict(CONFIG), params) == key
+    for mode in ({'PYRAMID_SCALE': 0.5},
+                 {'EXPECTED_MARKER_PX': 120},
+                 {'ROI_TRACKING': True},
+                 {'RESTRICT_DICTIONARY': True}):
+        assert board_config_hash(dict(CONFIG, **mode), params) != key
+
+def test_missing_or_corrupt_entries_are_misses(tmp_path):
+    cache = DetectionCache(str(tmp_path / 'cache'), CONFIG, cv2.aruco.DetectorParameters())
+    assert cache.get('0' * 40) is None
+    with open(os.path.join(cache.cache_dir, '{}.npz'.format('1' * 40)), 'wb') as f:
+        f.write(b'not an npz')
+    assert cache.get('1' * 40) is None
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    paths = _images(tmp_path, 3)
+    detector = CharucoDetector(CONFIG)
+    cache = DetectionCache(str(tmp_path / 'cache'), CONFIG, detector.params, max_bytes=1)
+    detect_charuco_corners(detector, paths, cache)
+    # every put evicts down to max_bytes, at most the last entry is left
+    entries = [name for name in os.listdir(cache.cache_dir) if name.endswith('.npz')]
+    assert len(entries) <= 1
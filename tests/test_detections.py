@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from detections import Detections, DetectionsRecorder
+
+def _frame(rng, markers, charuco):
+    marker_corners = tuple(rng.random((1,4,2), dtype=np.float32) * 100 for _ in range(markers))
+    marker_ids = rng.integers(0, 50, (markers, 1)).astype(np.int32) if markers else None
+    charuco_corners = rng.random((charuco,1,2), dtype=np.float32) * 100 if charuco else None
+    charuco_ids = np.arange(charuco, dtype=np.int32).reshape(-1,1) if charuco else None
+    return marker_corners, marker_ids, charuco_corners, charuco_ids
+
+def _recorded(counts, capacity=2):
+    rng = np.random.default_rng(0)
+    frames = [_frame(rng, markers, charuco) for markers, charuco in counts]
+    # small capacity: the arrays grow a few times
+    recorder = DetectionsRecorder(capacity)
+    for frame in frames:
+        recorder.append(*frame)
+    return frames, recorder.build()
+
+def _assert_frames(detections, frames):
+    assert len(detections) == len(frames)
+    for i, (marker_corners, marker_ids, charuco_corners, charuco_ids) in enumerate(frames):
+        corners, ids = detections.markers(i)
+        assert corners.shape == (len(marker_corners), 4, 2)
+        if len(marker_corners):
+            np.testing.assert_array_equal(corners, np.concatenate(marker_corners).reshape(-1,4,2))
+            np.testing.assert_array_equal(ids, marker_ids.ravel())
+        corners, ids = detections.charuco(i)
+        assert corners.shape[1:] == (1, 2) and ids.shape[1:] == (1,)
+        if charuco_ids is None:
+            assert len(ids) == 0
+        else:
+            np.testing.assert_array_equal(corners, charuco_corners)
+            np.testing.assert_array_equal(ids, charuco_ids)
+
+COUNTS = [(3, 6), (0, 0), (1, 0), (0, 0), (5, 12), (0, 0)]
+
+def test_recorder_keeps_the_frames():
+    frames, detections = _recorded(COUNTS)
+    _assert_frames(detections, frames)
+
+def test_save_load_round_trip(tmp_path):
+    frames, detections = _recorded(COUNTS)
+    path = str(tmp_path / 'session.det')
+    detections.save(path)
+    loaded = Detections.load(path)
+    _assert_frames(loaded, frames)
+    np.testing.assert_array_equal(loaded.marker_offsets, detections.marker_offsets)
+    np.testing.assert_array_equal(loaded.charuco_offsets, detections.charuco_offsets)
+
+def test_round_trip_of_empty_frames_only(tmp_path):
+    frames, detections = _recorded([(0, 0)] * 4)
+    path = str(tmp_path / 'empty.det')
+    detections.save(path)
+    loaded = Detections.load(path)
+    _assert_frames(loaded, frames)
+    assert loaded.charuco_lists() == ([], [])
+
+def test_buffer_round_trip_is_zero_copy():
+    frames, detections = _recorded(COUNTS)
+    buffer = bytearray(detections.tobytes())
+    loaded = Detections.from_buffer(buffer)
+    _assert_frames(loaded, frames)
+    assert np.shares_memory(loaded.marker_corners, np.frombuffer(buffer, dtype=np.uint8))
+
+def test_not_a_detections_buffer():
+    with pytest.raises(ValueError):
+        Detections.from_buffer(bytearray(64))
+
+def test_charuco_lists_skip_frames_without_corners():
+    frames, detections = _recorded(COUNTS)
+    all_charuco_corners, all_charuco_ids = detections.charuco_lists()
+    assert [len(ids) for ids in all_charuco_ids] == [6, 12]
+    assert [len(ids) for ids in detections.charuco_lists(min_corners=10)[1]] == [12]
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from aruco_detectors import ArucoDetector, load_detector_profile
+from detector_tuning import DetectorTuner
+
+def _synthetic_frames(count=4, seed=0):
+    """Frames of 6 markers of DICT_4X4_50 on a noisy background, slightly warped."""
+    rng = np.random.default_rng(seed)
+    dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_50)
+    frames = []
+    for _ in range(count):
+        sheet = np.full((480, 640), 255, dtype=np.uint8)
+        for i, marker_id in enumerate(rng.choice(50, 6, replace=False)):
+            x, y = 40 + 200 * (i % 3), 60 + 220 * (i // 3)
+            sheet[y:y+120, x:x+120] = cv2.aruco.generateImageMarker(dictionary, int(marker_id), 120)
+        src = np.float32([[0, 0], [640, 0], [640, 480], [0, 480]])
+        H = cv2.getPerspectiveTransform(src, src + rng.uniform(-20, 20, (4,2)).astype(np.float32))
+        frame = cv2.warpPerspective(sheet, H, (640, 480), borderValue=255)
+        frame = np.clip(frame + rng.normal(0, 4, frame.shape), 0, 255).astype(np.uint8)
+        frames.append(cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR))
+    return frames, dictionary
+
+SEARCH_SPACE = [('adaptive_threshold_windows', [{'adaptiveThreshWinSizeMin': 7,
+                                                 'adaptiveThreshWinSizeMax': 7,
+                                                 'adaptiveThreshWinSizeStep': 10}]),
+                ('min_perimeter_rate', [{'minMarkerPerimeterRate': 0.2}, {'minMarkerPerimeterRate': 2.0}])]
+
+def test_tune_keeps_the_recall():
+    frames, dictionary = _synthetic_frames()
+    tuner = DetectorTuner(frames, dictionary, min_recall=0.99, search_space=SEARCH_SPACE, repeats=1, min_gain=0.0)
+    assert tuner.reference_count == 6 * len(frames)
+
+    best = tuner.tune()
+    assert tuner.baseline.recall == 1.0
+    assert best.recall >= 0.99
+    assert best.fps >= tuner.baseline.fps
+    # markers are ~0.75 of the frame perimeter: rate 2.0 loses them all and is never kept
+    assert tuner.evaluate(dict(tuner.baseline.values, minMarkerPerimeterRate=2.0)).recall == 0.0
+    assert best.values['minMarkerPerimeterRate'] != 2.0
+
+def test_fixed_fields_are_not_searched():
+    frames, dictionary = _synthetic_frames(2)
+    tuner = DetectorTuner(frames, dictionary, fixed={'minMarkerPerimeterRate': 0.05},
+                          search_space=SEARCH_SPACE, repeats=1, min_gain=0.0)
+    assert tuner.tune().values['minMarkerPerimeterRate'] == 0.05
+
+def test_no_marker_on_the_frames():
+    dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_50)
+    with pytest.raises(ValueError):
+        DetectorTuner([np.full((240, 320, 3), 255, dtype=np.uint8)], dictionary)
+
+def test_saved_profile_is_loaded_and_checked(tmp_path):
+    frames, dictionary = _synthetic_frames(2)
+    tuner = DetectorTuner(frames, dictionary, search_space=SEARCH_SPACE, repeats=1)
+    best = tuner.tune()
+    path = tuner.save_profile('synthetic', best, str(tmp_path), 'DICT_4X4_50')
+
+    config = {'ARUCO_DICT': cv2.aruco.DICT_4X4_50,
+              'DETECTOR_PROFILE': 'synthetic',
+              'DETECTOR_PROFILES_DIR': str(tmp_path),
+              'IMAGE_SIZE': (640, 480)}
+    detector = ArucoDetector(config)
+    assert detector.params.minMarkerPerimeterRate == pytest.approx(best.values['minMarkerPerimeterRate'])
+    _, ids = detector.detect(frames[0])
+    assert len(ids) == 6
+
+    with pytest.raises(ValueError):
+        load_detector_profile(path, aruco_dict=cv2.aruco.DICT_5X5_50)
+    with pytest.warns(UserWarning):
+        load_detector_profile(path, aruco_dict=cv2.aruco.DICT_4X4_50, image_size=(1280, 720))
+
+    with open(path) as f:
+        profile = json.load(f)
+    profile['params']['notAField'] = 1
+    with open(path, 'w') as f:
+        json.dump(profile, f)
+    with pytest.raises(ValueError, match='notAField'):
+        load_detector_profile(path)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+import cv2
+import numpy as np
+import pytest
+
+from dictionaries import RestrictedDictionary, board_dictionary
+
+def test_to_original_and_to_subset():
+    restricted = RestrictedDictionary(cv2.aruco.DICT_4X4_1000, [250, 3, 17, 3])
+    np.testing.assert_array_equal(restricted.ids, [3, 17, 250])
+    assert len(restricted) == 3
+    assert len(restricted.dictionary.bytesList) == 3
+
+    np.testing.assert_array_equal(restricted.to_original([2, 0, 1]), [250, 3, 17])
+    # the (N,1) ids of detectMarkers keep their shape
+    assert restricted.to_original(np.int32([[1], [2]])).shape == (2, 1)
+    assert restricted.to_original(None) is None
+    np.testing.assert_array_equal(restricted.to_subset([17, 250, 3]), [1, 2, 0])
+    np.testing.assert_array_equal(restricted.to_original(restricted.to_subset([250, 17])), [250, 17])
+
+def test_to_subset_rejects_ids_outside_the_allow_list():
+    restricted = RestrictedDictionary('DICT_4X4_1000', [3, 17, 250])
+    for ids in ([4], [251], [0], [3, 999]):
+        with pytest.raises(ValueError):
+            restricted.to_subset(ids)
+
+def test_invalid_allow_lists():
+    with pytest.raises(ValueError):
+        RestrictedDictionary(cv2.aruco.DICT_4X4_50, [])
+    with pytest.raises(ValueError):
+        RestrictedDictionary(cv2.aruco.DICT_4X4_50, [10, 50])
+
+def test_restricted_detection_maps_back_to_the_original_ids():
+    base = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_1000)
+    image = np.full((200, 620), 255, dtype=np.uint8)
+    for i, marker_id in enumerate((3, 17, 250, 600)):
+        image[50:150, 20 + 150*i:120 + 150*i] = cv2.aruco.generateImageMarker(base, marker_id, 100)
+
+    restricted = RestrictedDictionary(base, [3, 17, 250])
+    _, subset_ids, _ = cv2.aruco.ArucoDetector(restricted.dictionary).detectMarkers(image)
+    # 600 is not in the allow-list and is never decoded
+    assert sorted(restricted.to_original(subset_ids).ravel().tolist()) == [3, 17, 250]
+
+def test_board_dictionary_keeps_the_board_ids():
+    config = {'ARUCO_DICT': cv2.aruco.DICT_4X4_1000, 'SQUARES_VERTICALLY': 6, 'SQUARES_HORIZONTALLY': 4}
+    assert len(board_dictionary(config).bytesList) == 1000
+    restricted = board_dictionary(dict(config, RESTRICT_DICTIONARY=True))
+    full = board_dictionary(config)
+    np.testing.assert_array_equal(restricted.bytesList, full.bytesList[:12])
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+import cv2
+import numpy as np
+import pytest
+
+from marker_atlas import PageLayout, render_atlas
+from marker_generator import dictionary_bits, gen_ArUco_marker, gen_ArUco_markers
+
+# 16, 25 (bits left in the last byte), 36 and 49 bits markers
+DICTIONARIES = ['DICT_4X4_50', 'DICT_5X5_100', 'DICT_6X6_250', 'DICT_7X7_50',
+                'DICT_ARUCO_ORIGINAL', 'DICT_APRILTAG_25h9', 'DICT_APRILTAG_36h11']
+
+def _dictionary(name):
+    return cv2.aruco.getPredefinedDictionary(getattr(cv2.aruco, name))
+
+@pytest.mark.parametrize('name', DICTIONARIES)
+def test_dictionary_bits_match_opencv(name):
+    dictionary = _dictionary(name)
+    bits = dictionary_bits(dictionary)
+    assert bits.shape == (len(dictionary.bytesList), dictionary.markerSize, dictionary.markerSize)
+    for i in range(len(bits)):
+        expected = cv2.aruco.Dictionary.getBitsFromByteList(dictionary.bytesList[i:i+1], dictionary.markerSize)
+        np.testing.assert_array_equal(bits[i], expected)
+
+@pytest.mark.parametrize('name', DICTIONARIES)
+@pytest.mark.parametrize('size', [None, 50, 77, 200])
+def test_markers_match_generate_image_marker(name, size):
+    dictionary = _dictionary(name)
+    # None: one pixel per cell
+    size = size or dictionary.markerSize + 2
+    ids = np.arange(0, len(dictionary.bytesList), 7)
+    markers = gen_ArUco_markers(dictionary, ids, size)
+    assert markers.shape == (len(ids), size, size) and markers.dtype == np.uint8
+    for marker_id, marker in zip(ids.tolist(), markers):
+        np.testing.assert_array_equal(marker, gen_ArUco_marker(dictionary, marker_id, size))
+
+def test_wider_border():
+    dictionary = _dictionary('DICT_4X4_50')
+    markers = gen_ArUco_markers(dictionary, [3, 17], 96, border_bits=2)
+    for marker_id, marker in zip((3, 17), markers):
+        np.testing.assert_array_equal(marker, cv2.aruco.generateImageMarker(dictionary, marker_id, 96, None, 2))
+
+def test_atlas_pages_are_detected():
+    ids = np.arange(0, 50, 3)
+    pages = list(render_atlas('DICT_4X4_50', marker_mm=20, dpi=100, ids=ids))
+    layout = PageLayout(20, dpi=100)
+    assert len(pages) == -(-len(ids) // layout.per_page)
+    assert pages[0].shape == (layout.page_h, layout.page_w)
+
+    detector = cv2.aruco.ArucoDetector(_dictionary('DICT_4X4_50'), cv2.aruco.DetectorParameters())
+    found = []
+    for page in pages:
+        _, marker_ids, _ = detector.detectMarkers(page)
+        found.extend(marker_ids.ravel().tolist())
+    assert sorted(found) == ids.tolist()
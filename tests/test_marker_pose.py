@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+import cv2
+import numpy as np
+
+from marker_pose import estimate_marker_poses, marker_object_points
+
+K = np.float64([[800, 0, 640], [0, 800, 360], [0, 0, 1]])
+D = np.float64([0.05, -0.02, 0.001, 0.001, 0])
+MARKER_LENGTH = 0.05
+
+def _project_markers(rng, count):
+    object_points = marker_object_points(MARKER_LENGTH)
+    corners = []
+    for _ in range(count):
+        rvec = rng.uniform(-0.6, 0.6, 3)
+        tvec = np.float64([rng.uniform(-0.2, 0.2), rng.uniform(-0.1, 0.1), rng.uniform(0.4, 1.2)])
+        image_points, _ = cv2.projectPoints(object_points, rvec, tvec, K, D)
+        corners.append(image_points.reshape(4,2))
+    return np.float32(corners)
+
+def test_matches_solvepnp_ippe_square():
+    rng = np.random.default_rng(0)
+    corners = _project_markers(rng, 20)
+    corners += rng.normal(0, 0.2, corners.shape).astype(np.float32)
+
+    rvecs, tvecs, object_points = estimate_marker_poses(corners, MARKER_LENGTH, K, D)
+    assert rvecs.shape == (20, 3) and tvecs.shape == (20, 3)
+    for corner, rvec, tvec in zip(corners, rvecs, tvecs):
+        retval, rvec_pnp, tvec_pnp = cv2.solvePnP(object_points, corner.astype(np.float64), K, D,
+                                                  flags=cv2.SOLVEPNP_IPPE_SQUARE)
+        assert retval
+        R = cv2.Rodrigues(rvec)[0]
+        R_pnp = cv2.Rodrigues(rvec_pnp)[0]
+        angle = np.degrees(np.linalg.norm(cv2.Rodrigues(R @ R_pnp.T)[0]))
+        assert angle < 0.05
+        np.testing.assert_allclose(tvec, tvec_pnp.ravel(), atol=1e-4)
+
+def test_detectmarkers_tuple_and_empty():
+    rng = np.random.default_rng(1)
+    corners = _project_markers(rng, 3)
+    packed = estimate_marker_poses(corners, MARKER_LENGTH, K, D)
+    as_tuple = estimate_marker_poses(tuple(c.reshape(1,4,2) for c in corners), MARKER_LENGTH, K, D)
+    np.testing.assert_allclose(packed[0], as_tuple[0])
+    np.testing.assert_allclose(packed[1], as_tuple[1])
+
+    rvecs, tvecs, _ = estimate_marker_poses((), MARKER_LENGTH, K, D)
+    assert rvecs.shape == (0, 3) and tvecs.shape == (0, 3)
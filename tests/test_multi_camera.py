@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+import cv2
+import numpy as np
+
+import multi_camera
+from multi_camera import CameraResult, MultiCameraRunner, TimestampMatcher
+
+def _result(camera, timestamp):
+    return CameraResult(camera, 0, timestamp, (), (), (), (), 0.0)
+
+def _run(matcher, results):
+    matched_sets = []
+    for camera, timestamp in results:
+        matched_sets.extend(matcher.add(_result(camera, timestamp)))
+    return [{name: result.timestamp for name, result in matched.items()} for matched in matched_sets]
+
+def test_pairs_within_tolerance():
+    matcher = TimestampMatcher(['left', 'right'], tolerance=0.01)
+    matched = _run(matcher, [('left', 0.000), ('right', 0.004),
+                             ('right', 0.036), ('left', 0.033),
+                             ('left', 0.066), ('right', 0.070)])
+    assert matched == [{'left': 0.000, 'right': 0.004},
+                       {'left': 0.033, 'right': 0.036},
+                       {'left': 0.066, 'right': 0.070}]
+    assert matcher.matched == 3 and matcher.unmatched == 0
+
+def test_drops_frames_without_a_partner():
+    matcher = TimestampMatcher(['left', 'right'], tolerance=0.01)
+    # right dropped the frame at 0.033, left the frame at 0.066
+    matched = _run(matcher, [('left', 0.000), ('right', 0.001),
+                             ('left', 0.033),
+                             ('right', 0.067),
+                             ('left', 0.100), ('right', 0.101)])
+    assert matched == [{'left': 0.000, 'right': 0.001},
+                       {'left': 0.100, 'right': 0.101}]
+    assert matcher.matched == 2 and matcher.unmatched == 2
+
+def test_out_of_order_results():
+    matcher = TimestampMatcher(['a', 'b', 'c'], tolerance=0.005)
+    # a delivers its second frame first
+    matched = _run(matcher, [('a', 0.033), ('a', 0.000), ('b', 0.001), ('c', 0.002),
+                             ('b', 0.034), ('c', 0.035)])
+    assert matched == [{'a': 0.000, 'b': 0.001, 'c': 0.002},
+                       {'a': 0.033, 'b': 0.034, 'c': 0.035}]
+
+def test_stale_camera_partial_sets():
+    matcher = TimestampMatcher(['left', 'right'], tolerance=0.01, stale_after=0.1)
+    timestamps = [round(0.033 * i, 3) for i in range(20)]
+    # right stops after its first frame and comes back at frame 15
+    results = [('left', timestamps[0]), ('right', timestamps[0])]
+    results += [('left', t) for t in timestamps[1:16]]
+    results += [('right', timestamps[15])]
+    for t in timestamps[16:]:
+        results += [('left', t), ('right', t)]
+    matched = _run(matcher, results)
+
+    assert matched[0] == {'left': 0.0, 'right': 0.0}
+    assert [m for m in matched[1:16]] == [{'left': t} for t in timestamps[1:16]]
+    assert matched[16:] == [{'left': t, 'right': t} for t in timestamps[16:]]
+    assert matcher.partial == 15 and matcher.matched == 5 and matcher.stale == set()
+
+def test_camera_that_never_starts():
+    matcher = TimestampMatcher(['left', 'right'], stale_after=0.1)
+    matched = _run(matcher, [('left', 0.033 * i) for i in range(10)])
+    assert matcher.stale == {'right'}
+    # the frames held while right was not stale yet are released as well
+    assert len(matched) == 10
+
+def test_without_staleness_waits_forever():
+    matcher = TimestampMatcher(['left', 'right'], stale_after=None)
+    assert _run(matcher, [('left', 0.033 * i) for i in range(10)]) == []
+
+class _Processor(object):
+    """Stands in for VideoPoseProcessor, fails on every frame of the cameras without dist_coeffs."""
+    def __init__(self, config, camera_matrix, dist_coeffs, mode):
+        self.fail = dist_coeffs is None
+
+    def process(self, frame):
+        if self.fail:
+            raise ValueError('bad frame')
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32), np.zeros((0,3)), np.zeros((0,3))
+
+def test_processor_errors_are_logged_and_counted(tmp_path, monkeypatch, caplog):
+    path = str(tmp_path / 'gray.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 30, (64, 48))
+    for _ in range(20):
+        writer.write(np.full((48, 64, 3), 128, dtype=np.uint8))
+    writer.release()
+
+    monkeypatch.setattr(multi_camera, 'VideoPoseProcessor', _Processor)
+    cameras = [{'NAME': 'good', 'VIDEO_STREAM': path, 'CAMERA_MATRIX': np.eye(3), 'DIST_COEFFS': np.zeros(5)},
+               {'NAME': 'bad', 'VIDEO_STREAM': path, 'CAMERA_MATRIX': np.eye(3), 'DIST_COEFFS': None}]
+    with caplog.at_level(logging.ERROR, logger='multi_camera'):
+        runner = MultiCameraRunner({}, cameras, workers=2, stale_after=None)
+        matched = list(runner)
+        runner.stop()
+    stats = runner.stats()
+
+    assert matched == []
+    assert stats['good']['frames_processed'] > 0 and stats['good']['frames_failed'] == 0
+    assert stats['bad']['frames_processed'] == 0 and stats['bad']['frames_failed'] > 0
+    for camera in stats.values():
+        assert camera['frames_grabbed'] == camera['frames_dropped'] + camera['frames_processed'] == 20
+    failures = [record for record in caplog.records if 'processing of frame' in record.getMessage()]
+    assert len(failures) == stats['bad']['frames_failed']
+    assert all(record.exc_info[0] is ValueError for record in failures)
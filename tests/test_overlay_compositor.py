@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+import cv2
+import numpy as np
+
+from image_warp import OverlayCompositor
+
+QUAD = np.float32([(200, 120), (420, 150), (400, 330), (180, 300)])
+
+def _overlay():
+    rng = np.random.default_rng(0)
+    # smooth content, the interpolation of the warps stays comparable
+    overlay = cv2.resize(rng.integers(0, 256, (12, 16, 3), dtype=np.uint8), (320, 240),
+                         interpolation=cv2.INTER_LINEAR)
+    return overlay
+
+def _frame(channels=3):
+    shape = (480, 640, channels) if channels > 1 else (480, 640)
+    return np.full(shape, 40, dtype=np.uint8)
+
+def _inside(quad, shape, margin):
+    """Mask of the pixels at least margin px inside the quad (within -margin px when negative)."""
+    mask = np.zeros(shape[:2], dtype=np.uint8)
+    cv2.fillConvexPoly(mask, np.round(quad).astype(np.int32), 255)
+    kernel = np.ones((2*abs(margin) + 1, 2*abs(margin) + 1), np.uint8)
+    return (cv2.erode(mask, kernel) if margin >= 0 else cv2.dilate(mask, kernel)) > 0
+
+def test_overlay_inside_the_quad_frame_outside():
+    overlay = _overlay()
+    compositor = OverlayCompositor(overlay)
+    frame = _frame()
+    output = compositor.composite(frame, QUAD)
+    assert output is frame
+
+    # reference: warp of the whole frame
+    H = cv2.getPerspectiveTransform(compositor.src_points, QUAD)
+    expected = cv2.warpPerspective(overlay, H, (640, 480))
+    inside = _inside(QUAD, frame.shape, 3)
+    assert np.abs(output[inside].astype(int) - expected[inside]).max() <= 1
+
+    # nothing changes beyond the dilated mask
+    outside = ~_inside(QUAD, frame.shape, -(compositor.pad + 1))
+    assert np.all(output[outside] == 40)
+
+def test_homography_entry_point():
+    overlay = _overlay()
+    H = cv2.getPerspectiveTransform(np.float32([(0, 0), (320, 0), (320, 240), (0, 240)]), QUAD)
+    from_quad = OverlayCompositor(overlay).composite(_frame(), QUAD)
+    from_homography = OverlayCompositor(overlay).composite_homography(_frame(), H)
+    assert np.abs(from_quad.astype(int) - from_homography).max() <= 1
+
+def test_full_weight_copies_the_overlay():
+    # overlay and frame of one color: the blend must not lose a level
+    overlay = np.full((240, 320, 3), 255, dtype=np.uint8)
+    output = OverlayCompositor(overlay).composite(_frame(), QUAD)
+    assert np.all(output[_inside(QUAD, output.shape, 2)] == 255)
+
+def test_grayscale_frame():
+    compositor = OverlayCompositor(cv2.cvtColor(_overlay(), cv2.COLOR_BGR2GRAY))
+    gray = compositor.composite(_frame(1), QUAD)
+    color = OverlayCompositor(_overlay()).composite(_frame(), QUAD)
+    assert gray.shape == (480, 640)
+    inside = _inside(QUAD, gray.shape, 3)
+    expected = cv2.cvtColor(color, cv2.COLOR_BGR2GRAY)
+    assert np.abs(gray[inside].astype(int) - expected[inside]).max() <= 2
+    assert np.all(gray[~_inside(QUAD, gray.shape, -(compositor.pad + 1))] == 40)
+
+def test_mask_is_reused_for_small_moves():
+    # off the pixel grid, a small move does not change the size of the ROI
+    quad = QUAD + 0.3
+    compositor = OverlayCompositor(_overlay(), mask_tolerance=0.5)
+    compositor.composite(_frame(), quad)
+    # the ROI moves with the quad, the quad does not move within it
+    compositor.composite(_frame(), quad + 10)
+    compositor.composite(_frame(), quad + np.float32([10.2, 10.0]))
+    assert compositor.masks_drawn == 1 and compositor.masks_reused == 2
+
+    # sub-pixel move beyond the tolerance, or another shape
+    compositor.composite(_frame(), quad + np.float32([10.6, 10.0]))
+    assert compositor.masks_drawn == 2
+    moved = quad.copy()
+    moved[0] += 5
+    compositor.composite(_frame(), moved)
+    assert compositor.masks_drawn == 3
+
+def test_quad_outside_the_frame():
+    frame = _frame()
+    OverlayCompositor(_overlay()).composite(frame, QUAD + 1000)
+    assert np.all(frame == 40)
+
+def test_quad_clipped_by_the_frame():
+    frame = _frame()
+    quad = QUAD - np.float32([250, 200])
+    OverlayCompositor(_overlay()).composite(frame, quad)
+    assert np.any(frame != 40) and np.all(frame[200:] == 40)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+import cv2
+import numpy as np
+
+from pose_tracking import PoseTracker
+
+def _angle_between(rvec_a, rvec_b):
+    R_a = cv2.Rodrigues(np.asarray(rvec_a, dtype=np.float64).reshape(3,1))[0]
+    R_b = cv2.Rodrigues(np.asarray(rvec_b, dtype=np.float64).reshape(3,1))[0]
+    R = R_a @ R_b.T
+    return np.linalg.norm(cv2.Rodrigues(R)[0])
+
+def test_no_prediction_before_the_first_measurement():
+    tracker = PoseTracker()
+    assert tracker.predict('board', 0.0) == (None, None)
+
+    rvec, tvec = np.float64([0.1, 0.2, 0.3]), np.float64([0.0, 0.1, 0.5])
+    filtered_rvec, filtered_tvec = tracker.update('board', rvec, tvec, 0.0)
+    assert filtered_rvec.shape == filtered_tvec.shape == (3,1)
+    np.testing.assert_allclose(filtered_rvec.ravel(), rvec)
+    np.testing.assert_allclose(filtered_tvec.ravel(), tvec)
+
+    predicted_rvec, predicted_tvec = tracker.predict('board', 0.1)
+    np.testing.assert_allclose(predicted_rvec.ravel(), rvec)
+    np.testing.assert_allclose(predicted_tvec.ravel(), tvec)
+
+def test_predictions_expire():
+    tracker = PoseTracker(max_prediction_time=0.5)
+    tracker.update('board', np.zeros(3), np.float64([0, 0, 1]), 0.0)
+    assert tracker.predict('board', 0.5)[0] is not None
+    assert tracker.predict('board', 0.6) == (None, None)
+
+    tracker.reset('board')
+    assert tracker.predict('board', 0.1) == (None, None)
+
+def test_constant_velocity_is_tracked():
+    tracker = PoseTracker()
+    omega = np.float64([0.0, 0.0, 0.5])        # rad/s
+    velocity = np.float64([0.1, -0.05, 0.0])   # m/s
+    for i in range(60):
+        t = i / 30.0
+        tracker.update('board', omega * t, np.float64([0, 0, 1]) + velocity * t, t)
+
+    # 0.4 s after the last measurement
+    t = 59 / 30.0 + 0.4
+    rvec, tvec = tracker.predict('board', t)
+    assert _angle_between(rvec, omega * t) < 1e-3
+    np.testing.assert_allclose(tvec.ravel(), np.float64([0, 0, 1]) + velocity * t, atol=1e-3)
+
+def test_jitter_is_smoothed():
+    rng = np.random.default_rng(0)
+    tracker = PoseTracker()
+    tvec = np.float64([0.0, 0.0, 1.0])
+    measured, filtered = [], []
+    for i in range(200):
+        noisy = tvec + rng.normal(0, 0.002, 3)
+        measured.append(noisy)
+        filtered.append(tracker.update('board', np.zeros(3), noisy, i / 30.0)[1].ravel())
+    assert np.std(filtered[50:], axis=0).max() < 0.8 * np.std(measured[50:], axis=0).min()
+
+def test_rotation_through_180_degrees():
+    # rvecs flip direction at pi, the filter works on the rotations and does not jump
+    # (only the lag of the velocity estimate is left)
+    tracker = PoseTracker()
+    for i in range(40):
+        t = i / 30.0
+        angle = np.pi - 0.5 + 0.9 * t
+        rvec = np.float64([0, 0, angle])
+        if angle > np.pi:
+            rvec = np.float64([0, 0, angle - 2 * np.pi])
+        filtered_rvec, _ = tracker.update('board', rvec, np.float64([0, 0, 1]), t)
+        assert _angle_between(filtered_rvec, rvec) < 0.05
+
+def test_batch_matches_single_updates():
+    keys = [3, 7, 11]
+    batch, single = PoseTracker(), PoseTracker()
+    rng = np.random.default_rng(1)
+    for i in range(10):
+        t = i / 30.0
+        rvecs = rng.normal(0, 0.3, (3, 3))
+        tvecs = rng.normal(0, 0.1, (3, 3)) + [0, 0, 1]
+        filtered_rvecs, filtered_tvecs = batch.update_batch(keys, rvecs, tvecs, t)
+        for j, key in enumerate(keys):
+            rvec, tvec = single.update(key, rvecs[j], tvecs[j], t)
+            np.testing.assert_allclose(filtered_rvecs[j], rvec.ravel(), atol=1e-12)
+            np.testing.assert_allclose(filtered_tvecs[j], tvec.ravel(), atol=1e-12)
+
+    rvecs, tvecs, valid = batch.predict_batch(keys + [42], 10 / 30.0)
+    assert valid.tolist() == [True, True, True, False]
+    for j, key in enumerate(keys):
+        rvec, tvec = single.predict(key, 10 / 30.0)
+        np.testing.assert_allclose(rvecs[j], rvec.ravel(), atol=1e-12)
+        np.testing.assert_allclose(tvecs[j], tvec.ravel(), atol=1e-12)
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import cv2
+import numpy as np
+import pytest
+
+from process_videos import COLUMNS, load_columns, plan_chunks, process_video
+from scenes import CONFIG, board_frame
+
+IMAGE_SIZE = (640, 360)
+K = np.float64([[400, 0, 320], [0, 400, 180], [0, 0, 1]])
+FRAMES = 24
+
+@pytest.fixture(scope='module')
+def video_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('videos') / 'board.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 30, IMAGE_SIZE)
+    for i in range(FRAMES):
+        # the board leaves the frame at the end, those frames have no pose
+        writer.write(board_frame(rvec=(0.2, 0.01 * i, 0.0), tvec=(-0.05 + 0.01 * i, 0.0, 0.5),
+                                 image_size=IMAGE_SIZE, camera_matrix=K))
+    writer.release()
+    return path
+
+def _assert_same_columns(columns, expected):
+    for name in COLUMNS:
+        np.testing.assert_array_equal(columns[name], expected[name])
+
+def test_plan_chunks_cover_the_video():
+    assert plan_chunks(10, 4) == [(0, 4), (4, 8), (8, 10)]
+    assert plan_chunks(8, 4) == [(0, 4), (4, 8)]
+    assert plan_chunks(3, 10) == [(0, 3)]
+    # unknown length, a single chunk read until the end
+    assert plan_chunks(0, 4) == [(0, None)]
+
+@pytest.mark.parametrize('mode', ['charuco', 'markers'])
+def test_workers_and_chunks_give_the_same_poses(video_path, mode):
+    D = np.zeros(5)
+    expected, frames = process_video(video_path, CONFIG, K, D, mode, stride=1, chunk_frames=FRAMES, workers=1)
+    assert frames == FRAMES
+    assert len(np.unique(expected['frame'])) > FRAMES // 2
+
+    for workers in (1, 3):
+        columns, chunked_frames = process_video(video_path, CONFIG, K, D, mode, stride=1, chunk_frames=5,
+                                                workers=workers)
+        assert chunked_frames == FRAMES
+        _assert_same_columns(columns, expected)
+
+def test_stride_keeps_the_frame_indices(video_path):
+    D = np.zeros(5)
+    expected, _ = process_video(video_path, CONFIG, K, D, stride=1, chunk_frames=FRAMES, workers=1)
+    # chunks not aligned on the stride
+    columns, frames = process_video(video_path, CONFIG, K, D, stride=3, chunk_frames=7, workers=2)
+    assert frames == FRAMES // 3
+    assert np.all(columns['frame'] % 3 == 0)
+    keep = expected['frame'] % 3 == 0
+    _assert_same_columns(columns, {name: expected[name][keep] for name in COLUMNS})
+
+def test_outputs_read_back(video_path, tmp_path):
+    D = np.zeros(5)
+    expected, _ = process_video(video_path, CONFIG, K, D, chunk_frames=10, workers=1)
+    for name in ('poses.npz', 'poses.csv'):
+        path = str(tmp_path / name)
+        process_video(video_path, CONFIG, K, D, chunk_frames=10, workers=2, output_path=path)
+        columns = load_columns(path)
+        for column in COLUMNS:
+            np.testing.assert_allclose(columns[column], expected[column], rtol=1e-12)
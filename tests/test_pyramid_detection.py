@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+import cv2
+import numpy as np
+
+from aruco_detectors import CharucoDetector
+from scenes import CONFIG, board_frame
+
+def _sorted_markers(detection):
+    corners, ids = detection.markers(0)
+    order = np.argsort(ids)
+    return corners[order], ids[order]
+
+def test_scale_from_the_expected_marker_size():
+    assert CharucoDetector(CONFIG).pyramid_scale == 1.0
+    assert CharucoDetector(dict(CONFIG, PYRAMID_SCALE=0.5)).pyramid_scale == 0.5
+    assert CharucoDetector(dict(CONFIG, EXPECTED_MARKER_PX=128)).pyramid_scale == 0.25
+    assert CharucoDetector(dict(CONFIG, EXPECTED_MARKER_PX=64, PYRAMID_TARGET_MARKER_PX=48)).pyramid_scale == 0.75
+    # clamped, markers smaller than the target are detected at full resolution
+    assert CharucoDetector(dict(CONFIG, EXPECTED_MARKER_PX=16)).pyramid_scale == 1.0
+    assert CharucoDetector(dict(CONFIG, EXPECTED_MARKER_PX=10000)).pyramid_scale == 0.125
+
+def test_pyramid_matches_full_resolution_detection():
+    # markers of about 50 px, still 25 px wide at half resolution
+    full = CharucoDetector(CONFIG)
+    # sub-pixel marker corners at full resolution too
+    full.params.cornerRefinementMethod = cv2.aruco.CORNER_REFINE_SUBPIX
+    pyramid = CharucoDetector(dict(CONFIG, PYRAMID_SCALE=0.5))
+    for rvec in ((0.2, 0.1, 0.0), (-0.3, 0.2, 0.1), (0.1, -0.2, 0.0)):
+        frame = board_frame(rvec=rvec, tvec=(0.0, 0.0, 0.25))
+        expected = full.detect(frame)
+        detection = pyramid.detect(frame)
+
+        expected_corners, expected_ids = _sorted_markers(expected)
+        corners, ids = _sorted_markers(detection)
+        assert len(expected_ids) > 0
+        np.testing.assert_array_equal(ids, expected_ids)
+        # the upscaled corners are refined back to sub-pixel accuracy at full resolution
+        np.testing.assert_allclose(corners, expected_corners, atol=0.5)
+
+        expected_corners, expected_ids = expected.charuco(0)
+        corners, ids = detection.charuco(0)
+        np.testing.assert_array_equal(ids, expected_ids)
+        np.testing.assert_allclose(corners, expected_corners, atol=0.5)
+
+def test_pyramid_with_roi_tracking():
+    full = CharucoDetector(CONFIG)
+    detector = CharucoDetector(dict(CONFIG, PYRAMID_SCALE=0.5, ROI_TRACKING=True))
+    for i in range(4):
+        frame = board_frame(tvec=(-0.03 + 0.02 * i, 0.0, 0.25))
+        expected_corners, expected_ids = full.detect(frame).charuco(0)
+        corners, ids = detector.detect(frame).charuco(0)
+        np.testing.assert_array_equal(ids, expected_ids)
+        np.testing.assert_allclose(corners, expected_corners, atol=0.5)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from aruco_detectors import ArucoDetector, CharucoDetector, RoiTracker
+from scenes import CONFIG, IMAGE_SIZE, board_frame
+
+def _sequence(count=8):
+    """Board sliding to the right, as seen by a steady camera."""
+    return [board_frame(rvec=(0.2, 0.1, 0.0), tvec=(-0.1 + 0.02 * i, 0.0, 0.5)) for i in range(count)]
+
+def _blank():
+    return np.full((IMAGE_SIZE[1], IMAGE_SIZE[0], 3), 255, dtype=np.uint8)
+
+def _square(x, y, size):
+    return [np.float32([[[x, y], [x + size, y], [x + size, y + size], [x, y + size]]])]
+
+def test_roi_tracker_pads_and_follows_the_markers():
+    tracker = RoiTracker(padding=0.5, min_padding_px=0, full_scan_every=30)
+    assert tracker.next_roi((720, 1280)) is None
+
+    tracker.update(_square(100, 100, 100), full_scan=True)
+    assert tracker.next_roi((720, 1280)) == (50, 50, 250, 250)
+
+    # moved by 20 px to the right, the next region is moved again by the same amount
+    tracker.update(_square(120, 100, 100), full_scan=False)
+    assert tracker.next_roi((720, 1280)) == (90, 50, 290, 250)
+
+    # clipped to the image
+    assert tracker.next_roi((200, 260)) == (90, 50, 260, 200)
+
+def test_roi_tracker_requests_full_scans():
+    tracker = RoiTracker(full_scan_every=2)
+    tracker.update(_square(100, 100, 100), full_scan=True)
+    tracker.update(_square(100, 100, 100), full_scan=False)
+    assert tracker.next_roi((720, 1280)) is not None
+    tracker.update(_square(100, 100, 100), full_scan=False)
+    assert tracker.next_roi((720, 1280)) is None
+
+    # lost markers
+    tracker.update((), full_scan=True)
+    assert tracker.next_roi((720, 1280)) is None
+
+def test_charuco_tracking_matches_full_frame_detection():
+    full = CharucoDetector(CONFIG)
+    tracked = CharucoDetector(dict(CONFIG, ROI_TRACKING=True))
+    for i, frame in enumerate(_sequence()):
+        expected_corners, expected_ids = full.detect(frame).charuco(0)
+        corners, ids = tracked.detect(frame).charuco(0)
+        assert len(expected_ids) > 0
+        np.testing.assert_array_equal(ids, expected_ids)
+        np.testing.assert_allclose(corners, expected_corners, atol=0.1)
+        # the first frame is a full scan, the next ones only search the region
+        assert (tracked.tracker.frames_since_full_scan == 0) == (i == 0)
+
+def test_aruco_tracking_matches_full_frame_detection():
+    full = ArucoDetector(CONFIG)
+    tracked = ArucoDetector(dict(CONFIG, ROI_TRACKING=True))
+    for frame in _sequence():
+        expected_corners, expected_ids = full.detect(frame)
+        corners, ids = tracked.detect(frame)
+        order, expected_order = np.argsort(ids), np.argsort(expected_ids)
+        np.testing.assert_array_equal(ids[order], expected_ids[expected_order])
+        np.testing.assert_allclose(corners[order], expected_corners[expected_order], atol=0.1)
+
+def test_charuco_tracking_recovers_after_losing_the_board():
+    tracked = CharucoDetector(dict(CONFIG, ROI_TRACKING=True))
+    frames = _sequence(4)
+    for frame in frames[:2]:
+        tracked.detect(frame)
+    assert tracked.tracker.bbox is not None
+
+    _, ids = tracked.detect(_blank()).charuco(0)
+    assert len(ids) == 0
+    assert tracked.tracker.bbox is None
+
+    _, ids = tracked.detect(frames[3]).charuco(0)
+    assert len(ids) > 0
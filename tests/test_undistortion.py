@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+import cv2
+import numpy as np
+
+from undistortion import UndistortionCache, undistort
+
+K = np.float64([[800, 0, 320], [0, 800, 240], [0, 0, 1]])
+D = np.float64([-0.2, 0.05, 0.001, -0.001, 0])
+
+def _image():
+    rng = np.random.default_rng(0)
+    image = cv2.resize(rng.integers(0, 256, (60, 80, 3), dtype=np.uint8), (640, 480), interpolation=cv2.INTER_NEAREST)
+    return cv2.GaussianBlur(image, (5, 5), 1.0)
+
+def test_matches_cv2_undistort():
+    image = _image()
+    expected = cv2.undistort(image, K, D)
+    result = undistort(image, K, D)
+    assert result.shape == expected.shape and result.dtype == expected.dtype
+    # both remap with fixed-point maps, at most a rounding step apart
+    assert np.abs(result.astype(np.int16) - expected).max() <= 1
+
+def test_maps_are_computed_once_per_camera_and_size():
+    cache = UndistortionCache(max_entries=2)
+    maps = cache.get_maps(K, D, (640, 480))
+    assert cache.get_maps(K.copy(), D.copy(), (640, 480)) is maps
+    assert cache.get_maps(K, D, (320, 240)) is not maps
+    np.testing.assert_array_equal(maps[2], K)
+
+def test_least_recently_used_maps_are_evicted():
+    cache = UndistortionCache(max_entries=2)
+    first = cache.get_maps(K, D, (640, 480))
+    cache.get_maps(K, D, (320, 240))
+    cache.get_maps(K, D, (160, 120))
+    assert cache.get_maps(K, D, (640, 480)) is not first
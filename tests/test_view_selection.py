@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+import cv2
+import numpy as np
+
+from scenes import CONFIG, IMAGE_SIZE, K
+from view_selection import CoverageViewSelector
+
+def _board():
+    dictionary = cv2.aruco.getPredefinedDictionary(CONFIG['ARUCO_DICT'])
+    return cv2.aruco.CharucoBoard((CONFIG['SQUARES_VERTICALLY'], CONFIG['SQUARES_HORIZONTALLY']),
+                                  CONFIG['SQUARE_LENGTH'], CONFIG['MARKER_LENGTH'], dictionary)
+
+def _view(board, rvec, center):
+    """Charuco corners/ids of the board centered at center, only the corners inside the image."""
+    object_points = board.getChessboardCorners()
+    rvec = np.float64(rvec)
+    tvec = np.float64(center) - cv2.Rodrigues(rvec)[0] @ object_points.mean(axis=0)
+    image_points, _ = cv2.projectPoints(object_points, rvec, tvec, K, None)
+    image_points = image_points.reshape(-1,2)
+    w, h = IMAGE_SIZE
+    inside = (image_points[:,0] >= 0) & (image_points[:,0] < w) & (image_points[:,1] >= 0) & (image_points[:,1] < h)
+    return image_points[inside].reshape(-1,1,2).astype(np.float32), np.flatnonzero(inside).reshape(-1,1)
+
+def _random_views(board, count, seed=0):
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        center = (rng.uniform(-0.2, 0.2), rng.uniform(-0.1, 0.1), rng.uniform(0.3, 0.7))
+        yield _view(board, rng.uniform(-0.8, 0.8, 3), center)
+
+def test_same_view_is_accepted_once():
+    board = _board()
+    selector = CoverageViewSelector(board, IMAGE_SIZE)
+    view = _view(board, (0.3, 0.2, 0), (0, 0, 0.5))
+    assert selector.accept(*view)
+    assert not selector.accept(*view)
+    assert selector.views == 1 and len(selector.pose_bins) == 1
+
+def test_new_orientation_on_covered_cells():
+    board = _board()
+    selector = CoverageViewSelector(board, IMAGE_SIZE, tilt_bin_deg=15, pose_target=3)
+    assert selector.accept(*_view(board, (0, 0, 0), (0, 0, 0.4)))
+    # same place, tilted by ~25 degrees: no new cells but a new orientation
+    assert selector.accept(*_view(board, (0.45, 0, 0), (0, 0, 0.4)))
+    assert len(selector.pose_bins) == 2
+
+def test_too_few_corners_are_rejected():
+    board = _board()
+    selector = CoverageViewSelector(board, IMAGE_SIZE, min_corners=6)
+    corners, ids = _view(board, (0.2, 0.1, 0), (0, 0, 0.5))
+    assert not selector.accept(corners[:5], ids[:5])
+    assert not selector.accept(None, None)
+
+def test_orientations_stop_counting_once_the_target_is_met():
+    board = _board()
+    selector = CoverageViewSelector(board, IMAGE_SIZE, pose_target=6)
+    accepted = sum(selector.accept(*view) for view in _random_views(board, 200))
+    assert len(selector.pose_bins) >= 6 and selector.coverage > 0.7
+    # coverage and the first orientations only, not one view per orientation bin
+    assert accepted < 25